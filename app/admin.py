@@ -3,7 +3,14 @@ from django.contrib import admin
 from django.db.models import QuerySet
 from django.http.request import HttpRequest
 
-from app.models import Feed, Item, Notification, UserFollowFeed, UserRelItem
+from app.models import (
+    Feed,
+    HubSubscription,
+    Item,
+    Notification,
+    UserFollowFeed,
+    UserRelItem,
+)
 
 
 class FeedAdmin(admin.ModelAdmin):
@@ -11,7 +18,14 @@ class FeedAdmin(admin.ModelAdmin):
 
     """
 
-    list_display = ("id", "title", "link", "last_build_date")
+    list_display = (
+        "id",
+        "title",
+        "link",
+        "last_build_date",
+        "failure_count",
+        "quarantined_until",
+    )
 
 
 class ItemAdmin(admin.ModelAdmin):
@@ -67,8 +81,17 @@ class NotificationAdmin(admin.ModelAdmin):
     list_display = ("id", "user", "content", "read")
 
 
+class HubSubscriptionAdmin(admin.ModelAdmin):
+    """Admin class for hubsubscription model
+
+    """
+
+    list_display = ("id", "feed", "hub", "state", "lease_expires_at")
+
+
 admin.site.register(Feed, FeedAdmin)
 admin.site.register(Item, ItemAdmin)
 admin.site.register(UserRelItem, UserRelItemAdmin)
 admin.site.register(UserFollowFeed, UserFollowFeedAdmin)
 admin.site.register(Notification, NotificationAdmin)
+admin.site.register(HubSubscription, HubSubscriptionAdmin)
@@ -0,0 +1,204 @@
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, Optional, Union
+
+# Containers with more values than this are bitmaps, smaller than the sorted array
+ARRAY_LIMIT = 4096
+CONTAINER_BITS = 1 << 16
+HEADER = struct.Struct("<IBH")
+
+Container = Union[array, int]
+
+
+def _cardinality(container: Container) -> int:
+    if isinstance(container, array):
+        return len(container)
+    return bin(container).count("1")
+
+
+def _to_bitmap(container: Container) -> int:
+    if isinstance(container, int):
+        return container
+    bits = 0
+    for low in container:
+        bits |= 1 << low
+    return bits
+
+
+def _lows(container: Container) -> Iterator[int]:
+    if isinstance(container, array):
+        yield from container
+        return
+    for index, byte in enumerate(container.to_bytes(CONTAINER_BITS // 8, "little")):
+        if byte:
+            for bit in range(8):
+                if byte >> bit & 1:
+                    yield index << 3 | bit
+
+
+def _optimize(bits: int) -> Optional[Container]:
+    # Keeps a container in its smallest form, None if it is empty
+    if not bits:
+        return None
+    if _cardinality(bits) > ARRAY_LIMIT:
+        return bits
+    return array("H", _lows(bits))
+
+
+class RoaringBitmap:
+    """Compressed set of non negative integers, in the layout of Roaring bitmaps.
+    Values are grouped by their high 16 bits in containers, that are sorted arrays of
+    the low 16 bits while they have up to `ARRAY_LIMIT` values and bitmaps of 8 KB
+    beyond that, so sparse and dense sets of item ids both stay small.
+
+    """
+
+    def __init__(self, values: Iterable[int] = ()):
+        self.containers: Dict[int, Container] = {}
+        self.update(values)
+
+    def __contains__(self, value: int) -> bool:
+        container = self.containers.get(value >> 16)
+        if container is None:
+            return False
+        low = value & 0xFFFF
+        if isinstance(container, array):
+            index = bisect_left(container, low)
+            return index < len(container) and container[index] == low
+        return bool(container >> low & 1)
+
+    def __len__(self) -> int:
+        return sum(_cardinality(container) for container in self.containers.values())
+
+    def __iter__(self) -> Iterator[int]:
+        for high in sorted(self.containers):
+            base = high << 16
+            for low in _lows(self.containers[high]):
+                yield base | low
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, RoaringBitmap):
+            return NotImplemented
+        return self.containers.keys() == other.containers.keys() and all(
+            _to_bitmap(container) == _to_bitmap(other.containers[high])
+            for high, container in self.containers.items()
+        )
+
+    def __repr__(self) -> str:
+        return f"RoaringBitmap({len(self)} values)"
+
+    def add(self, value: int) -> None:
+        high, low = value >> 16, value & 0xFFFF
+        container = self.containers.get(high)
+        if container is None:
+            self.containers[high] = array("H", [low])
+        elif isinstance(container, int):
+            self.containers[high] = container | 1 << low
+        else:
+            index = bisect_left(container, low)
+            if index < len(container) and container[index] == low:
+                return
+            container.insert(index, low)
+            if len(container) > ARRAY_LIMIT:
+                self.containers[high] = _to_bitmap(container)
+
+    def discard(self, value: int) -> None:
+        high, low = value >> 16, value & 0xFFFF
+        container = self.containers.get(high)
+        if container is None:
+            return
+        if isinstance(container, array):
+            index = bisect_left(container, low)
+            if index < len(container) and container[index] == low:
+                del container[index]
+            optimized = container if container else None
+        else:
+            optimized = _optimize(container & ~(1 << low))
+        if optimized is None:
+            del self.containers[high]
+        else:
+            self.containers[high] = optimized
+
+    def update(self, values: Iterable[int]) -> None:
+        for value in values:
+            self.add(value)
+
+    def _combine(self, other: "RoaringBitmap", operation) -> "RoaringBitmap":
+        result = RoaringBitmap()
+        for high in self.containers.keys() | other.containers.keys():
+            bits = operation(
+                _to_bitmap(self.containers.get(high, 0)),
+                _to_bitmap(other.containers.get(high, 0)),
+            )
+            container = _optimize(bits)
+            if container is not None:
+                result.containers[high] = container
+        return result
+
+    def __or__(self, other: "RoaringBitmap") -> "RoaringBitmap":
+        return self._combine(other, lambda first, second: first | second)
+
+    def __and__(self, other: "RoaringBitmap") -> "RoaringBitmap":
+        return self._combine(other, lambda first, second: first & second)
+
+    def __sub__(self, other: "RoaringBitmap") -> "RoaringBitmap":
+        return self._combine(other, lambda first, second: first & ~second)
+
+    def serialize(self) -> bytes:
+        """Function responsible for encoding the bitmap, each container is its high
+        bits, kind and cardinality followed by the array or the bitmap
+
+        Returns
+        -------
+        bytes
+        """
+        chunks = []
+        for high in sorted(self.containers):
+            container = self.containers[high]
+            cardinality = _cardinality(container)
+            if isinstance(container, array):
+                values = array("H", container)
+                if sys.byteorder == "big":
+                    values.byteswap()
+                chunks.append(HEADER.pack(high, 0, cardinality - 1))
+                chunks.append(values.tobytes())
+            else:
+                chunks.append(HEADER.pack(high, 1, cardinality - 1))
+                chunks.append(container.to_bytes(CONTAINER_BITS // 8, "little"))
+        return b"".join(chunks)
+
+    @classmethod
+    def deserialize(cls, data: Optional[bytes]) -> "RoaringBitmap":
+        """Function responsible for decoding a bitmap encoded by `serialize`
+
+        Parameters
+        ----------
+        data: bytes
+            Encoded bitmap, None or empty for an empty bitmap
+
+        Returns
+        -------
+        RoaringBitmap
+        """
+        bitmap = cls()
+        data = memoryview(data or b"")
+        offset = 0
+        while offset < len(data):
+            high, kind, cardinality = HEADER.unpack_from(data, offset)
+            offset += HEADER.size
+            if kind == 0:
+                size = (cardinality + 1) * 2
+                values = array("H")
+                values.frombytes(data[offset : offset + size])
+                if sys.byteorder == "big":
+                    values.byteswap()
+                bitmap.containers[high] = values
+            else:
+                size = CONTAINER_BITS // 8
+                bitmap.containers[high] = int.from_bytes(
+                    data[offset : offset + size], "little"
+                )
+            offset += size
+        return bitmap
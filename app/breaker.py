@@ -0,0 +1,260 @@
+import random
+from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterable, List, Optional, Set
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.utils.timezone import now
+from lxml import etree
+
+from app.exceptions import FetchFeedError, UnsupportedDocumentError
+from app.models.feed import Feed
+from app.store import get_redis_connection
+
+# Statuses worth retrying besides 5xx
+TRANSIENT_STATUSES = {408, 425, 429}
+# Failures caused by the feed, other errors do not count against it
+FEED_ERRORS = (FetchFeedError, UnsupportedDocumentError, etree.XMLSyntaxError)
+FAILURE_FIELDS = ["failure_count", "last_error", "quarantined_until"]
+
+
+def is_transient(status: Optional[int]) -> bool:
+    """Function responsible for telling if a failed fetch is worth retrying.
+    Fetches without a response, timeouts included, are.
+
+    Parameters
+    ----------
+    status: int
+        Response status, None if there was no response
+
+    Returns
+    -------
+    bool
+    """
+    return status is None or status >= 500 or status in TRANSIENT_STATUSES
+
+
+def should_retry(error: Exception) -> bool:
+    """Function responsible for telling if a refresh that failed with `error`
+    is worth retrying. Missing feeds and documents that can not be parsed are not,
+    errors not caused by the feed are.
+
+    Parameters
+    ----------
+    error: Exception
+
+    Returns
+    -------
+    bool
+    """
+    if isinstance(error, FetchFeedError):
+        return is_transient(error.status)
+    return not isinstance(error, FEED_ERRORS)
+
+
+def retry_after(
+    headers: Dict[str, str], at: Optional[datetime] = None
+) -> Optional[int]:
+    """Function responsible for getting the seconds to wait from a `Retry-After`
+    header, given in seconds or as a date
+
+    Parameters
+    ----------
+    headers: Dict[str, str]
+        Response headers, with lower case names
+    at: datetime
+        Defaults to now
+
+    Returns
+    -------
+    Seconds, or None if the server did not say
+    """
+    value = headers.get("retry-after", "").strip()
+    if value.isdigit():
+        return int(value)
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(int((date - (at or now())).total_seconds()), 0)
+
+
+def quarantine_seconds(failure_count: int) -> int:
+    """Function responsible for choosing how long a feed is quarantined after
+    `failure_count` consecutive failures, with jitter so feeds failing together
+    do not come back together
+
+    Parameters
+    ----------
+    failure_count: int
+
+    Returns
+    -------
+    Seconds, 0 below `FEED_QUARANTINE_THRESHOLD`
+    """
+    exceeded = failure_count - settings.FEED_QUARANTINE_THRESHOLD
+    if exceeded < 0:
+        return 0
+    seconds = min(
+        settings.FEED_QUARANTINE_DURATION * 2 ** min(exceeded, 32),
+        settings.FEED_QUARANTINE_MAX,
+    )
+    return int(seconds * random.uniform(0.75, 1))
+
+
+def host(feed: Feed) -> str:
+    return urlsplit(feed.link).hostname or ""
+
+
+class CircuitBreaker:
+    """Circuit breaker of feed refreshes.
+    Consecutive failures of a feed are counted in the feed, which is quarantined
+    once they reach `FEED_QUARANTINE_THRESHOLD`. Transient failures of a host are
+    counted in Redis, and after `HOST_FAILURE_THRESHOLD` within `HOST_FAILURE_WINDOW`
+    every feed of the host is skipped for `HOST_COOLDOWN`.
+
+    """
+
+    prefix = "host-breaker"
+
+    def __init__(self):
+        self.connection = get_redis_connection()
+
+    def failures_key(self, hostname: str) -> str:
+        return f"{self.prefix}:{hostname}:failures"
+
+    def open_key(self, hostname: str) -> str:
+        return f"{self.prefix}:{hostname}:open"
+
+    def open_hosts(self, hostnames: Iterable[str]) -> Set[str]:
+        """Function responsible for getting the hosts whose feeds are skipped
+
+        Parameters
+        ----------
+        hostnames: Iterable[str]
+
+        Returns
+        -------
+        Set with the open hosts
+        """
+        hostnames = list(set(hostnames))
+        pipeline = self.connection.pipeline(transaction=False)
+        for hostname in hostnames:
+            pipeline.exists(self.open_key(hostname))
+        return {
+            hostname for hostname, open_ in zip(hostnames, pipeline.execute()) if open_
+        }
+
+    def allowed(
+        self, feeds: Iterable[Feed], at: Optional[datetime] = None
+    ) -> List[Feed]:
+        """Function responsible for filtering out the quarantined feeds
+        and the feeds of open hosts
+
+        Parameters
+        ----------
+        feeds: Iterable[Feed]
+        at: datetime
+            Defaults to now
+
+        Returns
+        -------
+        List of the feeds that can be refreshed
+        """
+        at = at or now()
+        feeds = [
+            feed
+            for feed in feeds
+            if feed.quarantined_until is None or feed.quarantined_until <= at
+        ]
+        open_hosts = self.open_hosts(host(feed) for feed in feeds)
+        return [feed for feed in feeds if host(feed) not in open_hosts]
+
+    def failed(
+        self, feed: Feed, error: Exception, at: Optional[datetime] = None
+    ) -> List[str]:
+        """Function responsible for counting a failure of a feed, quarantining it
+        after too many. Feeds asking to retry later with `Retry-After` are not
+        fetched before that either.
+
+        Parameters
+        ----------
+        feed: Feed
+        error: Exception
+            Only the `FEED_ERRORS` are counted
+        at: datetime
+            Defaults to now
+
+        Returns
+        -------
+        List of the feed fields changed, to be saved
+        """
+        if not isinstance(error, FEED_ERRORS):
+            return []
+        at = at or now()
+        feed.failure_count += 1
+        feed.last_error = str(error)[:200]
+        seconds = quarantine_seconds(feed.failure_count)
+        if isinstance(error, FetchFeedError):
+            seconds = max(seconds, error.retry_after or 0)
+            if is_transient(error.status):
+                self.host_failed(host(feed))
+        if seconds:
+            feed.quarantined_until = at + timedelta(seconds=seconds)
+        return FAILURE_FIELDS
+
+    def succeeded(self, feed: Feed) -> List[str]:
+        """Function responsible for resetting the failures of a feed
+
+        Parameters
+        ----------
+        feed: Feed
+
+        Returns
+        -------
+        List of the feed fields changed, to be saved
+        """
+        if not feed.failure_count and feed.quarantined_until is None:
+            return []
+        feed.failure_count = 0
+        feed.last_error = None
+        feed.quarantined_until = None
+        return FAILURE_FIELDS
+
+    def host_failed(self, hostname: str) -> None:
+        """Function responsible for counting a transient failure of a host,
+        opening it once there are too many within the window
+
+        Parameters
+        ----------
+        hostname: str
+
+        Returns
+        -------
+
+        """
+        key = self.failures_key(hostname)
+        failures = self.connection.incr(key)
+        if failures == 1:
+            self.connection.expire(key, settings.HOST_FAILURE_WINDOW)
+        if failures >= settings.HOST_FAILURE_THRESHOLD:
+            pipeline = self.connection.pipeline()
+            pipeline.set(self.open_key(hostname), 1, ex=settings.HOST_COOLDOWN)
+            pipeline.delete(key)
+            pipeline.execute()
+
+    def hosts_succeeded(self, hostnames: Iterable[str]) -> None:
+        """Function responsible for resetting the failures of hosts that answered
+
+        Parameters
+        ----------
+        hostnames: Iterable[str]
+
+        Returns
+        -------
+
+        """
+        keys = [self.failures_key(hostname) for hostname in set(hostnames)]
+        if keys:
+            self.connection.delete(*keys)
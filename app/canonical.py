@@ -0,0 +1,130 @@
+import re
+from typing import Iterable, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+from django.conf import settings
+
+from app.models.feed import Feed
+from app.store import get_redis_connection
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+PERCENT_ESCAPE = re.compile(r"%[0-9a-fA-F]{2}")
+
+
+def canonical_url(url: str) -> str:
+    """Function responsible for normalizing a feed url, so the different ways of
+    writing the same url have the same key.
+    The scheme and host are lower cased, http is taken as https, default ports,
+    fragments and trailing slashes are removed and percent escapes upper cased.
+
+    Parameters
+    ----------
+    url: str
+
+    Returns
+    -------
+    str with the canonical url
+    """
+    url = url.strip()
+    if "://" not in url:
+        url = f"http://{url}"
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = parts.hostname or ""
+    try:
+        host = host.encode("idna").decode("ascii")
+    except UnicodeError:
+        pass
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    netloc = host if port in (None, DEFAULT_PORTS.get(scheme)) else f"{host}:{port}"
+    if parts.username:
+        userinfo = parts.username
+        if parts.password:
+            userinfo += f":{parts.password}"
+        netloc = f"{userinfo}@{netloc}"
+    path = PERCENT_ESCAPE.sub(lambda match: match.group().upper(), parts.path)
+    return urlunsplit(
+        (
+            "https" if scheme in DEFAULT_PORTS else scheme,
+            netloc,
+            path.rstrip("/") or "/",
+            parts.query,
+            "",
+        )
+    )
+
+
+class FeedUrlCache:
+    """Cache of the feed id of the urls submitted by the users, by canonical url.
+    Urls redirecting to a known feed are cached too, so adding a known feed
+    does not need to fetch it.
+
+    """
+
+    prefix = "feed-url"
+
+    def __init__(self):
+        self.connection = get_redis_connection()
+
+    def key(self, url: str) -> str:
+        return f"{self.prefix}:{canonical_url(url)}"
+
+    def get(self, url: str) -> Optional[int]:
+        """Function responsible for getting the feed id of an url
+
+        Parameters
+        ----------
+        url: str
+
+        Returns
+        -------
+        int, or None if the url is not cached
+        """
+        feed_id = self.connection.get(self.key(url))
+        return int(feed_id) if feed_id is not None else None
+
+    def set(self, urls: Iterable[str], feed_id: int) -> None:
+        """Function responsible for caching the feed id of urls
+
+        Parameters
+        ----------
+        urls: Iterable[str]
+        feed_id: int
+
+        Returns
+        -------
+
+        """
+        pipeline = self.connection.pipeline(transaction=False)
+        for key in {self.key(url) for url in urls}:
+            pipeline.set(key, feed_id, ex=settings.FEED_URL_CACHE_TTL)
+        pipeline.execute()
+
+
+def find_feed(url: str) -> Optional[int]:
+    """Function responsible for finding the feed of an url without fetching it,
+    first in the `FeedUrlCache` and then by canonical url in the database
+
+    Parameters
+    ----------
+    url: str
+
+    Returns
+    -------
+    int with the feed id, or None if the feed is not known
+    """
+    cache = FeedUrlCache()
+    feed_id = cache.get(url)
+    if feed_id is not None and Feed.objects.filter(id=feed_id).exists():
+        return feed_id
+    feed_id = (
+        Feed.objects.filter(canonical_url=canonical_url(url))
+        .values_list("id", flat=True)
+        .first()
+    )
+    if feed_id is not None:
+        cache.set([url], feed_id)
+    return feed_id
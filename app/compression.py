@@ -0,0 +1,145 @@
+import time
+from typing import Dict, List, Optional
+
+import zstandard
+from django.conf import settings
+
+from app.models.compression_dictionary import CompressionDictionary
+
+# Start of every zstd frame. Stored values without it are the utf-8 text, which
+# never starts with these bytes as 0xb5 can not follow an ascii character in utf-8
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+class Dictionaries:
+    """Dictionaries loaded in the process. A dictionary never changes once trained,
+    so it is loaded once by its id, and the latest one, that compresses, is looked up
+    again every `COMPRESSION_DICTIONARY_RELOAD` seconds.
+
+    """
+
+    def __init__(self):
+        self.by_id: Dict[int, zstandard.ZstdCompressionDict] = {}
+        self.latest_id: Optional[int] = None
+        self.checked_at: Optional[float] = None
+
+    def get(self, dict_id: int) -> zstandard.ZstdCompressionDict:
+        """Function responsible for getting a dictionary by its id
+
+        Parameters
+        ----------
+        dict_id: int
+            zstd dictionary id, as written in the frames
+
+        Returns
+        -------
+        ZstdCompressionDict
+        """
+        dictionary = self.by_id.get(dict_id)
+        if dictionary is None:
+            data = CompressionDictionary.objects.values_list("data", flat=True).get(
+                dict_id=dict_id
+            )
+            dictionary = zstandard.ZstdCompressionDict(bytes(data))
+            dictionary.precompute_compress(level=settings.COMPRESSION_LEVEL)
+            self.by_id[dict_id] = dictionary
+        return dictionary
+
+    def latest(self) -> Optional[zstandard.ZstdCompressionDict]:
+        """Function responsible for getting the dictionary new values are
+        compressed with
+
+        Returns
+        -------
+        ZstdCompressionDict or None, without trained dictionaries
+        """
+        at = time.monotonic()
+        if (
+            self.checked_at is None
+            or at - self.checked_at >= settings.COMPRESSION_DICTIONARY_RELOAD
+        ):
+            self.latest_id = (
+                CompressionDictionary.objects.order_by("-id")
+                .values_list("dict_id", flat=True)
+                .first()
+            )
+            self.checked_at = at
+        return self.get(self.latest_id) if self.latest_id else None
+
+    def clear(self):
+        self.by_id.clear()
+        self.latest_id = None
+        self.checked_at = None
+
+
+dictionaries = Dictionaries()
+
+
+def compress(text: str) -> bytes:
+    """Function responsible for compressing a text with the latest dictionary.
+    Texts shorter than `COMPRESSION_MIN_SIZE` bytes, or that do not get smaller,
+    are stored as they are
+
+    Parameters
+    ----------
+    text: str
+
+    Returns
+    -------
+    bytes, a zstd frame or the utf-8 text
+    """
+    data = text.encode()
+    if len(data) < settings.COMPRESSION_MIN_SIZE:
+        return data
+    dictionary = dictionaries.latest()
+    # zstandard does not take a `dict_data` of None
+    options = {"dict_data": dictionary} if dictionary is not None else {}
+    compressor = zstandard.ZstdCompressor(level=settings.COMPRESSION_LEVEL, **options)
+    frame = compressor.compress(data)
+    return frame if len(frame) < len(data) else data
+
+
+def decompress(data: bytes) -> str:
+    """Function responsible for decompressing a value stored by `compress`, with
+    the dictionary it was compressed with
+
+    Parameters
+    ----------
+    data: bytes
+
+    Returns
+    -------
+    str
+    """
+    if not data.startswith(ZSTD_MAGIC):
+        return data.decode()
+    dict_id = zstandard.get_frame_parameters(data).dict_id
+    options = {"dict_data": dictionaries.get(dict_id)} if dict_id else {}
+    decompressor = zstandard.ZstdDecompressor(**options)
+    return decompressor.decompress(data).decode()
+
+
+def train_dictionary(samples: List[str], size: int = None) -> CompressionDictionary:
+    """Function responsible for training a dictionary on sample texts, compressing
+    the values stored from now on
+
+    Parameters
+    ----------
+    samples: List[str]
+        Texts like the ones to be compressed, hundreds of them at least
+    size: int
+        Size of the dictionary in bytes, default `COMPRESSION_DICTIONARY_SIZE`.
+
+    Returns
+    -------
+    CompressionDictionary
+    """
+    dictionary = zstandard.train_dictionary(
+        size or settings.COMPRESSION_DICTIONARY_SIZE,
+        [sample.encode() for sample in samples],
+    )
+    trained = CompressionDictionary.objects.create(
+        dict_id=dictionary.dict_id(), data=dictionary.as_bytes(), samples=len(samples)
+    )
+    dictionaries.clear()
+    return trained
@@ -1,3 +1,8 @@
+from typing import Optional
+
+import dramatiq
+
+
 class Error(Exception):
     """Base class for other exceptions"""
 
@@ -22,7 +27,48 @@ class ParseEntriesError(Error):
     pass
 
 
+class SubscribeFeedError(Error):
+    """Class for subscribe_feed exceptions"""
+
+    pass
+
+
 class UpdateFeedError(Error):
     """Class for update_feed exceptions"""
 
     pass
+
+
+class FetchFeedError(UpdateFeedError):
+    """Class for feeds that could not be fetched, with the response status
+    and `Retry-After` seconds when there was a response"""
+
+    def __init__(
+        self,
+        message: str,
+        status: Optional[int] = None,
+        retry_after: Optional[int] = None,
+    ):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class RetryFeedError(UpdateFeedError, dramatiq.Retry):
+    """Class for update_feed exceptions worth retrying, after `delay` milliseconds
+    or the `Retries` middleware backoff"""
+
+    def __init__(self, message: str, delay: Optional[int] = None):
+        super().__init__(message, delay)
+
+
+class UnsupportedDocumentError(Error):
+    """Class for documents a feed parser can not handle"""
+
+    pass
+
+
+class ContentEncodingError(Error):
+    """Class for response bodies that can not be decompressed"""
+
+    pass
@@ -0,0 +1,78 @@
+from typing import Tuple
+
+import lxml.html
+from django.conf import settings
+from django.utils.html import escape, strip_tags
+from django.utils.text import Truncator
+from lxml import etree
+
+# Elements whose text is set apart from the text around it
+BLOCK_TAGS = (
+    "blockquote",
+    "br",
+    "div",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "li",
+    "p",
+    "pre",
+    "td",
+    "tr",
+)
+
+
+def text_preview(html: str, length: int = None) -> str:
+    """Function responsible for building the plain text preview of an item
+    description, for the item lists
+
+    Parameters
+    ----------
+    html: str
+        Sanitized description
+    length: int
+        Characters of the preview, default `ITEM_PREVIEW_LENGTH`.
+
+    Returns
+    -------
+    str, without markup and with the whitespace collapsed
+    """
+    length = length or settings.ITEM_PREVIEW_LENGTH
+    try:
+        root = lxml.html.fragment_fromstring(html, create_parent="div")
+        for element in root.iter(*BLOCK_TAGS):
+            element.tail = " " + (element.tail or "")
+        text = root.text_content()
+    except (etree.ParserError, ValueError):
+        text = strip_tags(html)
+    return Truncator(" ".join(text.split())).chars(length)
+
+
+def html_excerpt(html: str, length: int = None) -> Tuple[str, bool]:
+    """Function responsible for building the excerpt of an item description
+    shown in the item lists, of `length` characters of text with the tags left
+    open closed. Excerpts whose markup is over `ITEM_EXCERPT_MAX_SIZE`
+    are the escaped text preview instead.
+    The description is sanitized by the parsers, and so is the excerpt.
+
+    Parameters
+    ----------
+    html: str
+        Sanitized description
+    length: int
+        Characters of text, default `ITEM_EXCERPT_LENGTH`.
+
+    Returns
+    -------
+    Tuple with the excerpt and if it is shorter than the description
+    """
+    length = length or settings.ITEM_EXCERPT_LENGTH
+    if len(html) <= length:
+        return html, False
+    excerpt = Truncator(html).chars(length, html=True)
+    if len(excerpt) > settings.ITEM_EXCERPT_MAX_SIZE:
+        excerpt = escape(text_preview(html, length))
+    return excerpt, excerpt != html
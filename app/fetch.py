@@ -0,0 +1,591 @@
+import asyncio
+import io
+import os
+import tempfile
+import threading
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import BinaryIO, Coroutine, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+from django.conf import settings
+from django.utils.http import http_date
+from django.utils.timezone import now
+
+from app.exceptions import ContentEncodingError
+from app.metrics import FETCH_BODY_BYTES, FETCH_CONNECTIONS, FETCH_WIRE_BYTES
+from app.models.feed import Feed
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, without it `br` is not asked for
+    brotli = None
+
+ACCEPT_ENCODING = "gzip, deflate, br" if brotli else "gzip, deflate"
+
+
+@dataclass
+class FetchResult:
+    """Result of fetching a single feed
+
+    """
+
+    feed_id: Optional[int]
+    url: str
+    status: Optional[int] = None
+    body: bytes = b""
+    # Response headers, with lower case names as expected by feedparser
+    headers: Dict[str, str] = field(default_factory=dict)
+    elapsed: float = 0.0
+    error: Optional[str] = None
+    # Temporary file with the body of large documents, instead of `body`
+    stream: Optional[BinaryIO] = None
+    size: int = 0
+    # Bytes received before decompression
+    wire_size: int = 0
+    # If the request went over a kept-alive connection
+    reused: Optional[bool] = None
+
+    def __post_init__(self):
+        self.size = self.size or len(self.body)
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status == 304
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.status is not None and self.status < 300
+
+
+@dataclass
+class FetchStats:
+    """Throughput stats of a batch of fetches
+
+    """
+
+    feeds: int = 0
+    bytes: int = 0
+    wire_bytes: int = 0
+    reused: int = 0
+    elapsed: float = 0.0
+    statuses: Counter = field(default_factory=Counter)
+    failed: List[int] = field(default_factory=list)
+    # Error of each failed feed
+    errors: Dict[int, str] = field(default_factory=dict)
+    # Feeds not fetched because they were refreshed elsewhere
+    coalesced: int = 0
+    # Feeds not fetched because they or their host are quarantined
+    quarantined: int = 0
+
+    def add(self, result: FetchResult) -> None:
+        self.feeds += 1
+        self.bytes += result.size
+        self.wire_bytes += result.wire_size
+        self.reused += bool(result.reused)
+        self.statuses[result.status or "error"] += 1
+
+    def merge(self, other: "FetchStats") -> None:
+        self.feeds += other.feeds
+        self.bytes += other.bytes
+        self.wire_bytes += other.wire_bytes
+        self.reused += other.reused
+        self.elapsed += other.elapsed
+        self.statuses.update(other.statuses)
+        self.failed.extend(other.failed)
+        self.errors.update(other.errors)
+        self.coalesced += other.coalesced
+        self.quarantined += other.quarantined
+
+    @property
+    def feeds_per_second(self) -> float:
+        return self.feeds / self.elapsed if self.elapsed else 0.0
+
+
+def conditional_headers(feed: Feed) -> Dict[str, str]:
+    """Function responsible for building the conditional GET headers of a feed
+
+    Parameters
+    ----------
+    feed: Feed
+
+    Returns
+    -------
+    Dict with `If-None-Match` and/or `If-Modified-Since`
+    """
+    headers = {}
+    if feed.etag:
+        headers["If-None-Match"] = feed.etag
+    if feed.last_build_date:
+        headers["If-Modified-Since"] = http_date(feed.last_build_date.timestamp())
+    return headers
+
+
+def cache_max_age(headers: Dict[str, str]) -> Optional[int]:
+    """Function responsible for getting how long a response may be cached,
+    from the `Cache-Control` max-age or the `Expires` headers
+
+    Parameters
+    ----------
+    headers: Dict[str, str]
+        Response headers, with lower case names
+
+    Returns
+    -------
+    Seconds, or None if the server did not say
+    """
+    for directive in headers.get("cache-control", "").split(","):
+        name, _, value = directive.strip().partition("=")
+        if name.lower() == "max-age" and value.isdigit():
+            return int(value)
+
+    try:
+        expires = parsedate_to_datetime(headers["expires"])
+        date = parsedate_to_datetime(headers["date"]) if "date" in headers else now()
+        return max(int((expires - date).total_seconds()), 0)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class BodyDecoder:
+    """Incremental decoder of a response body, by its `Content-Encoding`
+
+    """
+
+    def __init__(self, encoding: Optional[str]):
+        self.encoding = (encoding or "identity").strip().lower()
+        if self.encoding == "gzip":
+            self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif self.encoding == "deflate":
+            self.decompressor = zlib.decompressobj()
+        elif self.encoding == "br" and brotli:
+            self.decompressor = brotli.Decompressor()
+        elif self.encoding == "identity":
+            self.decompressor = None
+        else:
+            raise ContentEncodingError(f"Unsupported encoding {self.encoding}")
+        self.started = False
+
+    def decode(self, chunk: bytes) -> bytes:
+        """Function responsible for decompressing the next chunk of the body
+
+        Parameters
+        ----------
+        chunk: bytes
+
+        Returns
+        -------
+        bytes, decompressed
+
+        Error
+        -----
+            ContentEncodingError if the chunk is not valid for the encoding.
+        """
+        if self.decompressor is None or not chunk:
+            return chunk
+        try:
+            if self.encoding == "br":
+                # `process` in Brotli, `decompress` in brotlipy
+                process = getattr(self.decompressor, "process", None)
+                return (process or self.decompressor.decompress)(chunk)
+            try:
+                data = self.decompressor.decompress(chunk)
+            except zlib.error:
+                if self.encoding != "deflate" or self.started:
+                    raise
+                # Some servers send raw deflate, without the zlib header
+                self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+                data = self.decompressor.decompress(chunk)
+            self.started = True
+            return data
+        except Exception as e:
+            raise ContentEncodingError(f"Invalid {self.encoding} body") from e
+
+    def flush(self) -> bytes:
+        if self.decompressor is None or self.encoding == "br":
+            return b""
+        return self.decompressor.flush()
+
+
+async def _on_connection_create_end(session, context, params) -> None:
+    result = context.trace_request_ctx
+    result.reused = False
+    FETCH_CONNECTIONS.labels(urlsplit(result.url).hostname, "new").inc()
+
+
+async def _on_connection_reuseconn(session, context, params) -> None:
+    result = context.trace_request_ctx
+    result.reused = True
+    FETCH_CONNECTIONS.labels(urlsplit(result.url).hostname, "reused").inc()
+
+
+class HttpClient:
+    """Keep-alive HTTP client shared by the tasks of a worker process.
+    Requests from every thread run on one event loop, in its own thread,
+    so connections, resolved hosts and TLS sessions are reused across tasks.
+    Bodies are asked compressed and decompressed here, counting the bytes
+    received in `FETCH_WIRE_BYTES`.
+
+    """
+
+    def __init__(self, limit: int, limit_per_host: int):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.lock = threading.Lock()
+        self.pid = None
+        self.loop = None
+        self.thread = None
+        self.session = None
+
+    def start(self) -> None:
+        """Function responsible for starting the event loop and opening the session,
+        once in each process
+
+        Returns
+        -------
+
+        """
+        with self.lock:
+            # A forked process can not use the loop thread of its parent
+            if self.pid == os.getpid():
+                return
+            self.loop = asyncio.new_event_loop()
+            self.thread = threading.Thread(
+                target=self.loop.run_forever, name="http-client", daemon=True
+            )
+            self.thread.start()
+            self.session = asyncio.run_coroutine_threadsafe(
+                self.open(), self.loop
+            ).result()
+            self.pid = os.getpid()
+
+    async def open(self) -> aiohttp.ClientSession:
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(_on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(_on_connection_reuseconn)
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=settings.FETCH_KEEPALIVE_TIMEOUT,
+            use_dns_cache=True,
+            ttl_dns_cache=settings.FETCH_DNS_CACHE_TTL,
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            headers={
+                "User-Agent": settings.FETCH_USER_AGENT,
+                "Accept-Encoding": ACCEPT_ENCODING,
+            },
+            auto_decompress=False,
+            trace_configs=[trace_config],
+        )
+
+    def close(self) -> None:
+        """Function responsible for closing the connections and stopping the loop
+
+        Returns
+        -------
+
+        """
+        with self.lock:
+            if self.pid != os.getpid():
+                return
+            asyncio.run_coroutine_threadsafe(self.session.close(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+            self.pid = None
+
+    def run(self, coroutine: Coroutine):
+        """Function responsible for running a coroutine on the client loop,
+        from synchronous code
+
+        Parameters
+        ----------
+        coroutine: Coroutine
+
+        Returns
+        -------
+        The result of the coroutine
+        """
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    async def fetch(
+        self,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[int] = None,
+        size_hint: Optional[int] = None,
+    ) -> FetchResult:
+        """Function responsible for fetching an url.
+        Bodies larger than `FEED_STREAMING_THRESHOLD` are written to a temporary file
+
+        Parameters
+        ----------
+        url: str
+        headers: Dict[str, str]
+            Request headers, optional.
+        timeout: int
+            Seconds, default `FETCH_TIMEOUT`.
+        size_hint: int
+            Size of the body last time, optional.
+
+        Returns
+        -------
+        FetchResult, with `error` filled if the fetch failed
+        """
+        result = FetchResult(feed_id=None, url=url)
+        start = time.monotonic()
+        try:
+            async with self.session.get(
+                url,
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=timeout or settings.FETCH_TIMEOUT),
+                trace_request_ctx=result,
+            ) as resp:
+                result.url = str(resp.url)
+                result.status = resp.status
+                result.headers = {
+                    name.lower(): value for name, value in resp.headers.items()
+                }
+                decoder = BodyDecoder(result.headers.get("content-encoding"))
+                size = resp.content_length or size_hint or 0
+                if size > settings.FEED_STREAMING_THRESHOLD:
+                    result.stream, result.wire_size = await self.spool(resp, decoder)
+                    result.size = result.stream.seek(0, io.SEEK_END)
+                    result.stream.seek(0)
+                else:
+                    body = await resp.read()
+                    result.wire_size = len(body)
+                    result.body = decoder.decode(body) + decoder.flush()
+                    result.size = len(result.body)
+                if resp.status >= 400:
+                    result.error = f"HTTP {resp.status}"
+        except (aiohttp.ClientError, asyncio.TimeoutError, ContentEncodingError) as e:
+            result.error = repr(e)
+        result.elapsed = time.monotonic() - start
+        host = urlsplit(url).hostname
+        if host:
+            FETCH_WIRE_BYTES.labels(host).inc(result.wire_size)
+            FETCH_BODY_BYTES.labels(host).inc(result.size)
+        return result
+
+    @staticmethod
+    async def spool(
+        resp: aiohttp.ClientResponse, decoder: BodyDecoder
+    ) -> Tuple[BinaryIO, int]:
+        """Function responsible for writing a response body to a temporary file,
+        in chunks of `FEED_STREAMING_CHUNK_SIZE`
+
+        Parameters
+        ----------
+        resp: aiohttp.ClientResponse
+        decoder: BodyDecoder
+
+        Returns
+        -------
+        Temporary file, removed once closed, and the bytes received
+        """
+        stream = tempfile.TemporaryFile()
+        wire_size = 0
+        async for chunk in resp.content.iter_chunked(
+            settings.FEED_STREAMING_CHUNK_SIZE
+        ):
+            wire_size += len(chunk)
+            stream.write(decoder.decode(chunk))
+        stream.write(decoder.flush())
+        return stream, wire_size
+
+    def get(
+        self,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        size_hint: Optional[int] = None,
+    ) -> FetchResult:
+        """Function responsible for fetching an url from synchronous code, see `fetch`
+
+        Parameters
+        ----------
+        url: str
+        headers: Dict[str, str]
+            Request headers, optional.
+        size_hint: int
+            Size of the body last time, optional.
+
+        Returns
+        -------
+        FetchResult
+        """
+        return self.run(self.fetch(url, headers, size_hint=size_hint))
+
+    async def submit(
+        self, url: str, data: Dict[str, str], timeout: Optional[int] = None
+    ) -> FetchResult:
+        """Function responsible for posting a form to an url
+
+        Parameters
+        ----------
+        url: str
+        data: Dict[str, str]
+            Form fields
+        timeout: int
+            Seconds, default `FETCH_TIMEOUT`.
+
+        Returns
+        -------
+        FetchResult, with `error` filled if the request failed
+        """
+        result = FetchResult(feed_id=None, url=url)
+        start = time.monotonic()
+        try:
+            async with self.session.post(
+                url,
+                data=data,
+                timeout=aiohttp.ClientTimeout(total=timeout or settings.FETCH_TIMEOUT),
+                trace_request_ctx=result,
+            ) as resp:
+                result.status = resp.status
+                result.headers = {
+                    name.lower(): value for name, value in resp.headers.items()
+                }
+                decoder = BodyDecoder(result.headers.get("content-encoding"))
+                body = await resp.read()
+                result.wire_size = len(body)
+                result.body = decoder.decode(body) + decoder.flush()
+                result.size = len(result.body)
+                if resp.status >= 400:
+                    result.error = f"HTTP {resp.status}"
+        except (aiohttp.ClientError, asyncio.TimeoutError, ContentEncodingError) as e:
+            result.error = repr(e)
+        result.elapsed = time.monotonic() - start
+        return result
+
+    def post(self, url: str, data: Dict[str, str]) -> FetchResult:
+        """Function responsible for posting a form from synchronous code, see `submit`
+
+        Parameters
+        ----------
+        url: str
+        data: Dict[str, str]
+            Form fields
+
+        Returns
+        -------
+        FetchResult
+        """
+        return self.run(self.submit(url, data))
+
+
+_http_clients: Dict[Tuple[int, int], HttpClient] = {}
+_http_clients_lock = threading.Lock()
+
+
+def get_http_client(
+    limit: Optional[int] = None, limit_per_host: Optional[int] = None
+) -> HttpClient:
+    """Function responsible for returning the HTTP client of the process.
+    The client is created once for each connection limits, by default
+    `FETCH_CONCURRENCY` and `FETCH_PER_HOST`.
+
+    Parameters
+    ----------
+    limit: int
+        Open connections, optional.
+    limit_per_host: int
+        Open connections to each host, optional.
+
+    Returns
+    -------
+    HttpClient
+    """
+    limits = (
+        limit or settings.FETCH_CONCURRENCY,
+        limit_per_host or settings.FETCH_PER_HOST,
+    )
+    with _http_clients_lock:
+        if limits not in _http_clients:
+            _http_clients[limits] = HttpClient(*limits)
+        return _http_clients[limits]
+
+
+def close_http_clients() -> None:
+    """Function responsible for closing every HTTP client of the process
+
+    Returns
+    -------
+
+    """
+    with _http_clients_lock:
+        for client in _http_clients.values():
+            client.close()
+        _http_clients.clear()
+
+
+class FeedFetcher:
+    """Asyncio fetcher, downloads many feeds at once with the process `HttpClient`.
+    The number of open connections is capped globally by `concurrency`
+    and for each host by `per_host`.
+
+    """
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        per_host: Optional[int] = None,
+        timeout: Optional[int] = None,
+    ):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout or settings.FETCH_TIMEOUT
+        self.client = get_http_client(concurrency, per_host)
+
+    async def fetch(self, feed: Feed) -> FetchResult:
+        """Function responsible for fetching one feed with a conditional GET
+
+        Parameters
+        ----------
+        feed: Feed
+
+        Returns
+        -------
+        FetchResult, with `error` filled if the fetch failed
+        """
+        result = await self.client.fetch(
+            feed.link,
+            conditional_headers(feed),
+            timeout=self.timeout,
+            size_hint=feed.content_length,
+        )
+        result.feed_id = feed.id
+        return result
+
+    async def fetch_all(self, feeds: Iterable[Feed]) -> List[FetchResult]:
+        """Function responsible for fetching all feeds concurrently
+
+        Parameters
+        ----------
+        feeds: Iterable[Feed]
+
+        Returns
+        -------
+        List of FetchResult, in the same order as `feeds`
+        """
+        return await asyncio.gather(*(self.fetch(feed) for feed in feeds))
+
+    def run(self, feeds: Iterable[Feed]) -> List[FetchResult]:
+        """Function responsible for running `fetch_all` from synchronous code
+
+        Parameters
+        ----------
+        feeds: Iterable[Feed]
+
+        Returns
+        -------
+        List of FetchResult
+        """
+        return self.client.run(self.fetch_all(feeds))
@@ -0,0 +1,63 @@
+from typing import Any, Optional
+
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+from app.compression import compress, decompress
+
+
+class CompressedText(bytes):
+    """Stored value of a `CompressedTextField`, kept compressed until it is read
+
+    """
+
+    pass
+
+
+class CompressedTextDescriptor(DeferredAttribute):
+    """Descriptor of a `CompressedTextField`, decompressing the value the first
+    time it is read and keeping the text in the instance
+
+    """
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, CompressedText):
+            value = instance.__dict__[self.field.attname] = decompress(value)
+        return value
+
+    def __set__(self, instance, value):
+        # A data descriptor, so reads go through __get__ once the value is set
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.BinaryField):
+    """Text field stored compressed with zstd, see `app.compression`.
+    Instances read and assign `str` as with a `TextField`, the value is only
+    decompressed when the attribute is read, so rows loaded without showing it
+    cost no decompression. `values()` and `values_list()` return the
+    `CompressedText` stored, the text is `decompress(value)`.
+
+    """
+
+    descriptor_class = CompressedTextDescriptor
+
+    def from_db_value(self, value, expression, connection) -> Optional[CompressedText]:
+        if value is None:
+            return value
+        return CompressedText(value)
+
+    def to_python(self, value: Any) -> Optional[str]:
+        if isinstance(value, (bytes, memoryview)):
+            return decompress(bytes(value))
+        return value
+
+    def get_prep_value(self, value: Any) -> Optional[bytes]:
+        if isinstance(value, str):
+            return compress(value)
+        return value
+
+    def value_to_string(self, obj) -> str:
+        return self.value_from_object(obj)
@@ -0,0 +1,259 @@
+from collections import defaultdict
+from itertools import groupby
+from operator import itemgetter
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef
+
+from app.bitmaps import RoaringBitmap
+from app.models import Item, ItemStateBitmap, UnreadCounter, UserFollowFeed, UserRelItem
+from app.models.user_rel_item import UserRelItemKind
+
+STATE_KINDS = (UserRelItemKind.read, UserRelItemKind.favorite)
+
+
+def load_states(
+    user_id: int, feed_ids: Iterable[int], kinds: Iterable[str] = STATE_KINDS
+) -> Dict[Tuple[int, str], RoaringBitmap]:
+    """Function responsible for loading the state bitmaps of a user, in one query
+
+    Parameters
+    ----------
+    user_id: int
+    feed_ids: Iterable[int]
+    kinds: Iterable[str]
+        Kinds of state to load, read and favorite by default
+
+    Returns
+    -------
+    Dict with the bitmap of each feed and kind, empty bitmaps for the missing ones
+    """
+    feed_ids = list(feed_ids)
+    kinds = list(kinds)
+    states = {
+        (feed_id, kind): RoaringBitmap() for feed_id in feed_ids for kind in kinds
+    }
+    rows = ItemStateBitmap.objects.filter(
+        user_id=user_id, feed_id__in=feed_ids, kind__in=kinds
+    ).values_list("feed_id", "kind", "data")
+    for feed_id, kind, data in rows:
+        states[feed_id, kind] = RoaringBitmap.deserialize(bytes(data))
+    return states
+
+
+def mark(
+    user_id: int, feed_id: int, kind: str, item_ids: Iterable[int], value: bool = True
+) -> RoaringBitmap:
+    """Function responsible for adding items to, or removing them from, a state
+    bitmap of a user. The row is locked while it is changed, so concurrent marks
+    of the same feed are applied one after the other, and the `UnreadCounter` of
+    the feed changes in the same transaction.
+
+    Parameters
+    ----------
+    user_id: int
+    feed_id: int
+        Feed of the items
+    kind: str
+        read or favorite
+    item_ids: Iterable[int]
+    value: bool
+        True to add the items, False to remove them
+
+    Returns
+    -------
+    RoaringBitmap, the new state
+    """
+    with transaction.atomic():
+        ItemStateBitmap.objects.get_or_create(
+            user_id=user_id, feed_id=feed_id, kind=kind
+        )
+        state = ItemStateBitmap.objects.select_for_update().get(
+            user_id=user_id, feed_id=feed_id, kind=kind
+        )
+        bitmap = state.bitmap
+        before = len(bitmap)
+        for item_id in item_ids:
+            if value:
+                bitmap.add(item_id)
+            else:
+                bitmap.discard(item_id)
+        state.data = bitmap.serialize()
+        state.save(update_fields=["data", "modified_at"])
+        if kind == UserRelItemKind.read and len(bitmap) != before:
+            UnreadCounter.objects.filter(user_id=user_id, feed_id=feed_id).update(
+                unread=F("unread") - (len(bitmap) - before)
+            )
+    return bitmap
+
+
+def unread_counts(user_id: int, feed_ids: Iterable[int]) -> Dict[int, int]:
+    """Function responsible for counting the items of each feed that a user did
+    not read, the items of the feed less its read bitmap
+
+    Parameters
+    ----------
+    user_id: int
+    feed_ids: Iterable[int]
+
+    Returns
+    -------
+    Dict with the number of unread items of each feed
+    """
+    feed_ids = list(feed_ids)
+    totals = dict(
+        Item.objects.filter(feed_id__in=feed_ids)
+        .values("feed_id")
+        .annotate(total=Count("id"))
+        .values_list("feed_id", "total")
+    )
+    states = load_states(user_id, feed_ids, [UserRelItemKind.read])
+    return {
+        feed_id: totals.get(feed_id, 0) - len(states[feed_id, UserRelItemKind.read])
+        for feed_id in feed_ids
+    }
+
+
+def load_unread_counts(user_id: int, feed_ids: Iterable[int]) -> Dict[int, int]:
+    """Function responsible for reading the `UnreadCounter` of a user for many
+    feeds, in one query. The counters that do not exist yet, for feeds followed
+    since, are created from `unread_counts`.
+
+    Parameters
+    ----------
+    user_id: int
+    feed_ids: Iterable[int]
+
+    Returns
+    -------
+    Dict with the number of unread items of each feed
+    """
+    feed_ids = list(feed_ids)
+    counts = dict(
+        UnreadCounter.objects.filter(user_id=user_id, feed_id__in=feed_ids).values_list(
+            "feed_id", "unread"
+        )
+    )
+    missing = [feed_id for feed_id in feed_ids if feed_id not in counts]
+    if missing:
+        created = unread_counts(user_id, missing)
+        UnreadCounter.objects.bulk_create(
+            [
+                UnreadCounter(user_id=user_id, feed_id=feed_id, unread=unread)
+                for feed_id, unread in created.items()
+            ],
+            ignore_conflicts=True,
+        )
+        counts.update(created)
+    return counts
+
+
+def reconcile_counters() -> Tuple[int, int]:
+    """Function responsible for repairing the `UnreadCounter` that drifted from
+    the items of their feed less the read bitmap of their user, and creating the
+    missing ones of the followed feeds. A counter is only repaired if it did not
+    change since it was read, the changes made meanwhile are left to the next run.
+
+    Returns
+    -------
+    Tuple with the number of counters repaired and created
+    """
+    counters = list(
+        UnreadCounter.objects.order_by("user_id").values_list(
+            "id", "user_id", "feed_id", "unread"
+        )
+    )
+    totals = dict(
+        Item.objects.values("feed_id")
+        .annotate(total=Count("id"))
+        .values_list("feed_id", "total")
+    )
+    repaired = 0
+    for user_id, group in groupby(counters, key=itemgetter(1)):
+        group = list(group)
+        states = load_states(
+            user_id, [feed_id for _, _, feed_id, _ in group], [UserRelItemKind.read]
+        )
+        for pk, _, feed_id, unread in group:
+            expected = totals.get(feed_id, 0) - len(
+                states[feed_id, UserRelItemKind.read]
+            )
+            if expected != unread:
+                repaired += UnreadCounter.objects.filter(pk=pk, unread=unread).update(
+                    unread=expected
+                )
+
+    follows = (
+        UserFollowFeed.objects.filter(disabled_at__isnull=True)
+        .exclude(
+            Exists(
+                UnreadCounter.objects.filter(
+                    user_id=OuterRef("user_id"), feed_id=OuterRef("feed_id")
+                )
+            )
+        )
+        .order_by("user_id")
+        .values_list("user_id", "feed_id")
+        .distinct()
+    )
+    created = 0
+    for user_id, group in groupby(follows, key=itemgetter(0)):
+        created += len(load_unread_counts(user_id, [feed_id for _, feed_id in group]))
+    return repaired, created
+
+
+def reference_states(
+    user_id: Optional[int] = None,
+) -> Dict[Tuple[int, int, str], RoaringBitmap]:
+    """Function responsible for building the state bitmaps from the `UserRelItem`
+    rows, read marks and favorites that were not unfavorited
+
+    Parameters
+    ----------
+    user_id: int
+        Only the states of this user, all of them if None
+
+    Returns
+    -------
+    Dict with the bitmap of each user, feed and kind
+    """
+    relations = UserRelItem.objects.filter(kind__in=STATE_KINDS).exclude(
+        kind=UserRelItemKind.favorite, disabled_at__isnull=False
+    )
+    if user_id is not None:
+        relations = relations.filter(user_id=user_id)
+    states = defaultdict(RoaringBitmap)
+    for user, feed_id, kind, item_id in relations.values_list(
+        "user_id", "item__feed_id", "kind", "item_id"
+    ).iterator():
+        states[user, feed_id, kind].add(item_id)
+    return dict(states)
+
+
+def rebuild_states(user_id: Optional[int] = None) -> int:
+    """Function responsible for replacing the state bitmaps by the ones built from
+    the `UserRelItem` rows, see `reference_states`
+
+    Parameters
+    ----------
+    user_id: int
+        Only the states of this user, all of them if None
+
+    Returns
+    -------
+    int, number of bitmaps written
+    """
+    states = reference_states(user_id)
+    with transaction.atomic():
+        existing = ItemStateBitmap.objects.all()
+        if user_id is not None:
+            existing = existing.filter(user_id=user_id)
+        existing.delete()
+        ItemStateBitmap.objects.bulk_create(
+            ItemStateBitmap(
+                user_id=user, feed_id=feed_id, kind=kind, data=bitmap.serialize()
+            )
+            for (user, feed_id, kind), bitmap in states.items()
+        )
+    return len(states)
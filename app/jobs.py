@@ -0,0 +1,103 @@
+from typing import Dict, Optional
+from uuid import uuid4
+
+import redis
+from django.conf import settings
+
+from app.store import get_redis_connection
+
+JOB_FIELDS = ("user_id", "total", "skipped", "done", "failed")
+
+
+class RefreshJob:
+    """Progress of a refresh of many feeds, kept in Redis so the page can poll it
+
+    """
+
+    prefix = "refresh-job"
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.key = f"{self.prefix}:{job_id}"
+        self.connection = get_redis_connection()
+
+    @classmethod
+    def create(cls, user_id: int, total: int, skipped: int = 0) -> "RefreshJob":
+        """Function responsible for creating a job
+
+        Parameters
+        ----------
+        user_id: int
+            User that asked for the refresh
+        total: int
+            Number of feeds sent to refresh
+        skipped: int
+            Number of feeds skipped because they are fresh
+
+        Returns
+        -------
+        RefreshJob
+        """
+        job = cls(uuid4().hex)
+        pipeline = job.connection.pipeline()
+        pipeline.hset(
+            job.key,
+            mapping={
+                "user_id": user_id,
+                "total": total,
+                "skipped": skipped,
+                "done": 0,
+                "failed": 0,
+            },
+        )
+        pipeline.expire(job.key, settings.REFRESH_JOB_TTL)
+        pipeline.execute()
+        return job
+
+    def add(self, done: int, failed: int = 0) -> None:
+        """Function responsible for adding the feeds finished by a batch.
+        Nothing is added to a job that expired, as it would be created again
+        without its owner nor expiration
+
+        Parameters
+        ----------
+        done: int
+            Number of feeds refreshed
+        failed: int
+            Number of feeds that failed to refresh
+
+        Returns
+        -------
+
+        """
+        with self.connection.pipeline() as pipeline:
+            while True:
+                try:
+                    pipeline.watch(self.key)
+                    if not pipeline.exists(self.key):
+                        return
+                    pipeline.multi()
+                    pipeline.hincrby(self.key, "done", done)
+                    pipeline.hincrby(self.key, "failed", failed)
+                    pipeline.execute()
+                    return
+                except redis.WatchError:
+                    # Another batch finished meanwhile
+                    continue
+
+    def progress(self) -> Optional[Dict]:
+        """Function responsible for reading the progress of the job
+
+        Returns
+        -------
+        Dict with the job counters and whether it `finished`,
+        or None if the job does not exist or expired
+        """
+        values = self.connection.hmget(self.key, JOB_FIELDS)
+        if values[0] is None:
+            return None
+        progress = {field: int(value or 0) for field, value in zip(JOB_FIELDS, values)}
+        progress["finished"] = (
+            progress["done"] + progress["failed"] >= progress["total"]
+        )
+        return progress
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from app.snapshots import SnapshotArchive
+
+
+class Command(BaseCommand):
+    """Command to remove the snapshots older than `SNAPSHOT_RETENTION`
+    and the archived bodies no longer used
+
+    """
+
+    help = "Prune the archive of fetched feed bodies"
+
+    def handle(self, *args, **options):
+        removed, deleted = SnapshotArchive().prune(now())
+        self.stdout.write(f"Removed {removed} snapshots and {deleted} bodies")
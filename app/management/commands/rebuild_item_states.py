@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from app.item_state import rebuild_states, reconcile_counters
+
+
+class Command(BaseCommand):
+    """Command to rebuild the read and favorite bitmaps of the users from their
+    `UserRelItem` marks, see `app.item_state`, and the unread counters after them
+
+    """
+
+    help = "Rebuild the read and favorite state bitmaps"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, help="Only the bitmaps of this user")
+
+    def handle(self, *args, **options):
+        written = rebuild_states(options["user"])
+        repaired, _ = reconcile_counters()
+        self.stdout.write(f"Wrote {written} bitmaps and repaired {repaired} counters")
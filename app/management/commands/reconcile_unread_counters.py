@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from app.item_state import reconcile_counters
+
+
+class Command(BaseCommand):
+    """Command to repair the unread counters that drifted, and create the missing
+    ones of the followed feeds, see `app.item_state.reconcile_counters`
+
+    """
+
+    help = "Reconcile the unread counters of the users"
+
+    def handle(self, *args, **options):
+        repaired, created = reconcile_counters()
+        self.stdout.write(f"Repaired {repaired} counters and created {created}")
@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.fetch import FeedFetcher, FetchStats
+from app.models import Feed
+from app.tasks import refresh_feeds
+
+
+class Command(BaseCommand):
+    """Command to refresh feeds in batches with the asyncio fetcher,
+    printing the throughput stats at the end
+
+    """
+
+    help = "Refresh feeds concurrently and print throughput stats"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "feed_ids", nargs="*", type=int, help="Feeds to refresh, default all"
+        )
+        parser.add_argument("--batch-size", type=int, default=settings.FETCH_BATCH_SIZE)
+        parser.add_argument("--concurrency", type=int, default=None)
+        parser.add_argument("--per-host", type=int, default=None)
+
+    def handle(self, *args, **options):
+        feed_ids = options["feed_ids"] or list(
+            Feed.objects.order_by("id").values_list("id", flat=True)
+        )
+        batch_size = options["batch_size"]
+        fetcher = FeedFetcher(
+            concurrency=options["concurrency"], per_host=options["per_host"]
+        )
+
+        stats = FetchStats()
+        for start in range(0, len(feed_ids), batch_size):
+            stats.merge(refresh_feeds(feed_ids[start : start + batch_size], fetcher))
+
+        statuses = ", ".join(
+            f"{status}: {count}" for status, count in stats.statuses.items()
+        )
+        self.stdout.write(
+            f"Refreshed {stats.feeds} feeds in {stats.elapsed:.2f}s "
+            f"({stats.feeds_per_second:.1f} feeds/s, "
+            f"{stats.bytes / 1024 / 1024:.2f} MB)"
+        )
+        self.stdout.write(
+            f"Over the wire: {stats.wire_bytes / 1024 / 1024:.2f} MB, "
+            f"{stats.reused} of {stats.feeds} requests on kept-alive connections"
+        )
+        self.stdout.write(f"Statuses: {statuses or '-'}")
+        if stats.coalesced:
+            self.stdout.write(f"Coalesced feeds: {stats.coalesced}")
+        if stats.quarantined:
+            self.stdout.write(f"Quarantined feeds: {stats.quarantined}")
+        if stats.failed:
+            self.stdout.write(f"Failed feeds: {stats.failed}")
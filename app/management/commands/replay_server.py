@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+
+from app.replay import ReplayConfig, ReplayServer
+
+
+class Command(BaseCommand):
+    """Command to run the `ReplayServer`, serving synthetic and archived feeds
+    to benchmark the ingestion without the internet
+
+    """
+
+    help = "Serve synthetic and recorded feeds locally"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8001)
+        parser.add_argument("--entries", type=int, default=ReplayConfig.entries)
+        parser.add_argument(
+            "--summary-size", type=int, default=ReplayConfig.summary_size
+        )
+        parser.add_argument(
+            "--latency", type=float, default=0.0, help="Milliseconds before answering"
+        )
+        parser.add_argument(
+            "--jitter", type=float, default=0.0, help="Random milliseconds added"
+        )
+        parser.add_argument(
+            "--no-etag", action="store_true", help="Answer without ETag or 304"
+        )
+        parser.add_argument("--change-rate", type=float, default=0.0)
+        parser.add_argument("--error-rate", type=float, default=0.0)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        config = ReplayConfig(
+            entries=options["entries"],
+            summary_size=options["summary_size"],
+            latency=options["latency"] / 1000,
+            jitter=options["jitter"] / 1000,
+            etag=not options["no_etag"],
+            change_rate=options["change_rate"],
+            error_rate=options["error_rate"],
+            seed=options["seed"],
+        )
+        server = ReplayServer(config, options["host"], options["port"])
+        self.stdout.write(
+            f"Serving feeds at {server.url(0)}, {server.url(0, 'atom')} "
+            f"and {server.recorded_url('<digest>')}"
+        )
+        try:
+            server.httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.httpd.server_close()
@@ -0,0 +1,60 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.models import FeedSnapshot
+from app.parsers import parse_document
+from app.snapshots import SnapshotArchive
+from app.streaming import StreamingFeedParser
+
+
+class Command(BaseCommand):
+    """Command to parse archived bodies again, without writing their items,
+    to see what a feed sent when its parse went wrong
+
+    """
+
+    help = "Parse archived feed bodies and print their entries or errors"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "snapshot_ids", nargs="*", type=int, help="Snapshots to replay"
+        )
+        parser.add_argument("--feed", type=int, help="Replay the snapshots of a feed")
+        parser.add_argument("--limit", type=int, default=10)
+        parser.add_argument(
+            "--body", action="store_true", help="Write the bodies instead of parsing"
+        )
+
+    def handle(self, *args, **options):
+        snapshots = FeedSnapshot.objects.order_by("-fetched_at")
+        if options["snapshot_ids"]:
+            snapshots = snapshots.filter(id__in=options["snapshot_ids"])
+        if options["feed"]:
+            snapshots = snapshots.filter(feed_id=options["feed"])
+        archive = SnapshotArchive()
+        for snapshot in snapshots[: options["limit"]]:
+            if options["body"]:
+                self.stdout.write(
+                    archive.read(snapshot.digest).decode(errors="replace")
+                )
+                continue
+            start = time.perf_counter()
+            try:
+                entries = self.replay(archive, snapshot)
+            except Exception as e:
+                self.stdout.write(f"{snapshot} status={snapshot.status} error={e!r}")
+                continue
+            self.stdout.write(
+                f"{snapshot} status={snapshot.status} entries={entries} "
+                f"in {(time.perf_counter() - start) * 1000:.1f} ms"
+            )
+
+    @staticmethod
+    def replay(archive: SnapshotArchive, snapshot: FeedSnapshot) -> int:
+        if snapshot.size > settings.FEED_STREAMING_THRESHOLD:
+            parser = StreamingFeedParser()
+            return sum(1 for _ in parser.iter_entries(archive.open(snapshot.digest)))
+        headers = {"content-type": snapshot.content_type}
+        return len(parse_document(archive.read(snapshot.digest), headers).entries)
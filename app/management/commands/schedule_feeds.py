@@ -0,0 +1,64 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from prometheus_client import start_http_server
+
+from app.scheduler import FeedScheduler
+from app.tasks import reconcile_unread_counters
+
+
+class Command(BaseCommand):
+    """Command to run the feed scheduler, dispatching feeds to refresh
+    as they become due, renewing the WebSub subscriptions and reconciling
+    the unread counters
+
+    """
+
+    help = "Run the TTL and cadence aware feed refresh scheduler"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="Dispatch the due feeds and exit"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.SCHEDULER_BATCH_SIZE
+        )
+        parser.add_argument(
+            "--metrics-port",
+            type=int,
+            default=None,
+            help="Port to expose the prometheus metrics",
+        )
+
+    def handle(self, *args, **options):
+        scheduler = FeedScheduler(batch_size=options["batch_size"])
+        scheduler.load()
+        scheduler.renew_subscriptions()
+
+        if options["once"]:
+            self.report(scheduler, scheduler.run_once())
+            return
+
+        if options["metrics_port"]:
+            start_http_server(options["metrics_port"])
+
+        loaded_at = reconciled_at = time.monotonic()
+        while True:
+            if time.monotonic() - loaded_at > settings.SCHEDULER_RELOAD_INTERVAL:
+                scheduler.load()
+                scheduler.renew_subscriptions()
+                loaded_at = time.monotonic()
+            if time.monotonic() - reconciled_at > settings.UNREAD_RECONCILE_INTERVAL:
+                reconcile_unread_counters.send()
+                reconciled_at = time.monotonic()
+            self.report(scheduler, scheduler.run_once())
+            wait = scheduler.seconds_until_due()
+            time.sleep(min(wait, settings.SCHEDULER_TICK) if wait is not None else 1)
+
+    def report(self, scheduler: FeedScheduler, dispatched: list) -> None:
+        if dispatched:
+            self.stdout.write(
+                f"Dispatched {len(dispatched)} feeds, "
+                f"max lag {scheduler.max_lag:.1f}s, {len(scheduler.queue)} scheduled"
+            )
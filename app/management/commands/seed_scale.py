@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.seeding import ScaleConfig, seed_scale
+
+
+class Command(BaseCommand):
+    """Command to generate a large synthetic dataset, to run the views and tasks
+    against production sized tables, see `app.seeding.seed_scale`
+
+    """
+
+    help = "Generate users, feeds, items and marks at scale"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=ScaleConfig.users)
+        parser.add_argument("--feeds", type=int, default=ScaleConfig.feeds)
+        parser.add_argument("--items", type=int, default=ScaleConfig.items)
+        parser.add_argument(
+            "--seed", type=int, default=ScaleConfig.seed, help="Same seed, same data"
+        )
+        parser.add_argument(
+            "--zipf",
+            type=float,
+            default=ScaleConfig.zipf,
+            help="Exponent of the feed popularity",
+        )
+        parser.add_argument(
+            "--pareto",
+            type=float,
+            default=ScaleConfig.pareto,
+            help="Shape of the items per feed, lower has a longer tail",
+        )
+        parser.add_argument("--read-window", type=int, default=ScaleConfig.read_window)
+        parser.add_argument("--batch-size", type=int, default=ScaleConfig.batch_size)
+
+    def handle(self, *args, **options):
+        config = ScaleConfig(
+            users=options["users"],
+            feeds=options["feeds"],
+            items=options["items"],
+            seed=options["seed"],
+            zipf=options["zipf"],
+            pareto=options["pareto"],
+            read_window=options["read_window"],
+            batch_size=options["batch_size"],
+        )
+        start = time.perf_counter()
+        try:
+            counts = seed_scale(config)
+        except ValueError as e:
+            raise CommandError(e)
+        for model, count in counts.items():
+            self.stdout.write(f"{model}: {count} rows")
+        self.stdout.write(f"Seeded in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.db.models.functions import Length
+
+from app.compression import train_dictionary
+from app.models import Item
+
+
+class Command(BaseCommand):
+    """Command to train the zstd dictionary item descriptions are compressed with,
+    on the latest descriptions, and optionally compress the stored ones again with it
+
+    """
+
+    help = "Train the compression dictionary of item descriptions"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--samples", type=int, default=settings.COMPRESSION_DICTIONARY_SAMPLES
+        )
+        parser.add_argument(
+            "--size", type=int, default=settings.COMPRESSION_DICTIONARY_SIZE
+        )
+        parser.add_argument(
+            "--recompress",
+            action="store_true",
+            help="Compress the stored descriptions with the new dictionary",
+        )
+
+    def handle(self, *args, **options):
+        items = Item.objects.order_by("-id").only("description")[: options["samples"]]
+        dictionary = train_dictionary(
+            [item.description for item in items], options["size"]
+        )
+        self.stdout.write(
+            f"Trained dictionary {dictionary.dict_id} on {dictionary.samples} "
+            f"descriptions ({len(dictionary.data) / 1024:.1f} KB)"
+        )
+        if options["recompress"]:
+            before = self.stored_size()
+            count = self.recompress(settings.ITEM_BATCH_SIZE)
+            self.stdout.write(
+                f"Compressed {count} descriptions again: "
+                f"{before / 1024 / 1024:.2f} MB to "
+                f"{self.stored_size() / 1024 / 1024:.2f} MB"
+            )
+
+    def stored_size(self) -> int:
+        return Item.objects.aggregate(size=Sum(Length("description")))["size"] or 0
+
+    def recompress(self, batch_size: int) -> int:
+        count, last_id = 0, 0
+        while True:
+            items = list(
+                Item.objects.filter(id__gt=last_id)
+                .order_by("id")
+                .only("id", "description")[:batch_size]
+            )
+            if not items:
+                return count
+            # Reading the description decompresses it, and the update compresses
+            # it with the latest dictionary
+            for item in items:
+                item.description = item.description
+            Item.objects.bulk_update(items, ["description"])
+            count += len(items)
+            last_id = items[-1].id
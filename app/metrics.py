@@ -0,0 +1,68 @@
+from django.utils.functional import cached_property
+
+
+class LazyMetric:
+    """Prometheus metric created on first use.
+    prometheus_client picks between in process and multiprocess values when
+    imported, and the dramatiq Prometheus middleware only sets
+    `prometheus_multiproc_dir` in `after_process_boot`, after the tasks are
+    imported. Metrics created at import time would never reach the files read
+    by the worker's exposition server.
+    """
+
+    def __init__(self, kind: str, name: str, documentation: str, *args, **kwargs):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.args = args
+        self.kwargs = kwargs
+
+    @cached_property
+    def metric(self):
+        import prometheus_client
+
+        metric_class = getattr(prometheus_client, self.kind)
+        return metric_class(self.name, self.documentation, *self.args, **self.kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.metric, name)
+
+
+SCHEDULE_LAG = LazyMetric(
+    "Histogram",
+    "pyfeedrss_schedule_lag_seconds",
+    "Seconds between a feed being due and being dispatched to refresh",
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600),
+)
+SCHEDULED_FEEDS = LazyMetric(
+    "Gauge", "pyfeedrss_scheduled_feeds", "Feeds in the scheduler queue"
+)
+DISPATCHED_FEEDS = LazyMetric(
+    "Counter",
+    "pyfeedrss_dispatched_feeds_total",
+    "Feeds dispatched to refresh by the scheduler",
+)
+PARSED_DOCUMENTS = LazyMetric(
+    "Counter",
+    "pyfeedrss_parsed_documents_total",
+    "Feed documents parsed, by parser",
+    ["parser"],
+)
+FETCH_CONNECTIONS = LazyMetric(
+    "Counter",
+    "pyfeedrss_fetch_connections_total",
+    "Connections used by the HTTP client, by host and if they were new or reused",
+    ["host", "connection"],
+)
+FETCH_WIRE_BYTES = LazyMetric(
+    "Counter",
+    "pyfeedrss_fetch_wire_bytes_total",
+    "Response bytes received by the HTTP client, before decompression",
+    ["host"],
+)
+FETCH_BODY_BYTES = LazyMetric(
+    "Counter",
+    "pyfeedrss_fetch_body_bytes_total",
+    "Response bytes handed to the parsers, after decompression",
+    ["host"],
+)
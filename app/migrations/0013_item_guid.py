@@ -0,0 +1,23 @@
+# Generated by Django 3.0.8 on 2026-10-18 15:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0012_userrelitem_disabled_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="item",
+            name="digest",
+            field=models.CharField(blank=True, max_length=40, verbose_name="Digest"),
+        ),
+        migrations.AddField(
+            model_name="item",
+            name="guid",
+            field=models.CharField(max_length=255, null=True, verbose_name="GUID"),
+        ),
+    ]
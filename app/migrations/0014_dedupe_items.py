@@ -0,0 +1,70 @@
+from hashlib import sha1
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+BATCH_SIZE = 1000
+
+
+def fill_identity(apps, schema_editor):
+    """Existing items have no entry id stored, so they are identified by their link.
+    The digest is the same computed by `app.models.item.item_digest`
+
+    """
+    Item = apps.get_model("app", "Item")
+    last_id = 0
+    while True:
+        items = list(
+            Item.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .only("id", "title", "link", "description", "published_at")[:BATCH_SIZE]
+        )
+        if not items:
+            return
+        for item in items:
+            item.guid = sha1(item.link.encode()).hexdigest()
+            content = "\0".join(
+                [
+                    item.title,
+                    item.link,
+                    item.description,
+                    item.published_at.strftime("%Y-%m-%dT%H:%M:%S"),
+                ]
+            )
+            item.digest = sha1(content.encode()).hexdigest()
+        Item.objects.bulk_update(items, ["guid", "digest"])
+        last_id = items[-1].id
+
+
+def dedupe_items(apps, schema_editor):
+    """Keep the oldest item of each (feed, guid), moving the user relations
+    of the duplicates to it before deleting them
+
+    """
+    Item = apps.get_model("app", "Item")
+    UserRelItem = apps.get_model("app", "UserRelItem")
+    duplicated = (
+        Item.objects.values("feed_id", "guid")
+        .annotate(keep_id=Min("id"), total=Count("id"))
+        .filter(total__gt=1)
+    )
+    for group in duplicated.iterator():
+        duplicates = Item.objects.filter(
+            feed_id=group["feed_id"], guid=group["guid"]
+        ).exclude(id=group["keep_id"])
+        UserRelItem._base_manager.filter(item__in=duplicates).update(
+            item_id=group["keep_id"]
+        )
+        duplicates.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0013_item_guid"),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_identity, migrations.RunPython.noop),
+        migrations.RunPython(dedupe_items, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.0.8 on 2026-10-18 15:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0014_dedupe_items"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="item",
+            name="guid",
+            field=models.CharField(max_length=255, verbose_name="GUID"),
+        ),
+        migrations.AddConstraint(
+            model_name="item",
+            constraint=models.UniqueConstraint(
+                fields=("feed", "guid"), name="unique_item_feed_guid"
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.0.8 on 2026-10-18 15:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0015_item_unique_guid"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="feed",
+            name="cache_max_age",
+            field=models.IntegerField(
+                blank=True, null=True, verbose_name="Cache max age"
+            ),
+        ),
+        migrations.AddField(
+            model_name="feed",
+            name="fetch_interval",
+            field=models.IntegerField(
+                blank=True, null=True, verbose_name="Fetch interval"
+            ),
+        ),
+        migrations.AddField(
+            model_name="feed",
+            name="fetched_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Fetched at"
+            ),
+        ),
+        migrations.AddField(
+            model_name="feed",
+            name="next_fetch_at",
+            field=models.DateTimeField(
+                blank=True, db_index=True, null=True, verbose_name="Next fetch at"
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.0.8 on 2026-10-18 15:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0016_feed_schedule"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="feed",
+            name="content_length",
+            field=models.IntegerField(
+                blank=True, null=True, verbose_name="Content length"
+            ),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.0.8 on 2026-10-18 15:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0017_feed_content_length"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="feed",
+            name="failure_count",
+            field=models.IntegerField(default=0, verbose_name="Failure count"),
+        ),
+        migrations.AddField(
+            model_name="feed",
+            name="last_error",
+            field=models.CharField(
+                blank=True, max_length=200, null=True, verbose_name="Last error"
+            ),
+        ),
+        migrations.AddField(
+            model_name="feed",
+            name="quarantined_until",
+            field=models.DateTimeField(
+                blank=True, db_index=True, null=True, verbose_name="Quarantined until"
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0018_feed_quarantine"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="feed",
+            name="canonical_url",
+            field=models.CharField(
+                blank=True, max_length=1000, null=True, verbose_name="Canonical URL"
+            ),
+        ),
+    ]
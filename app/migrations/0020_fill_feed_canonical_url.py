@@ -0,0 +1,69 @@
+import re
+from urllib.parse import urlsplit, urlunsplit
+
+from django.db import migrations
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+PERCENT_ESCAPE = re.compile(r"%[0-9a-fA-F]{2}")
+
+
+def canonical_url(url):
+    """The normalization of `app.canonical.canonical_url` when this migration
+    was written
+
+    """
+    url = url.strip()
+    if "://" not in url:
+        url = f"http://{url}"
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = parts.hostname or ""
+    try:
+        host = host.encode("idna").decode("ascii")
+    except UnicodeError:
+        pass
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    netloc = host if port in (None, DEFAULT_PORTS.get(scheme)) else f"{host}:{port}"
+    if parts.username:
+        userinfo = parts.username
+        if parts.password:
+            userinfo += f":{parts.password}"
+        netloc = f"{userinfo}@{netloc}"
+    path = PERCENT_ESCAPE.sub(lambda match: match.group().upper(), parts.path)
+    return urlunsplit(
+        (
+            "https" if scheme in DEFAULT_PORTS else scheme,
+            netloc,
+            path.rstrip("/") or "/",
+            parts.query,
+            "",
+        )
+    )
+
+
+def fill_canonical_urls(apps, schema_editor):
+    Feed = apps.get_model("app", "Feed")
+    seen = set()
+    feeds = []
+    for feed in Feed.objects.order_by("id").only("id", "link").iterator():
+        url = canonical_url(feed.link)
+        # Feeds sharing an url are left without one, the first keeps it
+        if url not in seen:
+            seen.add(url)
+            feed.canonical_url = url
+            feeds.append(feed)
+    Feed.objects.bulk_update(feeds, ["canonical_url"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0019_feed_canonical_url"),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_canonical_urls, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0020_fill_feed_canonical_url"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="feed",
+            name="canonical_url",
+            field=models.CharField(
+                blank=True,
+                max_length=1000,
+                null=True,
+                unique=True,
+                verbose_name="Canonical URL",
+            ),
+        ),
+    ]
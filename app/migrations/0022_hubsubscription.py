@@ -0,0 +1,87 @@
+# Generated by Django 3.0.8 on 2026-10-18 15:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import app.models.hub_subscription
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0021_feed_canonical_url_unique"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HubSubscription",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Created at"),
+                ),
+                (
+                    "modified_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Modified at"),
+                ),
+                ("hub", models.URLField(max_length=1000, verbose_name="Hub")),
+                ("topic", models.URLField(max_length=1000, verbose_name="Topic")),
+                ("secret", models.CharField(max_length=200, verbose_name="Secret")),
+                (
+                    "token",
+                    models.CharField(
+                        default=app.models.hub_subscription.new_token,
+                        max_length=64,
+                        unique=True,
+                        verbose_name="Token",
+                    ),
+                ),
+                (
+                    "state",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("active", "Active"),
+                            ("denied", "Denied"),
+                        ],
+                        default="pending",
+                        max_length=50,
+                        verbose_name="State",
+                    ),
+                ),
+                (
+                    "lease_expires_at",
+                    models.DateTimeField(
+                        blank=True,
+                        db_index=True,
+                        null=True,
+                        verbose_name="Lease expires at",
+                    ),
+                ),
+                (
+                    "requested_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Requested at"
+                    ),
+                ),
+                (
+                    "feed",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="subscription",
+                        to="app.Feed",
+                    ),
+                ),
+            ],
+            options={"abstract": False},
+        ),
+    ]
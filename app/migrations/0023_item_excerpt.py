@@ -0,0 +1,30 @@
+# Generated by Django 3.0.8 on 2026-10-18 16:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0022_hubsubscription"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="item",
+            name="excerpt",
+            field=models.TextField(blank=True, default="", verbose_name="Excerpt"),
+        ),
+        migrations.AddField(
+            model_name="item",
+            name="preview",
+            field=models.CharField(
+                blank=True, default="", max_length=300, verbose_name="Preview"
+            ),
+        ),
+        migrations.AddField(
+            model_name="item",
+            name="truncated",
+            field=models.BooleanField(default=False, verbose_name="Truncated"),
+        ),
+    ]
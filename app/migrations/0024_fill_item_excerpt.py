@@ -0,0 +1,76 @@
+import lxml.html
+from django.db import migrations
+from django.utils.html import escape, strip_tags
+from django.utils.text import Truncator
+from lxml import etree
+
+BATCH_SIZE = 500
+EXCERPT_LENGTH = 1000
+EXCERPT_MAX_SIZE = 8 * 1024
+PREVIEW_LENGTH = 200
+BLOCK_TAGS = (
+    "blockquote",
+    "br",
+    "div",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "li",
+    "p",
+    "pre",
+    "td",
+    "tr",
+)
+
+
+def text_preview(html, length=PREVIEW_LENGTH):
+    """The preview of `app.excerpts.text_preview` when this migration was written
+
+    """
+    try:
+        root = lxml.html.fragment_fromstring(html, create_parent="div")
+        for element in root.iter(*BLOCK_TAGS):
+            element.tail = " " + (element.tail or "")
+        text = root.text_content()
+    except (etree.ParserError, ValueError):
+        text = strip_tags(html)
+    return Truncator(" ".join(text.split())).chars(length)
+
+
+def html_excerpt(html):
+    """The excerpt of `app.excerpts.html_excerpt` when this migration was written
+
+    """
+    if len(html) <= EXCERPT_LENGTH:
+        return html, False
+    excerpt = Truncator(html).chars(EXCERPT_LENGTH, html=True)
+    if len(excerpt) > EXCERPT_MAX_SIZE:
+        excerpt = escape(text_preview(html, EXCERPT_LENGTH))
+    return excerpt, excerpt != html
+
+
+def fill_excerpts(apps, schema_editor):
+    Item = apps.get_model("app", "Item")
+    items = []
+    for item in Item.objects.order_by("id").only("id", "description").iterator():
+        item.excerpt, item.truncated = html_excerpt(item.description)
+        item.preview = text_preview(item.description)
+        items.append(item)
+        if len(items) == BATCH_SIZE:
+            Item.objects.bulk_update(items, ["excerpt", "truncated", "preview"])
+            items = []
+    Item.objects.bulk_update(items, ["excerpt", "truncated", "preview"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0023_item_excerpt"),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_excerpts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 3.0.8 on 2026-10-18 16:13
+
+from django.db import migrations, models
+
+import app.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0024_fill_item_excerpt"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CompressionDictionary",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Created at"),
+                ),
+                (
+                    "modified_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Modified at"),
+                ),
+                (
+                    "dict_id",
+                    models.BigIntegerField(unique=True, verbose_name="Dictionary id"),
+                ),
+                ("data", models.BinaryField(verbose_name="Data")),
+                (
+                    "samples",
+                    models.PositiveIntegerField(default=0, verbose_name="Samples"),
+                ),
+            ],
+            options={"abstract": False},
+        ),
+        migrations.AddField(
+            model_name="item",
+            name="body",
+            field=app.fields.CompressedTextField(null=True, verbose_name="Description"),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+
+def copy_field(Item, source: str, target: str):
+    items = []
+    for item in Item.objects.order_by("id").only("id", source).iterator():
+        setattr(item, target, getattr(item, source))
+        items.append(item)
+        if len(items) == BATCH_SIZE:
+            Item.objects.bulk_update(items, [target])
+            items = []
+    Item.objects.bulk_update(items, [target])
+
+
+def compress_descriptions(apps, schema_editor):
+    copy_field(apps.get_model("app", "Item"), "description", "body")
+
+
+def decompress_descriptions(apps, schema_editor):
+    copy_field(apps.get_model("app", "Item"), "body", "description")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0025_compressiondictionary_item_body"),
+    ]
+
+    operations = [
+        migrations.RunPython(compress_descriptions, decompress_descriptions),
+    ]
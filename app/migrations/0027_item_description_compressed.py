@@ -0,0 +1,22 @@
+from django.db import migrations
+
+import app.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0026_compress_item_description"),
+    ]
+
+    operations = [
+        migrations.RemoveField(model_name="item", name="description"),
+        migrations.RenameField(
+            model_name="item", old_name="body", new_name="description"
+        ),
+        migrations.AlterField(
+            model_name="item",
+            name="description",
+            field=app.fields.CompressedTextField(verbose_name="Description"),
+        ),
+    ]
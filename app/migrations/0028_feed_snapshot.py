@@ -0,0 +1,73 @@
+# Generated by Django 3.0.8 on 2026-10-18 16:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0027_item_description_compressed"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="feed",
+            name="content_digest",
+            field=models.CharField(
+                blank=True, default="", max_length=64, verbose_name="Content digest"
+            ),
+        ),
+        migrations.CreateModel(
+            name="FeedSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Created at"),
+                ),
+                (
+                    "modified_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Modified at"),
+                ),
+                ("fetched_at", models.DateTimeField(verbose_name="Fetched at")),
+                (
+                    "status",
+                    models.IntegerField(blank=True, null=True, verbose_name="Status"),
+                ),
+                (
+                    "content_type",
+                    models.CharField(
+                        blank=True, max_length=200, verbose_name="Content type"
+                    ),
+                ),
+                (
+                    "digest",
+                    models.CharField(
+                        db_index=True, max_length=64, verbose_name="Digest"
+                    ),
+                ),
+                ("size", models.IntegerField(verbose_name="Size")),
+                (
+                    "feed",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.DO_NOTHING, to="app.Feed"
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="feedsnapshot",
+            index=models.Index(
+                fields=["feed", "-fetched_at"], name="snapshot_feed_fetched_at"
+            ),
+        ),
+    ]
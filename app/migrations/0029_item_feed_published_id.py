@@ -0,0 +1,19 @@
+# Generated by Django 3.0.8 on 2026-10-18 16:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0028_feed_snapshot"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="item",
+            index=models.Index(
+                fields=["feed", "-published_at", "-id"], name="item_feed_published_id"
+            ),
+        ),
+    ]
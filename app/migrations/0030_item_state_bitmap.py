@@ -0,0 +1,66 @@
+# Generated by Django 3.0.8 on 2026-10-18 16:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("app", "0029_item_feed_published_id"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ItemStateBitmap",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Created at"),
+                ),
+                (
+                    "modified_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Modified at"),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("read", "Read"), ("favorite", "Favorite")],
+                        max_length=50,
+                        verbose_name="Kind",
+                    ),
+                ),
+                ("data", models.BinaryField(default=b"", verbose_name="Data")),
+                (
+                    "feed",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.DO_NOTHING, to="app.Feed"
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="itemstatebitmap",
+            constraint=models.UniqueConstraint(
+                fields=("user", "feed", "kind"), name="unique_item_state_user_feed_kind"
+            ),
+        ),
+    ]
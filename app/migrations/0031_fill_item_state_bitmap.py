@@ -0,0 +1,69 @@
+import struct
+import sys
+from array import array
+from collections import defaultdict
+
+from django.db import migrations
+
+ARRAY_LIMIT = 4096
+CONTAINER_BITS = 1 << 16
+HEADER = struct.Struct("<IBH")
+
+
+def serialize(values):
+    """The encoding of `app.bitmaps.RoaringBitmap.serialize` when this migration
+    was written, for a set of item ids
+
+    """
+    containers = defaultdict(set)
+    for value in values:
+        containers[value >> 16].add(value & 0xFFFF)
+    chunks = []
+    for high in sorted(containers):
+        lows = sorted(containers[high])
+        if len(lows) <= ARRAY_LIMIT:
+            lows = array("H", lows)
+            if sys.byteorder == "big":
+                lows.byteswap()
+            chunks.append(HEADER.pack(high, 0, len(lows) - 1))
+            chunks.append(lows.tobytes())
+        else:
+            bits = 0
+            for low in lows:
+                bits |= 1 << low
+            chunks.append(HEADER.pack(high, 1, len(lows) - 1))
+            chunks.append(bits.to_bytes(CONTAINER_BITS // 8, "little"))
+    return b"".join(chunks)
+
+
+def fill_item_states(apps, schema_editor):
+    UserRelItem = apps.get_model("app", "UserRelItem")
+    ItemStateBitmap = apps.get_model("app", "ItemStateBitmap")
+    relations = UserRelItem._base_manager.filter(kind__in=["read", "favorite"]).exclude(
+        kind="favorite", disabled_at__isnull=False
+    )
+    states = defaultdict(set)
+    for user_id, feed_id, kind, item_id in relations.values_list(
+        "user_id", "item__feed_id", "kind", "item_id"
+    ).iterator():
+        states[user_id, feed_id, kind].add(item_id)
+    ItemStateBitmap.objects.bulk_create(
+        (
+            ItemStateBitmap(
+                user_id=user_id, feed_id=feed_id, kind=kind, data=serialize(ids)
+            )
+            for (user_id, feed_id, kind), ids in states.items()
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0030_item_state_bitmap"),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_item_states, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 3.0.8 on 2026-10-18 16:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("app", "0031_fill_item_state_bitmap"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UnreadCounter",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Created at"),
+                ),
+                (
+                    "modified_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Modified at"),
+                ),
+                ("unread", models.IntegerField(default=0, verbose_name="Unread")),
+                (
+                    "feed",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.DO_NOTHING, to="app.Feed"
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="unreadcounter",
+            constraint=models.UniqueConstraint(
+                fields=("user", "feed"), name="unique_unread_counter_user_feed"
+            ),
+        ),
+    ]
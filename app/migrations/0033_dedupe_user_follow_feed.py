@@ -0,0 +1,31 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+def dedupe_follows(apps, schema_editor):
+    """Keep one follow of each (user, feed), the latest active one, or the latest
+    one if the feed is not followed anymore
+
+    """
+    UserFollowFeed = apps.get_model("app", "UserFollowFeed")
+    duplicated = (
+        UserFollowFeed.objects.values("user_id", "feed_id")
+        .annotate(count=Count("id"))
+        .filter(count__gt=1)
+        .values_list("user_id", "feed_id")
+    )
+    for user_id, feed_id in list(duplicated):
+        follows = UserFollowFeed.objects.filter(user_id=user_id, feed_id=feed_id)
+        kept = max(follows, key=lambda follow: (follow.disabled_at is None, follow.id))
+        follows.exclude(id=kept.id).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0032_unread_counter"),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_follows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations, models
+
+from app.operations import AddIndexConcurrently, AddUniqueConstraintConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # Indexes built concurrently can't be in a transaction
+    atomic = False
+
+    dependencies = [
+        ("app", "0033_dedupe_user_follow_feed"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="hubsubscription",
+            index=models.Index(
+                fields=["state", "lease_expires_at"], name="subscription_state_lease"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="notification",
+            index=models.Index(fields=["user", "read"], name="notification_user_read"),
+        ),
+        AddIndexConcurrently(
+            model_name="userrelitem",
+            index=models.Index(
+                condition=models.Q(disabled_at__isnull=True),
+                fields=["user", "item", "kind"],
+                name="userrelitem_active",
+            ),
+        ),
+        AddUniqueConstraintConcurrently(
+            model_name="userfollowfeed",
+            constraint=models.UniqueConstraint(
+                fields=("user", "feed"), name="unique_user_follow_feed"
+            ),
+        ),
+    ]
@@ -1,5 +1,10 @@
+from app.models.compression_dictionary import CompressionDictionary  # noqa: F401
 from app.models.feed import Feed  # noqa: F401
+from app.models.feed_snapshot import FeedSnapshot  # noqa: F401
+from app.models.hub_subscription import HubSubscription  # noqa: F401
 from app.models.item import Item  # noqa: F401
+from app.models.item_state_bitmap import ItemStateBitmap  # noqa: F401
 from app.models.notification import Notification  # noqa: F401
+from app.models.unread_counter import UnreadCounter  # noqa: F401
 from app.models.user_follow_feed import UserFollowFeed  # noqa: F401
 from app.models.user_rel_item import UserRelItem  # noqa: F401
@@ -0,0 +1,18 @@
+from django.db import models
+
+from app.models.base import BaseModel
+
+
+class CompressionDictionary(BaseModel):
+    """CompressionDictionary model class, a zstd dictionary trained on item
+    descriptions, see `app.compression`. The latest one compresses the new
+    descriptions, and the older ones are kept for the descriptions they compressed.
+
+    """
+
+    dict_id = models.BigIntegerField("Dictionary id", unique=True)
+    data = models.BinaryField("Data")
+    samples = models.PositiveIntegerField("Samples", default=0)
+
+    def __str__(self) -> str:
+        return f"{self.dict_id}"
@@ -10,10 +10,30 @@ class Feed(BaseModel):
 
     title = models.CharField("Title", max_length=100)
     link = models.URLField("Link")
+    # Identity of the feed, see `app.canonical.canonical_url`
+    canonical_url = models.CharField(
+        "Canonical URL", max_length=1000, unique=True, null=True, blank=True
+    )
     description = models.TextField("Description", null=True, blank=True)
     ttl = models.IntegerField("TTL")
     etag = models.CharField("Etag", max_length=200, null=True, blank=True)
     last_build_date = models.DateTimeField("Last Build Date")
+    fetched_at = models.DateTimeField("Fetched at", null=True, blank=True)
+    next_fetch_at = models.DateTimeField(
+        "Next fetch at", null=True, blank=True, db_index=True
+    )
+    fetch_interval = models.IntegerField("Fetch interval", null=True, blank=True)
+    cache_max_age = models.IntegerField("Cache max age", null=True, blank=True)
+    content_length = models.IntegerField("Content length", null=True, blank=True)
+    # Hash of the last document parsed, see `app.snapshots.body_digest`
+    content_digest = models.CharField(
+        "Content digest", max_length=64, blank=True, default=""
+    )
+    failure_count = models.IntegerField("Failure count", default=0)
+    last_error = models.CharField("Last error", max_length=200, null=True, blank=True)
+    quarantined_until = models.DateTimeField(
+        "Quarantined until", null=True, blank=True, db_index=True
+    )
 
     def __str__(self) -> str:
         return f"{self.title}"
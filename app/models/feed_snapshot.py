@@ -0,0 +1,29 @@
+from django.db import models
+
+from app.models.base import BaseModel
+from app.models.feed import Feed
+
+
+class FeedSnapshot(BaseModel):
+    """FeedSnapshot model class, the index of the bodies fetched for a feed.
+    The bodies are kept in the `SnapshotArchive` by their digest, so a body fetched
+    many times is stored once.
+
+    """
+
+    feed = models.ForeignKey(Feed, on_delete=models.DO_NOTHING)
+    fetched_at = models.DateTimeField("Fetched at")
+    status = models.IntegerField("Status", null=True, blank=True)
+    content_type = models.CharField("Content type", max_length=200, blank=True)
+    digest = models.CharField("Digest", max_length=64, db_index=True)
+    size = models.IntegerField("Size")
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["feed", "-fetched_at"], name="snapshot_feed_fetched_at"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.feed_id} {self.fetched_at:%Y-%m-%d %H:%M:%S} {self.digest}"
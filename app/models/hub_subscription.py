@@ -0,0 +1,59 @@
+import secrets
+
+from django.db import models
+from djchoices import ChoiceItem, DjangoChoices
+
+from app.models.base import BaseModel
+from app.models.feed import Feed
+
+
+class HubSubscriptionState(DjangoChoices):
+    """Class responsible to identify the states of a WebSub subscription
+
+    """
+
+    pending = ChoiceItem("pending", "Pending")
+    active = ChoiceItem("active", "Active")
+    denied = ChoiceItem("denied", "Denied")
+
+
+def new_token() -> str:
+    return secrets.token_urlsafe(32)
+
+
+class HubSubscription(BaseModel):
+    """HubSubscription model class, the WebSub subscription of a feed to its hub.
+    While the lease of an active subscription lasts the feed is pushed by the hub
+    and not polled.
+
+    """
+
+    feed = models.OneToOneField(
+        Feed, on_delete=models.DO_NOTHING, related_name="subscription"
+    )
+    hub = models.URLField("Hub", max_length=1000)
+    topic = models.URLField("Topic", max_length=1000)
+    secret = models.CharField("Secret", max_length=200)
+    # Part of the callback url, so only the hub can call it
+    token = models.CharField("Token", max_length=64, unique=True, default=new_token)
+    state = models.CharField(
+        "State",
+        max_length=50,
+        choices=HubSubscriptionState.choices,
+        default=HubSubscriptionState.pending,
+    )
+    lease_expires_at = models.DateTimeField(
+        "Lease expires at", null=True, blank=True, db_index=True
+    )
+    requested_at = models.DateTimeField("Requested at", null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Subscriptions due for renewal, see `app.websub.due_renewals`
+            models.Index(
+                fields=["state", "lease_expires_at"], name="subscription_state_lease"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.feed}: {self.hub}"
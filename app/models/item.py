@@ -1,41 +1,316 @@
+from collections import Counter, defaultdict
 from datetime import datetime
+from hashlib import sha1
+from itertools import groupby, islice
+from operator import itemgetter
 from time import mktime
-from typing import List
+from typing import Dict, Iterable, List, Tuple
 
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.utils.timezone import now
 
+from app.excerpts import html_excerpt, text_preview
+from app.fields import CompressedTextField
 from app.models.base import BaseModel
 from app.models.feed import Feed
+from app.models.unread_counter import UnreadCounter
+from app.seen import SeenEntries
+
+GUID_MAX_LENGTH = 255
+
+
+def link_identity(link: str) -> str:
+    """Function responsible for building the identity of an entry from its link
+
+    Parameters
+    ----------
+    link: str
+
+    Returns
+    -------
+    sha1 hexdigest of the link
+    """
+    return sha1(link.encode()).hexdigest()
+
+
+def entry_identity(entry: Dict) -> str:
+    """Function responsible for building the stable identity of a feed entry.
+    Use the entry id/guid, falling back to a hash of the link.
+
+    Parameters
+    ----------
+    entry: Dict
+        Feed entry, as returned by feedparser
+
+    Returns
+    -------
+    str with at most `GUID_MAX_LENGTH` characters
+    """
+    identity = entry.get("id") or entry.get("guid")
+    if not identity:
+        return link_identity(entry["link"])
+    if len(identity) > GUID_MAX_LENGTH:
+        return sha1(identity.encode()).hexdigest()
+    return identity
+
+
+def item_digest(title: str, link: str, description: str, published_at: datetime) -> str:
+    """Function responsible for hashing the content of an item, to detect changes
+
+    Parameters
+    ----------
+    title: str
+    link: str
+    description: str
+    published_at: datetime
+
+    Returns
+    -------
+    sha1 hexdigest of the content
+    """
+    content = "\0".join(
+        [title, link, description, published_at.strftime("%Y-%m-%dT%H:%M:%S")]
+    )
+    return sha1(content.encode()).hexdigest()
 
 
 class ItemManager(models.Manager):
-    def bulk_entries_create(self, feed_id: int, parsed_entries: List) -> None:
-        """Function responsible for bulk_creating items parsed in tasks
+    def bulk_entries_create(
+        self, feed_id: int, parsed_entries: Iterable, batch_size: int = None
+    ) -> int:
+        """Function responsible for upserting items parsed in tasks.
+        Entries are matched to items by their identity, in batches,
+        and only new or changed entries are written.
+        With `SEEN_FILTER_ENABLED`, entries missing from the `SeenEntries`
+        filter of the feed are created without looking them up.
 
         Parameters
         ----------
         feed_id: int
             Feed id
-        parsed_entries: List
-            List of feed entries to be created
+        parsed_entries: Iterable
+            Feed entries to be created or updated
+        batch_size: int
+            Number of entries written at once, optional.
         Returns
         -------
+        Number of entries that were new
+        """
+        return self.bulk_feeds_entries_create({feed_id: parsed_entries}, batch_size)[
+            feed_id
+        ]
 
+    def bulk_feeds_entries_create(
+        self, entries_by_feed: Dict[int, Iterable], batch_size: int = None
+    ) -> Dict[int, int]:
+        """Function responsible for upserting the items of many feeds at once,
+        see `bulk_entries_create`. The entries of every feed share the batches,
+        so each batch is looked up, created and updated with one query each,
+        and the `UnreadCounter` of the feeds are increased in the same transaction.
+        The created entries are read back, only the rows actually inserted are
+        counted as new.
+
+        Parameters
+        ----------
+        entries_by_feed: Dict[int, Iterable]
+            Feed entries to be created or updated, by feed id
+        batch_size: int
+            Number of entries written at once, optional.
+        Returns
+        -------
+        Dict of feed id to the number of entries that were new
         """
-        entries_to_create = []
-        for entry in parsed_entries:
-            entries_to_create.append(
-                Item(
-                    feed_id=feed_id,
-                    title=entry["title"],
-                    link=entry["link"],
-                    description=entry["summary"],
-                    published_at=datetime.fromtimestamp(
-                        mktime(entry["published_parsed"])
-                    ),
-                )
+        batch_size = batch_size or settings.ITEM_BATCH_SIZE
+        entries = (
+            (feed_id, entry)
+            for feed_id, feed_entries in entries_by_feed.items()
+            for entry in feed_entries
+        )
+        created = Counter({feed_id: 0 for feed_id in entries_by_feed})
+        seen = {}
+        with transaction.atomic(savepoint=False):
+            while True:
+                batch = list(islice(entries, batch_size))
+                if not batch:
+                    break
+                if settings.SEEN_FILTER_ENABLED:
+                    seen.update(
+                        self.seen_entries_many(
+                            {feed_id for feed_id, _ in batch if feed_id not in seen}
+                        )
+                    )
+                created.update(self._upsert_batch(batch, seen))
+            # The new items are unread for every user of their feeds
+            UnreadCounter.objects.add_unread(created)
+        return dict(created)
+
+    def seen_entries(self, feed_id: int) -> SeenEntries:
+        """Function responsible for loading the seen entries filter of a feed,
+        creating it from the stored items when it does not exist
+
+        Parameters
+        ----------
+        feed_id: int
+            Feed id
+
+        Returns
+        -------
+        SeenEntries
+        """
+        return self.seen_entries_many([feed_id])[feed_id]
+
+    def seen_entries_many(self, feed_ids: Iterable[int]) -> Dict[int, SeenEntries]:
+        """Function responsible for loading the seen entries filters of many feeds,
+        see `seen_entries`. The filters that do not exist are created with
+        a single query
+
+        Parameters
+        ----------
+        feed_ids: Iterable[int]
+            Feed ids
+
+        Returns
+        -------
+        Dict of feed id to SeenEntries
+        """
+        filters = {feed_id: SeenEntries(feed_id) for feed_id in feed_ids}
+        missing = [feed_id for feed_id, seen in filters.items() if not seen.load()]
+        if not missing:
+            return filters
+        rows = (
+            self.filter(feed_id__in=missing)
+            .order_by("feed_id")
+            .values_list("feed_id", "guid")
+            .iterator()
+        )
+        warmed = set()
+        for feed_id, group in groupby(rows, key=itemgetter(0)):
+            filters[feed_id].warm(guid for _, guid in group)
+            warmed.add(feed_id)
+        for feed_id in set(missing) - warmed:
+            filters[feed_id].warm([])
+        return filters
+
+    def _upsert_batch(
+        self, parsed_entries: List[Tuple[int, Dict]], seen: Dict[int, SeenEntries]
+    ) -> Counter:
+        items = {}
+        for feed_id, entry in parsed_entries:
+            item = Item(
+                feed_id=feed_id,
+                guid=entry_identity(entry),
+                title=entry["title"],
+                link=entry["link"],
+                description=entry["summary"],
+                published_at=datetime.fromtimestamp(mktime(entry["published_parsed"])),
+            )
+            item.digest = item_digest(
+                item.title, item.link, item.description, item.published_at
             )
-        self.bulk_create(entries_to_create)
+            items[feed_id, item.guid] = item
+
+        # Items created before entries had an identity are keyed by their link hash
+        lookup = {
+            (feed_id, link_identity(item.link)): guid
+            for (feed_id, guid), item in items.items()
+        }
+        lookup.update({key: key[1] for key in items})
+        if seen:
+            lookup = {
+                (feed_id, key): guid
+                for (feed_id, key), guid in lookup.items()
+                if feed_id not in seen or key in seen[feed_id]
+            }
+        existing = {}
+        if lookup:
+            rows = self.filter(
+                feed_id__in={feed_id for feed_id, _ in lookup},
+                guid__in={key for _, key in lookup},
+            ).values_list("id", "feed_id", "guid", "digest")
+            for pk, feed_id, guid, digest in rows:
+                if (feed_id, guid) not in lookup:
+                    continue
+                key = (feed_id, lookup[feed_id, guid])
+                if (feed_id, guid) in items or key not in existing:
+                    existing[key] = (pk, guid, digest)
+
+        to_create, to_update = [], []
+        for key, item in items.items():
+            if key not in existing:
+                to_create.append(item)
+                continue
+            pk, current_guid, digest = existing[key]
+            if digest != item.digest or current_guid != item.guid:
+                item.pk = pk
+                item.modified_at = now()
+                to_update.append(item)
+
+        # Only for the items written, unchanged entries are most of a document
+        for item in to_create + to_update:
+            item.excerpt, item.truncated = html_excerpt(item.description)
+            item.preview = text_preview(item.description)
+
+        self.bulk_create(to_create, ignore_conflicts=True)
+        inserted = self._inserted(to_create, to_update)
+        self.bulk_update(
+            to_update,
+            [
+                "guid",
+                "title",
+                "link",
+                "description",
+                "excerpt",
+                "truncated",
+                "preview",
+                "published_at",
+                "digest",
+                "modified_at",
+            ],
+        )
+        written = defaultdict(list)
+        for item in to_create + to_update:
+            written[item.feed_id].append(item.guid)
+        for feed_id, guids in written.items():
+            if feed_id in seen:
+                seen[feed_id].add(guids)
+        return Counter(item.feed_id for item in inserted)
+
+    def _inserted(self, created: List["Item"], to_update: List["Item"]) -> List["Item"]:
+        """Function responsible for telling the items `bulk_create` inserted from
+        the ones that conflicted with an existing row, which the seen filter can
+        miss, as when another worker inserted it meanwhile. The items that conflicted
+        and changed are added to `to_update`
+
+        Parameters
+        ----------
+        created: List[Item]
+            Items given to `bulk_create`, with their `created_at` set by it
+        to_update: List[Item]
+
+        Returns
+        -------
+        List of the items inserted
+        """
+        if not created:
+            return []
+        items = {(item.feed_id, item.guid): item for item in created}
+        rows = self.filter(
+            feed_id__in={feed_id for feed_id, _ in items},
+            guid__in={guid for _, guid in items},
+        ).values_list("id", "feed_id", "guid", "digest", "created_at")
+        inserted = []
+        for pk, feed_id, guid, digest, created_at in rows:
+            item = items.get((feed_id, guid))
+            if item is None:
+                continue
+            if created_at == item.created_at:
+                inserted.append(item)
+            elif digest != item.digest:
+                item.pk = pk
+                item.modified_at = now()
+                to_update.append(item)
+        return inserted
 
 
 class Item(BaseModel):
@@ -44,11 +319,31 @@ class Item(BaseModel):
     """
 
     feed = models.ForeignKey(Feed, on_delete=models.DO_NOTHING)
+    guid = models.CharField("GUID", max_length=GUID_MAX_LENGTH)
+    digest = models.CharField("Digest", max_length=40, blank=True)
     title = models.CharField("Title", max_length=100)
     link = models.URLField("Link")
-    description = models.TextField("Description")
+    # Stored compressed with zstd, see `app.compression`
+    description = CompressedTextField("Description")
+    # Plain text and html summaries of the description, see `app.excerpts`
+    excerpt = models.TextField("Excerpt", blank=True, default="")
+    truncated = models.BooleanField("Truncated", default=False)
+    preview = models.CharField("Preview", max_length=300, blank=True, default="")
     published_at = models.DateTimeField("Published Date")
     objects = ItemManager()
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["feed", "guid"], name="unique_item_feed_guid"
+            )
+        ]
+        indexes = [
+            # Keyset pages of the item lists, see `app.pagination`
+            models.Index(
+                fields=["feed", "-published_at", "-id"], name="item_feed_published_id"
+            )
+        ]
+
     def __str__(self) -> str:
         return f"{self.title}"
@@ -0,0 +1,41 @@
+from django.contrib.auth.models import User
+from django.db import models
+
+from app.bitmaps import RoaringBitmap
+from app.models.base import BaseModel
+from app.models.feed import Feed
+from app.models.user_rel_item import UserRelItemKind
+
+
+class ItemStateBitmap(BaseModel):
+    """ItemStateBitmap model class, the ids of the items of a feed that a user read
+    or favorited, as a `RoaringBitmap`, see `app.item_state`. The `UserRelItem`
+    rows stay the history of the marks, the bitmaps are what the item lists read.
+
+    """
+
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING)
+    feed = models.ForeignKey(Feed, on_delete=models.DO_NOTHING)
+    kind = models.CharField(
+        "Kind",
+        max_length=50,
+        choices=[
+            (UserRelItemKind.read, "Read"),
+            (UserRelItemKind.favorite, "Favorite"),
+        ],
+    )
+    data = models.BinaryField("Data", default=b"")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "feed", "kind"], name="unique_item_state_user_feed_kind"
+            )
+        ]
+
+    @property
+    def bitmap(self) -> RoaringBitmap:
+        return RoaringBitmap.deserialize(bytes(self.data))
+
+    def __str__(self) -> str:
+        return f"{self.user_id} {self.feed_id} {self.kind}"
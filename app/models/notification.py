@@ -13,5 +13,8 @@ class Notification(BaseModel):
     content = models.TextField("Content")
     read = models.BooleanField("Read", default=False)
 
+    class Meta:
+        indexes = [models.Index(fields=["user", "read"], name="notification_user_read")]
+
     def __str__(self):
         return self.content
@@ -0,0 +1,61 @@
+from typing import Dict
+
+from django.contrib.auth.models import User
+from django.db import models
+from django.db.models import Case, F, IntegerField, Value, When
+
+from app.models.base import BaseModel
+from app.models.feed import Feed
+
+
+class UnreadCounterManager(models.Manager):
+    def add_unread(self, created: Dict[int, int]) -> int:
+        """Function responsible for adding new items to the counters of every
+        user of their feeds, with a single update
+
+        Parameters
+        ----------
+        created: Dict[int, int]
+            Number of new items, by feed id
+
+        Returns
+        -------
+        Number of counters updated
+        """
+        created = {feed_id: count for feed_id, count in created.items() if count}
+        if not created:
+            return 0
+        return self.filter(feed_id__in=created).update(
+            unread=F("unread")
+            + Case(
+                *[
+                    When(feed_id=feed_id, then=Value(count))
+                    for feed_id, count in created.items()
+                ],
+                output_field=IntegerField(),
+            )
+        )
+
+
+class UnreadCounter(BaseModel):
+    """UnreadCounter model class, the number of items of a feed that a user did
+    not read. Kept up to date by the ingestion and the read marks, and repaired
+    by `app.item_state.reconcile_counters`.
+
+    """
+
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING)
+    feed = models.ForeignKey(Feed, on_delete=models.DO_NOTHING)
+    unread = models.IntegerField("Unread", default=0)
+
+    objects = UnreadCounterManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "feed"], name="unique_unread_counter_user_feed"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.user_id} {self.feed_id}: {self.unread}"
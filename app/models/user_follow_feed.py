@@ -5,6 +5,28 @@ from app.models.base import BaseModel
 from app.models.feed import Feed
 
 
+class UserFollowFeedManager(models.Manager):
+    def follow(self, user_id: int, feed_id: int) -> None:
+        """Function responsible for making a user follow a feed, enabling the
+        follow again if the user had unfollowed it. A follow created meanwhile
+        by another request is kept, there is one per user and feed.
+
+        Parameters
+        ----------
+        user_id: int
+        feed_id: int
+
+        Returns
+        -------
+
+        """
+        if self.filter(user_id=user_id, feed_id=feed_id).update(disabled_at=None):
+            return
+        self.bulk_create(
+            [self.model(user_id=user_id, feed_id=feed_id)], ignore_conflicts=True
+        )
+
+
 class UserFollowFeed(BaseModel):
     """UserFollowFeed class model
 
@@ -14,5 +36,14 @@ class UserFollowFeed(BaseModel):
     feed = models.ForeignKey(Feed, on_delete=models.DO_NOTHING)
     disabled_at = models.DateTimeField("Disabled at", null=True)
 
+    objects = UserFollowFeedManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "feed"], name="unique_user_follow_feed"
+            )
+        ]
+
     def __str__(self):
         return f"{self.user}: {self.feed}"
@@ -2,7 +2,7 @@ from typing import List
 
 from django.contrib.auth.models import User
 from django.db import models
-from django.db.models import QuerySet
+from django.db.models import Q, QuerySet
 from django.utils.timezone import now
 from djchoices import ChoiceItem, DjangoChoices
 
@@ -104,5 +104,15 @@ class UserRelItem(BaseModel):
     favorite = UserFavoriteItemManager()
     objects = UserRelItemManager()
 
+    class Meta:
+        indexes = [
+            # Marks of a user on the items of a page, and their favorites to disable
+            models.Index(
+                fields=["user", "item", "kind"],
+                condition=Q(disabled_at__isnull=True),
+                name="userrelitem_active",
+            )
+        ]
+
     def __str__(self) -> str:
         return f"{self.kind}"
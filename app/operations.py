@@ -0,0 +1,84 @@
+from django.db import models
+from django.db.migrations import AddConstraint, AddIndex
+
+POSTGRESQL = "postgresql"
+
+
+def _ensure_not_in_transaction(schema_editor) -> None:
+    if schema_editor.connection.in_atomic_block:
+        raise ValueError(
+            "Concurrent index creation must run in a migration with atomic = False"
+        )
+
+
+class AddIndexConcurrently(AddIndex):
+    """Migration operation creating an index with `CREATE INDEX CONCURRENTLY` on
+    PostgreSQL, so the table stays writable while the index is built, and with a
+    plain `CREATE INDEX` on the other databases. The migration must set
+    `atomic = False`.
+
+    """
+
+    def describe(self) -> str:
+        description = super().describe()
+        return f"Concurrently {description[0].lower()}{description[1:]}"
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != POSTGRESQL:
+            return super().database_forwards(
+                app_label, schema_editor, from_state, to_state
+            )
+        _ensure_not_in_transaction(schema_editor)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, concurrently=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != POSTGRESQL:
+            return super().database_backwards(
+                app_label, schema_editor, from_state, to_state
+            )
+        _ensure_not_in_transaction(schema_editor)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, concurrently=True)
+
+
+class AddUniqueConstraintConcurrently(AddConstraint):
+    """Migration operation adding a `UniqueConstraint` without a condition. On
+    PostgreSQL its unique index is built with `CREATE UNIQUE INDEX CONCURRENTLY`
+    first, then the constraint is added on the index, which only takes a short
+    lock. The other databases add the constraint as usual. The migration must set
+    `atomic = False`.
+
+    """
+
+    def __init__(self, model_name: str, constraint: models.UniqueConstraint):
+        if not isinstance(constraint, models.UniqueConstraint) or constraint.condition:
+            raise ValueError(
+                "Only unique constraints without a condition are supported"
+            )
+        super().__init__(model_name, constraint)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != POSTGRESQL:
+            return super().database_forwards(
+                app_label, schema_editor, from_state, to_state
+            )
+        _ensure_not_in_transaction(schema_editor)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        quote = schema_editor.quote_name
+        table = quote(model._meta.db_table)
+        name = quote(self.constraint.name)
+        columns = ", ".join(
+            quote(model._meta.get_field(field).column)
+            for field in self.constraint.fields
+        )
+        schema_editor.execute(
+            f"CREATE UNIQUE INDEX CONCURRENTLY {name} ON {table} ({columns})"
+        )
+        schema_editor.execute(
+            f"ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX {name}"
+        )
@@ -0,0 +1,103 @@
+import base64
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from django.db.models import Model, Q, QuerySet
+
+
+def encode_cursor(published_at: datetime, pk: int) -> str:
+    """Function responsible for encoding the position of an item in a keyset page
+
+    Parameters
+    ----------
+    published_at: datetime
+    pk: int
+
+    Returns
+    -------
+    str, url safe
+    """
+    position = f"{published_at.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(position).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Function responsible for decoding a cursor built by `encode_cursor`
+
+    Parameters
+    ----------
+    cursor: str
+
+    Returns
+    -------
+    Tuple with the published_at and the id of the item
+
+    Error
+    -----
+        ValueError if the cursor is not valid.
+    """
+    try:
+        position = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        published_at, pk = position.decode().split("|")
+        return datetime.fromisoformat(published_at), int(pk)
+    except (TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor {cursor!r}") from e
+
+
+def keyset_page(
+    queryset: QuerySet,
+    cursor: Optional[str],
+    size: int,
+    keep: Optional[Callable[[Model], bool]] = None,
+    batches: int = 4,
+) -> Tuple[List, Optional[str]]:
+    """Function responsible for getting a page of items, newest first, ordered
+    by `(published_at, id)`. The page starts after the item of the cursor instead
+    of an offset, so it costs the same wherever it is, with the index on
+    `(feed, published_at, id)`.
+
+    Parameters
+    ----------
+    queryset: QuerySet
+        Items to paginate
+    cursor: str
+        Cursor of the last item of the previous page, None for the first page
+    size: int
+        Items per page
+    keep: Callable
+        Filter applied in memory, the items are read in batches until the page
+        is full. All the items are kept if None
+    batches: int
+        Most batches read for a page with `keep`, when they are all filtered
+        out the page is short, down to empty, and its cursor is the last item
+        read, so a page costs the same however many items are filtered
+
+    Returns
+    -------
+    Tuple with the items and the cursor of the next page, None on the last page
+
+    Error
+    -----
+        ValueError if the cursor is not valid.
+    """
+    position = decode_cursor(cursor) if cursor else None
+    batch_size = size + 1 if keep is None else (size + 1) * 4
+    items = []
+    for _ in range(batches):
+        batch_queryset = queryset
+        if position:
+            published_at, pk = position
+            # The bound on published_at alone is an index condition, the ties are
+            # filtered
+            batch_queryset = batch_queryset.filter(
+                published_at__lte=published_at
+            ).filter(Q(published_at__lt=published_at) | Q(id__lt=pk))
+        batch = list(batch_queryset.order_by("-published_at", "-id")[:batch_size])
+        items.extend(item for item in batch if keep is None or keep(item))
+        if len(items) > size:
+            items = items[:size]
+            return items, encode_cursor(items[-1].published_at, items[-1].id)
+        if len(batch) < batch_size:
+            return items, None
+        position = (batch[-1].published_at, batch[-1].id)
+    return items, encode_cursor(*position)
@@ -0,0 +1,197 @@
+import io
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import django
+import feedparser
+from django.conf import settings
+from django.utils.module_loading import import_string
+from lxml import etree
+
+from app.exceptions import UnsupportedDocumentError
+from app.metrics import PARSED_DOCUMENTS
+from app.store import compact_entry
+from app.streaming import StreamingFeedParser
+
+# Feed fields sent back by the parse pool
+FEED_FIELDS = ("title", "description", "ttl", "modified_parsed", "links")
+ATOM_NAMESPACE = "http://www.w3.org/2005/Atom"
+SUPPORTED_ROOTS = {(None, "rss"), (ATOM_NAMESPACE, "feed")}
+
+
+@dataclass
+class ParsedDocument:
+    """Feed fields and entries of a parsed document
+
+    """
+
+    feed: Dict = field(default_factory=dict)
+    entries: List[Dict] = field(default_factory=list)
+    parser: str = ""
+
+
+class LxmlParser:
+    """Fast parser for well-formed RSS 2.0 and Atom documents, built on lxml.
+    Only reads the fields used in ingestion, see `entry_from_element`.
+
+    """
+
+    name = "lxml"
+
+    def parse(self, body: bytes, headers: Optional[Dict] = None) -> ParsedDocument:
+        """Function responsible for parsing a document
+
+        Parameters
+        ----------
+        body: bytes
+        headers: Dict
+            Response headers, not used.
+
+        Returns
+        -------
+        ParsedDocument
+
+        Error
+        -----
+            UnsupportedDocumentError if the document is not well-formed,
+            not RSS 2.0 or Atom, or has relative links.
+        """
+        parser = StreamingFeedParser()
+        try:
+            entries = list(parser.iter_entries(io.BytesIO(body)))
+        except etree.XMLSyntaxError as e:
+            raise UnsupportedDocumentError(str(e)) from e
+        if (parser.root.namespace, parser.root.localname) not in SUPPORTED_ROOTS:
+            raise UnsupportedDocumentError(f"Unsupported document {parser.root}")
+        # Relative links are resolved by feedparser
+        if not all(
+            entry["link"].startswith(("http://", "https://")) for entry in entries
+        ):
+            raise UnsupportedDocumentError("Relative links")
+        return ParsedDocument(feed=parser.feed, entries=entries, parser=self.name)
+
+
+class FeedparserParser:
+    """Parser for any document feedparser understands, malformed ones included
+
+    """
+
+    name = "feedparser"
+
+    def parse(self, body: bytes, headers: Optional[Dict] = None) -> ParsedDocument:
+        """Function responsible for parsing a document
+
+        Parameters
+        ----------
+        body: bytes
+        headers: Dict
+            Response headers, with lower case names, optional.
+
+        Returns
+        -------
+        ParsedDocument
+        """
+        parsed = feedparser.parse(io.BytesIO(body), response_headers=headers or {})
+        return ParsedDocument(
+            feed=parsed.feed, entries=parsed.entries, parser=self.name
+        )
+
+
+@lru_cache(maxsize=None)
+def get_parsers() -> List:
+    return [import_string(path)() for path in settings.FEED_PARSERS]
+
+
+@lru_cache(maxsize=None)
+def get_parse_pool() -> ProcessPoolExecutor:
+    """Function responsible for returning the parse pool of the process.
+    The pool is created once, with `FEED_PARSE_PROCESSES` processes started
+    with `FEED_PARSE_START_METHOD`.
+
+    Returns
+    -------
+    ProcessPoolExecutor
+    """
+    return ProcessPoolExecutor(
+        max_workers=settings.FEED_PARSE_PROCESSES,
+        mp_context=multiprocessing.get_context(settings.FEED_PARSE_START_METHOD),
+        initializer=django.setup,
+    )
+
+
+def _parse(body: bytes, headers: Optional[Dict] = None) -> ParsedDocument:
+    error = UnsupportedDocumentError("No parser configured")
+    for parser in get_parsers():
+        try:
+            return parser.parse(body, headers)
+        except UnsupportedDocumentError as e:
+            error = e
+    raise error
+
+
+def _parse_compact(body: bytes, headers: Optional[Dict] = None) -> ParsedDocument:
+    parsed = _parse(body, headers)
+    return ParsedDocument(
+        feed={field: parsed.feed.get(field) for field in FEED_FIELDS},
+        entries=[compact_entry(entry) for entry in parsed.entries],
+        parser=parsed.parser,
+    )
+
+
+def _count(future: Future) -> None:
+    if not future.cancelled() and future.exception() is None:
+        PARSED_DOCUMENTS.labels(future.result().parser).inc()
+
+
+def submit_parse(body: bytes, headers: Optional[Dict] = None) -> Future:
+    """Function responsible for parsing a feed document with the first of the
+    `FEED_PARSERS` that supports it.
+    With `FEED_PARSE_PROCESSES` the document is parsed in the parse pool,
+    and only the fields used in ingestion come back, otherwise it is parsed
+    right away in the calling thread.
+
+    Parameters
+    ----------
+    body: bytes
+    headers: Dict
+        Response headers, with lower case names, optional.
+
+    Returns
+    -------
+    Future of a ParsedDocument
+    """
+    if settings.FEED_PARSE_PROCESSES:
+        try:
+            future = get_parse_pool().submit(_parse_compact, body, headers)
+        except BrokenProcessPool:
+            # A parse process died, the next documents go to a new pool
+            get_parse_pool.cache_clear()
+            future = get_parse_pool().submit(_parse_compact, body, headers)
+    else:
+        future = Future()
+        try:
+            future.set_result(_parse(body, headers))
+        except Exception as e:
+            future.set_exception(e)
+    future.add_done_callback(_count)
+    return future
+
+
+def parse_document(body: bytes, headers: Optional[Dict] = None) -> ParsedDocument:
+    """Function responsible for parsing a feed document, see `submit_parse`
+
+    Parameters
+    ----------
+    body: bytes
+    headers: Dict
+        Response headers, with lower case names, optional.
+
+    Returns
+    -------
+    ParsedDocument
+    """
+    return submit_parse(body, headers).result()
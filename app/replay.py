@@ -0,0 +1,266 @@
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from string import hexdigits
+from typing import Dict, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from app.snapshots import SnapshotArchive
+
+# Publication date of the first entry of every synthetic feed, one entry an hour
+EPOCH = datetime(2020, 7, 1, tzinfo=timezone.utc)
+WORDS = (
+    "feed",
+    "python",
+    "release",
+    "django",
+    "performance",
+    "server",
+    "query",
+    "update",
+    "notes",
+    "index",
+    "cache",
+    "request",
+    "the",
+    "and",
+    "with",
+    "for",
+    "new",
+    "version",
+)
+CONTENT_TYPES = {"rss": "application/rss+xml", "atom": "application/atom+xml"}
+
+
+@dataclass
+class ReplayConfig:
+    """Behaviour of the `ReplayServer`, changed while it runs
+
+    """
+
+    # Entries in each synthetic document, and characters of their summaries
+    entries: int = 20
+    summary_size: int = 500
+    # Seconds before answering, plus a random share of `jitter`
+    latency: float = 0.0
+    jitter: float = 0.0
+    # If the documents have an ETag, answering `If-None-Match` with a 304
+    etag: bool = True
+    # Share of the requests for which a feed publishes a new entry first
+    change_rate: float = 0.0
+    # Share of the requests answered with a 500 or a 503
+    error_rate: float = 0.0
+    seed: int = 0
+
+
+def summary(number: int, entry: int, size: int) -> str:
+    generator = random.Random(f"{number}/{entry}")
+    words = []
+    length = 0
+    while length < size:
+        word = generator.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return f"<p>{' '.join(words)}</p>"
+
+
+@lru_cache(maxsize=4096)
+def synthetic_document(
+    kind: str, number: int, version: int, entries: int, summary_size: int
+) -> bytes:
+    """Function responsible for generating the document of a synthetic feed.
+    Version `n` of a feed has the entries `n` to `n + entries - 1`, newest first,
+    so every new version publishes one entry.
+
+    Parameters
+    ----------
+    kind: str
+        rss or atom
+    number: int
+        Feed number
+    version: int
+        Entries published since the first version
+    entries: int
+    summary_size: int
+
+    Returns
+    -------
+    bytes
+    """
+    link = f"http://replay.test/{kind}/{number}"
+    updated = EPOCH + timedelta(hours=version + entries - 1)
+    numbers = range(version + entries - 1, version - 1, -1)
+    if kind == "atom":
+        body = "".join(
+            f"<entry><title>Entry {entry}</title>"
+            f'<link href="{link}/{entry}"/><id>{link}/{entry}</id>'
+            f"<published>{(EPOCH + timedelta(hours=entry)).isoformat()}</published>"
+            f"<updated>{(EPOCH + timedelta(hours=entry)).isoformat()}</updated>"
+            f'<summary type="html">{escape(summary(number, entry, summary_size))}'
+            f"</summary></entry>"
+            for entry in numbers
+        )
+        return (
+            f'<?xml version="1.0" encoding="utf-8"?>'
+            f'<feed xmlns="http://www.w3.org/2005/Atom"><title>Feed {number}</title>'
+            f'<link href="{link}"/><id>{link}</id>'
+            f"<updated>{updated.isoformat()}</updated>{body}</feed>"
+        ).encode()
+    body = "".join(
+        f"<item><title>Entry {entry}</title><link>{link}/{entry}</link>"
+        f"<guid>{link}/{entry}</guid>"
+        f"<pubDate>{format_datetime(EPOCH + timedelta(hours=entry))}</pubDate>"
+        f"<description>{escape(summary(number, entry, summary_size))}</description>"
+        f"</item>"
+        for entry in numbers
+    )
+    return (
+        f'<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel>'
+        f"<title>Feed {number}</title><link>{link}</link>"
+        f"<description>Synthetic feed {number}</description><ttl>60</ttl>"
+        f"<lastBuildDate>{format_datetime(updated)}</lastBuildDate>"
+        f"{body}</channel></rss>"
+    ).encode()
+
+
+class ReplayServer:
+    """Local HTTP stand-in for feed publishers, to benchmark the ingestion without
+    the internet. Serves synthetic feeds at `/rss/<number>` and `/atom/<number>`,
+    and the bodies of the `SnapshotArchive` at `/recorded/<digest>`, with the
+    latency, validators, changes and errors of its `ReplayConfig`.
+
+    """
+
+    def __init__(
+        self, config: Optional[ReplayConfig] = None, host: str = "127.0.0.1", port=0
+    ):
+        self.config = config or ReplayConfig()
+        self.random = random.Random(self.config.seed)
+        self.versions: Dict[str, int] = {}
+        self.statuses = Counter()
+        self.lock = threading.Lock()
+        self.archive = SnapshotArchive()
+        self.httpd = ThreadingHTTPServer((host, port), self.handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, number: int, kind: str = "rss") -> str:
+        return f"{self.base_url}/{kind}/{number}"
+
+    def recorded_url(self, digest: str) -> str:
+        return f"{self.base_url}/recorded/{digest}"
+
+    def start(self) -> "ReplayServer":
+        """Function responsible for serving in a background thread
+
+        Returns
+        -------
+        ReplayServer
+        """
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def draw(self, path: str) -> Tuple[float, Optional[int], int]:
+        """Function responsible for drawing how a request is answered
+
+        Parameters
+        ----------
+        path: str
+            Path requested
+
+        Returns
+        -------
+        Tuple with the delay, the error status or None, and the feed version
+        """
+        config = self.config
+        with self.lock:
+            delay = config.latency + self.random.random() * config.jitter
+            error = None
+            if self.random.random() < config.error_rate:
+                error = self.random.choice((500, 503))
+            version = self.versions.get(path, 0)
+            if self.random.random() < config.change_rate:
+                version = self.versions[path] = version + 1
+        return delay, error, version
+
+    def respond(self, path: str) -> Tuple[int, Dict[str, str], bytes]:
+        """Function responsible for building the answer to a request
+
+        Parameters
+        ----------
+        path: str
+
+        Returns
+        -------
+        Tuple with the status, headers and body
+        """
+        kind, _, key = path.strip("/").partition("/")
+        if kind == "recorded":
+            valid = len(key) == 64 and all(char in hexdigits for char in key)
+        else:
+            valid = kind in CONTENT_TYPES and key.isdigit()
+        if not valid:
+            return 404, {}, b""
+        delay, error, version = self.draw(path)
+        time.sleep(delay)
+        if error:
+            return error, {"Retry-After": "1"} if error == 503 else {}, b""
+        if kind == "recorded":
+            try:
+                headers = {"Content-Type": "application/xml", "ETag": f'"{key[:32]}"'}
+                return 200, headers, self.archive.read(key)
+            except FileNotFoundError:
+                return 404, {}, b""
+        headers = {
+            "Content-Type": CONTENT_TYPES[kind],
+            "ETag": f'"{key}-{version}"',
+        }
+        body = synthetic_document(
+            kind, int(key), version, self.config.entries, self.config.summary_size
+        )
+        return 200, headers, body
+
+    def handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are separate writes, that would wait on delayed acks
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                status, headers, body = server.respond(self.path.split("?")[0])
+                etag = headers.get("ETag")
+                if not server.config.etag:
+                    headers.pop("ETag", None)
+                elif etag and self.headers.get("If-None-Match") == etag:
+                    status, body = 304, b""
+                with server.lock:
+                    server.statuses[status] += 1
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
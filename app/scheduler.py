@@ -0,0 +1,278 @@
+import heapq
+import logging
+import math
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils.timezone import now
+
+from app.metrics import DISPATCHED_FEEDS, SCHEDULE_LAG, SCHEDULED_FEEDS
+from app.models import Feed, Item
+from app.tasks import subscribe_feed, update_feeds_batch
+from app.websub import due_renewals, pushed
+
+logger = logging.getLogger(__name__)
+
+
+def publish_cadences(feed_ids: Iterable[int], since: datetime) -> Dict[int, float]:
+    """Function responsible for estimating how often each feed publishes.
+    The gaps between consecutive items of all feeds are computed in a single
+    vectorized pass, and reduced to their median per feed.
+
+    Parameters
+    ----------
+    feed_ids: Iterable[int]
+        Feed ids
+    since: datetime
+        Only items published after it are considered
+
+    Returns
+    -------
+    Dict of feed id to the median seconds between items,
+    feeds with less than two items are left out
+    """
+    rows = list(
+        Item.objects.filter(feed_id__in=feed_ids, published_at__gte=since)
+        .order_by("feed_id", "published_at")
+        .values_list("feed_id", "published_at")
+    )
+    feeds = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    published = np.fromiter(
+        (row[1].timestamp() for row in rows), dtype=np.float64, count=len(rows)
+    )
+
+    same_feed = feeds[1:] == feeds[:-1]
+    gaps = np.diff(published)[same_feed]
+    gap_feeds = feeds[1:][same_feed]
+    if not gaps.size:
+        return {}
+
+    order = np.lexsort((gaps, gap_feeds))
+    gaps, gap_feeds = gaps[order], gap_feeds[order]
+    unique, starts, counts = np.unique(gap_feeds, return_index=True, return_counts=True)
+    medians = (gaps[starts + (counts - 1) // 2] + gaps[starts + counts // 2]) / 2
+    return dict(zip(unique.tolist(), medians.tolist()))
+
+
+def fetch_interval(
+    ttl: Optional[int],
+    max_age: Optional[int],
+    cadence: Optional[float],
+    followers: int,
+) -> int:
+    """Function responsible for choosing the seconds between two fetches of a feed.
+    Feeds are polled about twice per published item, more often the more
+    followers they have, but never sooner than the feed `ttl` or the server
+    cache headers allow. Feeds without followers use the maximum interval.
+
+    Parameters
+    ----------
+    ttl: int
+        Feed ttl, in minutes
+    max_age: int
+        Cache max age of the last response, in seconds
+    cadence: float
+        Median seconds between items, None if unknown
+    followers: int
+        Number of active followers
+
+    Returns
+    -------
+    Seconds, between `SCHEDULER_MIN_INTERVAL` and `SCHEDULER_MAX_INTERVAL`
+    """
+    if not followers:
+        return settings.SCHEDULER_MAX_INTERVAL
+
+    interval = settings.SCHEDULER_DEFAULT_INTERVAL if cadence is None else cadence / 2
+    interval /= 1 + math.log10(followers)
+    interval = max(interval, (ttl or 0) * 60, max_age or 0)
+    return int(
+        min(
+            max(interval, settings.SCHEDULER_MIN_INTERVAL),
+            settings.SCHEDULER_MAX_INTERVAL,
+        )
+    )
+
+
+class FeedScheduler:
+    """Priority queue of feeds by next due time.
+    Due feeds are rescheduled and dispatched in batches to `update_feeds_batch`.
+    Feeds pushed by their WebSub hub are left out until their lease expires.
+
+    """
+
+    def __init__(self, batch_size: Optional[int] = None):
+        self.batch_size = batch_size or settings.SCHEDULER_BATCH_SIZE
+        self.queue: List[Tuple[float, int]] = []
+        self.max_lag = 0.0
+
+    def load(self, at: Optional[datetime] = None) -> None:
+        """Function responsible for rebuilding the queue from the database.
+        Feeds never scheduled are due at `at`, pushed feeds are not loaded.
+
+        Parameters
+        ----------
+        at: datetime
+            Defaults to now
+
+        Returns
+        -------
+
+        """
+        at = at or now()
+        self.queue = [
+            (next_fetch_at.timestamp() if next_fetch_at else at.timestamp(), feed_id)
+            for feed_id, next_fetch_at in Feed.objects.exclude(pushed(at)).values_list(
+                "id", "next_fetch_at"
+            )
+        ]
+        heapq.heapify(self.queue)
+        SCHEDULED_FEEDS.set(len(self.queue))
+
+    def pop_due(self, at: datetime) -> List[int]:
+        """Function responsible for removing the feeds due at `at` from the queue,
+        observing how late each one is
+
+        Parameters
+        ----------
+        at: datetime
+
+        Returns
+        -------
+        List of due feed ids
+        """
+        timestamp = at.timestamp()
+        due = []
+        self.max_lag = 0.0
+        while self.queue and self.queue[0][0] <= timestamp:
+            due_at, feed_id = heapq.heappop(self.queue)
+            lag = timestamp - due_at
+            SCHEDULE_LAG.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            due.append(feed_id)
+        return due
+
+    def reschedule(self, feed_ids: List[int], at: datetime) -> List[int]:
+        """Function responsible for computing the next due time of the feeds,
+        saving it and putting them back in the queue.
+        Quarantined feeds are not due before their quarantine ends.
+        Pushed feeds are due when their lease expires, and are left out of the
+        queue, to be loaded again if the lease is not renewed.
+
+        Parameters
+        ----------
+        feed_ids: List[int]
+        at: datetime
+
+        Returns
+        -------
+        List of the feed ids still polled
+        """
+        feeds = list(
+            Feed.objects.filter(id__in=feed_ids)
+            .select_related("subscription")
+            .annotate(
+                followers=Count(
+                    "userfollowfeed",
+                    filter=Q(userfollowfeed__disabled_at__isnull=True),
+                )
+            )
+        )
+        pushed_ids = set(
+            Feed.objects.filter(pushed(at), id__in=feed_ids).values_list(
+                "id", flat=True
+            )
+        )
+        polled = []
+        since = at - timedelta(seconds=settings.SCHEDULER_CADENCE_WINDOW)
+        cadences = publish_cadences(feed_ids, since)
+        for feed in feeds:
+            feed.fetch_interval = fetch_interval(
+                feed.ttl, feed.cache_max_age, cadences.get(feed.id), feed.followers
+            )
+            feed.next_fetch_at = at + timedelta(seconds=feed.fetch_interval)
+            if feed.quarantined_until and feed.quarantined_until > feed.next_fetch_at:
+                feed.next_fetch_at = feed.quarantined_until
+            if feed.id in pushed_ids:
+                feed.next_fetch_at = feed.subscription.lease_expires_at
+                continue
+            heapq.heappush(self.queue, (feed.next_fetch_at.timestamp(), feed.id))
+            polled.append(feed.id)
+        Feed.objects.bulk_update(
+            feeds, ["fetch_interval", "next_fetch_at"], batch_size=self.batch_size
+        )
+        return polled
+
+    def dispatch(self, feed_ids: List[int]) -> None:
+        """Function responsible for sending the feeds to `update_feeds_batch`, in batches
+
+        Parameters
+        ----------
+        feed_ids: List[int]
+
+        Returns
+        -------
+
+        """
+        for start in range(0, len(feed_ids), self.batch_size):
+            update_feeds_batch.send(feed_ids[start : start + self.batch_size])
+        DISPATCHED_FEEDS.inc(len(feed_ids))
+
+    def run_once(self, at: Optional[datetime] = None) -> List[int]:
+        """Function responsible for dispatching every feed due at `at`
+
+        Parameters
+        ----------
+        at: datetime
+            Defaults to now
+
+        Returns
+        -------
+        List of dispatched feed ids
+        """
+        at = at or now()
+        due = self.pop_due(at)
+        if due:
+            due = self.reschedule(due, at)
+            self.dispatch(due)
+            logger.info("Dispatched %s feeds, max lag %.1fs", len(due), self.max_lag)
+        SCHEDULED_FEEDS.set(len(self.queue))
+        return due
+
+    def renew_subscriptions(self, at: Optional[datetime] = None) -> int:
+        """Function responsible for sending the WebSub subscriptions whose lease
+        is about to expire to `subscribe_feed`, see `due_renewals`
+
+        Parameters
+        ----------
+        at: datetime
+            Defaults to now
+
+        Returns
+        -------
+        Number of subscriptions renewed
+        """
+        subscription_ids = list(due_renewals(at))
+        for subscription_id in subscription_ids:
+            subscribe_feed.send(subscription_id)
+        return len(subscription_ids)
+
+    def seconds_until_due(self, at: Optional[datetime] = None) -> Optional[float]:
+        """Function responsible for telling how long until the next feed is due
+
+        Parameters
+        ----------
+        at: datetime
+            Defaults to now
+
+        Returns
+        -------
+        Seconds, or None if the queue is empty
+        """
+        if not self.queue:
+            return None
+        at = at or now()
+        return max(self.queue[0][0] - at.timestamp(), 0.0)
@@ -0,0 +1,427 @@
+import random
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from itertools import accumulate
+from typing import Dict, List, Optional, Tuple, Type
+
+from django.contrib.auth.models import User
+from django.db import connection as default_connection
+from django.db import models, transaction
+
+from app.bitmaps import RoaringBitmap
+from app.compression import compress
+from app.excerpts import html_excerpt, text_preview
+from app.models import (
+    Feed,
+    Item,
+    ItemStateBitmap,
+    UnreadCounter,
+    UserFollowFeed,
+    UserRelItem,
+)
+from app.models.item import item_digest
+from app.models.user_rel_item import UserRelItemKind
+from app.replay import summary
+
+# Publication date of the newest item of every feed, the items go back a year
+SEED_EPOCH = datetime(2020, 8, 1, tzinfo=timezone.utc)
+SEED_SPAN = timedelta(days=365)
+# Distinct descriptions, compressed once and shared by the items
+DESCRIPTIONS = 64
+POSTGRESQL = "postgresql"
+
+
+@dataclass
+class Profile:
+    """Behaviour of a share of the users of a `ScaleConfig`
+
+    """
+
+    share: float
+    # Mean number of feeds followed, exponentially distributed
+    follows: int
+    # Share of the recent items of a followed feed that are read
+    read_rate: float
+    # Share of the read items that are favorited and commented
+    favorite_rate: float
+    comment_rate: float
+
+
+PROFILES = {
+    "heavy": Profile(
+        share=0.1, follows=60, read_rate=0.8, favorite_rate=0.05, comment_rate=0.01
+    ),
+    "casual": Profile(
+        share=0.5, follows=15, read_rate=0.2, favorite_rate=0.02, comment_rate=0.001
+    ),
+    "lurker": Profile(
+        share=0.4, follows=4, read_rate=0.01, favorite_rate=0.0, comment_rate=0.0
+    ),
+}
+
+
+@dataclass
+class ScaleConfig:
+    """Size and skew of the dataset generated by `seed_scale`
+
+    """
+
+    users: int = 1000
+    feeds: int = 200
+    items: int = 100000
+    seed: int = 0
+    # Exponent of the Zipf popularity of the feeds, the feed of rank k is followed
+    # in proportion to 1 / k ** zipf
+    zipf: float = 1.1
+    # Shape of the Pareto distribution of the items per feed, lower has a longer tail
+    pareto: float = 1.2
+    # Newest items of a feed a user may have read, the ones before are unread
+    read_window: int = 1000
+    summary_size: int = 500
+    batch_size: int = 10000
+
+
+def copy_value(value) -> str:
+    """Function responsible for formatting a value in the text format of
+    PostgreSQL `COPY`
+
+    Parameters
+    ----------
+    value: Any
+
+    Returns
+    -------
+    str
+    """
+    if value is None:
+        return r"\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (bytes, memoryview)):
+        return r"\\x" + bytes(value).hex()
+    if isinstance(value, datetime):
+        return value.isoformat()
+    value = str(value)
+    for char, escaped in (("\\", r"\\"), ("\t", r"\t"), ("\n", r"\n"), ("\r", r"\r")):
+        value = value.replace(char, escaped)
+    return value
+
+
+class BulkLoader:
+    """Writes model instances in batches of `batch_size` per model, with `COPY` on
+    PostgreSQL and `bulk_create` on the other databases. The primary keys of the
+    instances are not set, read them back with a query.
+
+    """
+
+    def __init__(self, batch_size: int, connection=None):
+        self.batch_size = batch_size
+        self.connection = connection or default_connection
+        self.pending: Dict[Type[models.Model], List[models.Model]] = defaultdict(list)
+        self.counts = Counter()
+
+    def add(self, instance: models.Model) -> None:
+        pending = self.pending[type(instance)]
+        pending.append(instance)
+        if len(pending) >= self.batch_size:
+            self.flush(type(instance))
+
+    def flush(self, model: Optional[Type[models.Model]] = None) -> None:
+        """Function responsible for writing the pending instances
+
+        Parameters
+        ----------
+        model: Type[Model]
+            Only the instances of this model, all of them if None
+
+        Returns
+        -------
+
+        """
+        for pending_model in [model] if model else list(self.pending):
+            instances = self.pending.pop(pending_model, [])
+            if not instances:
+                continue
+            if self.connection.vendor == POSTGRESQL:
+                self.copy(pending_model, instances)
+            else:
+                # The backend splits the batch to fit its limits on parameters
+                pending_model.objects.bulk_create(instances)
+            self.counts[pending_model] += len(instances)
+
+    def copy(self, model: Type[models.Model], instances: List[models.Model]) -> None:
+        fields = [
+            field for field in model._meta.concrete_fields if not field.primary_key
+        ]
+        buffer = StringIO()
+        for instance in instances:
+            # pre_save fills the auto_now dates, as bulk_create does
+            buffer.write(
+                "\t".join(
+                    copy_value(field.pre_save(instance, add=True)) for field in fields
+                )
+            )
+            buffer.write("\n")
+        buffer.seek(0)
+        quote = self.connection.ops.quote_name
+        columns = ", ".join(quote(field.column) for field in fields)
+        with self.connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {quote(model._meta.db_table)} ({columns}) FROM STDIN", buffer
+            )
+
+
+def zipf_cum_weights(count: int, exponent: float) -> List[float]:
+    """Function responsible for building the cumulative weights of `count` ranks
+    following Zipf's law
+
+    Parameters
+    ----------
+    count: int
+    exponent: float
+
+    Returns
+    -------
+    List[float], for `followed_feeds`
+    """
+    return list(accumulate(1 / (rank + 1) ** exponent for rank in range(count)))
+
+
+def item_counts(
+    generator: random.Random, feeds: int, items: int, shape: float
+) -> List[int]:
+    """Function responsible for splitting `items` between the feeds, in proportion
+    to Pareto distributed weights, so a few feeds have most of the items
+
+    Parameters
+    ----------
+    generator: random.Random
+    feeds: int
+    items: int
+    shape: float
+        Shape of the Pareto distribution
+
+    Returns
+    -------
+    List[int], the items of each feed, summing to `items`
+    """
+    weights = [generator.paretovariate(shape) for _ in range(feeds)]
+    total = sum(weights)
+    counts = [int(items * weight / total) for weight in weights]
+    heaviest = sorted(range(feeds), key=lambda feed: -weights[feed])
+    for feed in heaviest[: items - sum(counts)]:
+        counts[feed] += 1
+    return counts
+
+
+def followed_feeds(
+    generator: random.Random, cum_weights: List[float], count: int
+) -> List[int]:
+    """Function responsible for drawing `count` distinct feeds by their popularity
+
+    Parameters
+    ----------
+    generator: random.Random
+    cum_weights: List[float]
+        See `zipf_cum_weights`
+    count: int
+
+    Returns
+    -------
+    List[int], ranks of the feeds
+    """
+    # Drawing most of the feeds would wait on the least popular ones
+    count = min(count, max(1, len(cum_weights) // 2))
+    chosen = {}
+    while len(chosen) < count:
+        rank = bisect_left(cum_weights, generator.random() * cum_weights[-1])
+        chosen.setdefault(rank, None)
+    return list(chosen)
+
+
+def user_profiles(config: ScaleConfig) -> List[Profile]:
+    generator = random.Random(f"{config.seed}/profiles")
+    profiles = list(PROFILES.values())
+    return generator.choices(
+        profiles, weights=[profile.share for profile in profiles], k=config.users
+    )
+
+
+def descriptions(config: ScaleConfig) -> List[Tuple[str, bytes, str, bool, str]]:
+    variants = []
+    for number in range(DESCRIPTIONS):
+        text = summary(config.seed, number, config.summary_size)
+        excerpt, truncated = html_excerpt(text)
+        variants.append((text, compress(text), excerpt, truncated, text_preview(text)))
+    return variants
+
+
+def seed_scale(config: ScaleConfig) -> Dict[str, int]:
+    """Function responsible for generating a large dataset to measure the views and
+    tasks against: users, feeds, items, follows, read, favorite and comment marks,
+    with the state bitmaps and unread counters that match them. Feed popularity
+    follows Zipf's law, the items per feed a Pareto distribution, and users are
+    heavy readers, casual readers or lurkers, see `PROFILES`. The same config
+    generates the same dataset.
+
+    Parameters
+    ----------
+    config: ScaleConfig
+
+    Returns
+    -------
+    Dict with the number of rows written, by model name
+
+    Error
+    -----
+        ValueError if the dataset of this seed was already generated.
+    """
+    prefix = f"scale{config.seed}-"
+    feed_url = f"http://scale.test/{config.seed}/"
+    if User.objects.filter(username__startswith=prefix).exists():
+        raise ValueError(f"The dataset of seed {config.seed} already exists")
+    loader = BulkLoader(config.batch_size)
+
+    with transaction.atomic():
+        usernames = [f"{prefix}{number}" for number in range(config.users)]
+        for username in usernames:
+            loader.add(User(username=username, password="!"))
+        urls = [f"{feed_url}{number}" for number in range(config.feeds)]
+        for number, url in enumerate(urls):
+            loader.add(
+                Feed(
+                    title=f"Scale feed {number}",
+                    link=url,
+                    canonical_url=url,
+                    description=f"Synthetic feed {number}",
+                    ttl=60,
+                    last_build_date=SEED_EPOCH,
+                )
+            )
+        loader.flush()
+        user_ids = dict(
+            User.objects.filter(username__startswith=prefix).values_list(
+                "username", "id"
+            )
+        )
+        user_ids = [user_ids[username] for username in usernames]
+        feed_ids = dict(
+            Feed.objects.filter(canonical_url__startswith=feed_url).values_list(
+                "canonical_url", "id"
+            )
+        )
+        feed_ids = [feed_ids[url] for url in urls]
+
+        counts = item_counts(
+            random.Random(f"{config.seed}/items"),
+            config.feeds,
+            config.items,
+            config.pareto,
+        )
+        variants = descriptions(config)
+        for number, count in enumerate(counts):
+            generator = random.Random(f"{config.seed}/feed/{number}")
+            step = SEED_SPAN / max(count, 1)
+            newest = SEED_EPOCH - step * generator.random()
+            # Oldest first, so the ids grow with the publication dates
+            for entry in range(count - 1, -1, -1):
+                text, data, excerpt, truncated, preview = generator.choice(variants)
+                link = f"{urls[number]}/{entry}"
+                title = f"Entry {entry}"
+                published_at = newest - step * entry
+                loader.add(
+                    Item(
+                        feed_id=feed_ids[number],
+                        guid=link,
+                        digest=item_digest(title, link, text, published_at),
+                        title=title,
+                        link=link,
+                        description=data,
+                        excerpt=excerpt,
+                        truncated=truncated,
+                        preview=preview,
+                        published_at=published_at,
+                    )
+                )
+        loader.flush()
+
+        cum_weights = zipf_cum_weights(config.feeds, config.zipf)
+        followers = defaultdict(list)
+        for number, profile in enumerate(user_profiles(config)):
+            generator = random.Random(f"{config.seed}/user/{number}")
+            follows = max(1, round(generator.expovariate(1 / profile.follows)))
+            for rank in followed_feeds(generator, cum_weights, follows):
+                followers[rank].append((number, profile))
+                loader.add(
+                    UserFollowFeed(user_id=user_ids[number], feed_id=feed_ids[rank])
+                )
+
+        for rank in sorted(followers):
+            feed_id = feed_ids[rank]
+            recent = list(
+                Item.objects.filter(feed_id=feed_id)
+                .order_by("-published_at", "-id")
+                .values_list("id", flat=True)[: config.read_window]
+            )
+            for number, profile in followers[rank]:
+                generator = random.Random(f"{config.seed}/reads/{number}/{rank}")
+                user_id = user_ids[number]
+                read = generator.sample(recent, round(len(recent) * profile.read_rate))
+                states = {
+                    UserRelItemKind.read: RoaringBitmap(read),
+                    UserRelItemKind.favorite: RoaringBitmap(),
+                }
+                for item_id in read:
+                    loader.add(
+                        UserRelItem(
+                            user_id=user_id, item_id=item_id, kind=UserRelItemKind.read
+                        )
+                    )
+                    if generator.random() < profile.favorite_rate:
+                        states[UserRelItemKind.favorite].add(item_id)
+                        loader.add(
+                            UserRelItem(
+                                user_id=user_id,
+                                item_id=item_id,
+                                kind=UserRelItemKind.favorite,
+                            )
+                        )
+                    if generator.random() < profile.comment_rate:
+                        loader.add(
+                            UserRelItem(
+                                user_id=user_id,
+                                item_id=item_id,
+                                kind=UserRelItemKind.comment,
+                                content=f"Comment of {usernames[number]}",
+                            )
+                        )
+                for kind, bitmap in states.items():
+                    if bitmap:
+                        loader.add(
+                            ItemStateBitmap(
+                                user_id=user_id,
+                                feed_id=feed_id,
+                                kind=kind,
+                                data=bitmap.serialize(),
+                            )
+                        )
+                loader.add(
+                    UnreadCounter(
+                        user_id=user_id,
+                        feed_id=feed_id,
+                        unread=counts[rank] - len(read),
+                    )
+                )
+        loader.flush()
+
+    if loader.connection.vendor == POSTGRESQL:
+        # Plans are only as good as the statistics of the new rows
+        with loader.connection.cursor() as cursor:
+            for model in loader.counts:
+                cursor.execute(
+                    f"ANALYZE {loader.connection.ops.quote_name(model._meta.db_table)}"
+                )
+    return {model.__name__: count for model, count in loader.counts.items()}
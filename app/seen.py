@@ -0,0 +1,119 @@
+import math
+from hashlib import blake2b
+from typing import Iterable, List, Optional
+
+from django.conf import settings
+
+from app.store import get_redis_connection
+
+
+class SeenEntries:
+    """Bloom filter of the identities of the items of a feed, kept in a Redis bitmap.
+    An identity not in the filter was never stored for the feed, so the database
+    only has to be consulted for the identities that may be in it.
+
+    """
+
+    prefix = "seen-entries"
+
+    def __init__(
+        self,
+        feed_id: int,
+        capacity: Optional[int] = None,
+        error_rate: Optional[float] = None,
+    ):
+        capacity = capacity or settings.SEEN_FILTER_CAPACITY
+        error_rate = error_rate or settings.SEEN_FILTER_ERROR_RATE
+        bits = -capacity * math.log(error_rate) / math.log(2) ** 2
+        self.size = math.ceil(bits / 8) * 8
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self.key = f"{self.prefix}:{feed_id}"
+        self.connection = get_redis_connection()
+        self.bitmap = None
+
+    def offsets(self, identity: str) -> List[int]:
+        """Function responsible for getting the bits of an identity, with double hashing
+
+        Parameters
+        ----------
+        identity: str
+
+        Returns
+        -------
+        List with the offset of each bit
+        """
+        digest = blake2b(identity.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "big")
+        second = int.from_bytes(digest[8:], "big") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, identity: str) -> bool:
+        bitmap = self.bitmap or b""
+        for offset in self.offsets(identity):
+            byte = offset >> 3
+            # Redis numbers the bits of a byte from the most significant one
+            if byte >= len(bitmap) or not bitmap[byte] & (0x80 >> (offset & 7)):
+                return False
+        return True
+
+    def load(self) -> bool:
+        """Function responsible for reading the filter from Redis
+
+        Returns
+        -------
+        bool, False if the filter does not exist and must be warmed
+        """
+        bitmap = self.connection.get(self.key)
+        if bitmap is None:
+            return False
+        self.bitmap = bytearray(bitmap).ljust(self.size // 8, b"\0")
+        return True
+
+    def warm(self, identities: Iterable[str]) -> None:
+        """Function responsible for creating the filter from the stored identities.
+        If another process created it meanwhile its filter is used instead.
+
+        Parameters
+        ----------
+        identities: Iterable[str]
+            Identities of every item of the feed
+
+        Returns
+        -------
+
+        """
+        self.bitmap = bytearray(self.size // 8)
+        self._set_bits(identities)
+        created = self.connection.set(
+            self.key, bytes(self.bitmap), nx=True, ex=settings.SEEN_FILTER_TTL
+        )
+        if not created:
+            self.load()
+
+    def add(self, identities: Iterable[str]) -> None:
+        """Function responsible for adding the identities of stored items to the filter
+
+        Parameters
+        ----------
+        identities: Iterable[str]
+
+        Returns
+        -------
+
+        """
+        pipeline = self.connection.pipeline()
+        pipeline.expire(self.key, settings.SEEN_FILTER_TTL)
+        for offset in set(self._set_bits(identities)):
+            pipeline.setbit(self.key, offset, 1)
+        existed = pipeline.execute()[0]
+        if not existed:
+            # The filter expired, the bits set now would make a partial filter
+            self.connection.delete(self.key)
+
+    def _set_bits(self, identities: Iterable[str]) -> List[int]:
+        offsets = []
+        for identity in identities:
+            for offset in self.offsets(identity):
+                self.bitmap[offset >> 3] |= 0x80 >> (offset & 7)
+                offsets.append(offset)
+        return offsets
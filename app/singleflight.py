@@ -0,0 +1,127 @@
+from typing import Optional, Set
+from uuid import uuid4
+
+import redis
+from django.conf import settings
+
+from app.store import get_redis_connection
+
+
+class FeedRefreshFlight:
+    """Single-flight of the refreshes of a feed, backed by Redis.
+    Only the holder of the lease fetches the feed. Users asking for a refresh
+    while it runs are attached as waiters, and refreshes asked within
+    `FEED_REFRESH_COALESCE_WINDOW` of a successful one are skipped.
+
+    """
+
+    prefix = "feed-refresh"
+
+    def __init__(self, feed_id: int):
+        self.feed_id = feed_id
+        self.lease_key = f"{self.prefix}:{feed_id}:lease"
+        self.waiters_key = f"{self.prefix}:{feed_id}:waiters"
+        self.refreshed_key = f"{self.prefix}:{feed_id}:refreshed"
+        self.token = uuid4().hex
+        self.connection = get_redis_connection()
+
+    def recently_refreshed(self) -> bool:
+        """Function responsible for checking if the feed was refreshed within
+        the coalescing window
+
+        Returns
+        -------
+        bool
+        """
+        return bool(self.connection.exists(self.refreshed_key))
+
+    def acquire(self) -> bool:
+        """Function responsible for taking the lease of the feed refresh
+
+        Returns
+        -------
+        bool, True if the lease was taken
+        """
+        return bool(
+            self.connection.set(
+                self.lease_key, self.token, nx=True, ex=settings.FEED_REFRESH_LEASE,
+            )
+        )
+
+    def join(self, user_id: Optional[int]) -> bool:
+        """Function responsible for attaching a user to the running refresh
+
+        Parameters
+        ----------
+        user_id: int
+            User to notify if the refresh fails, optional.
+
+        Returns
+        -------
+        bool, False if no refresh is running anymore and the user was not attached
+        """
+        if user_id is None:
+            return bool(self.connection.exists(self.lease_key))
+
+        pipeline = self.connection.pipeline(transaction=False)
+        pipeline.sadd(self.waiters_key, user_id)
+        pipeline.exists(self.lease_key)
+        _, running = pipeline.execute()
+        if running:
+            return True
+        # The refresh finished before the user was attached, unless its
+        # holder already took the user with the other waiters.
+        return not self.connection.srem(self.waiters_key, user_id)
+
+    def begin(self, user_id: Optional[int] = None) -> bool:
+        """Function responsible for deciding if the caller must refresh the feed
+
+        Parameters
+        ----------
+        user_id: int
+            User asking for the refresh, optional.
+
+        Returns
+        -------
+        bool, True if the caller holds the lease and must refresh the feed,
+        False if it was coalesced with a running or recent refresh
+        """
+        while True:
+            if self.recently_refreshed():
+                return False
+            if self.acquire():
+                return True
+            if self.join(user_id):
+                return False
+
+    def finish(self, succeeded: bool) -> Set[int]:
+        """Function responsible for releasing the lease, marking the feed as
+        refreshed if it succeeded
+
+        Parameters
+        ----------
+        succeeded: bool
+
+        Returns
+        -------
+        Set with the ids of the users waiting on the refresh
+        """
+        with self.connection.pipeline() as pipeline:
+            try:
+                pipeline.watch(self.lease_key)
+                owned = pipeline.get(self.lease_key) == self.token.encode()
+                pipeline.multi()
+                if succeeded and settings.FEED_REFRESH_COALESCE_WINDOW:
+                    pipeline.set(
+                        self.refreshed_key, 1, ex=settings.FEED_REFRESH_COALESCE_WINDOW
+                    )
+                if owned:
+                    pipeline.delete(self.lease_key)
+                    pipeline.smembers(self.waiters_key)
+                    pipeline.delete(self.waiters_key)
+                results = pipeline.execute()
+            except redis.WatchError:
+                owned = False
+        # When the lease expired, the waiters are left to the refresh holding it now
+        waiters = results[-2] if owned else set()
+        return {int(user_id) for user_id in waiters}
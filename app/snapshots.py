@@ -0,0 +1,222 @@
+import hashlib
+import logging
+import mmap
+import os
+import tempfile
+from datetime import datetime, timedelta
+from typing import BinaryIO, Dict, Iterable, Tuple
+
+import zstandard
+from django.conf import settings
+from django.db.models import Max
+
+from app.fetch import FetchResult
+from app.models.feed_snapshot import FeedSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Rows deleted, and digests looked up, at once when pruning
+PRUNE_BATCH_SIZE = 500
+
+
+def body_digest(result: FetchResult) -> str:
+    """Function responsible for hashing the body of a fetch, read in chunks
+    from the temporary file of large documents
+
+    Parameters
+    ----------
+    result: FetchResult
+
+    Returns
+    -------
+    sha256 hexdigest of the body
+    """
+    digest = hashlib.sha256()
+    if result.stream is None:
+        digest.update(result.body)
+        return digest.hexdigest()
+    for chunk in iter(
+        lambda: result.stream.read(settings.FEED_STREAMING_CHUNK_SIZE), b""
+    ):
+        digest.update(chunk)
+    result.stream.seek(0)
+    return digest.hexdigest()
+
+
+class SnapshotArchive:
+    """Content addressed archive of the fetched bodies, indexed by `FeedSnapshot`.
+    Bodies are zstd compressed files named by their digest, in two levels of
+    directories under `SNAPSHOT_ROOT`, so a body fetched many times is stored once.
+
+    """
+
+    def __init__(self, root: str = None):
+        self.root = root or settings.SNAPSHOT_ROOT
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}.zst")
+
+    def put(self, result: FetchResult, digest: str) -> bool:
+        """Function responsible for storing the body of a fetch, unless a body with
+        the same digest is already stored
+
+        Parameters
+        ----------
+        result: FetchResult
+        digest: str
+            Digest of the body, see `body_digest`
+
+        Returns
+        -------
+        bool, False if the body was already stored
+        """
+        path = self.path(digest)
+        if os.path.exists(path):
+            # Blobs used recently are not pruned, see `prune`
+            os.utime(path)
+            return False
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        compressor = zstandard.ZstdCompressor(level=settings.SNAPSHOT_LEVEL)
+        # Written aside and renamed, so readers never see a partial blob
+        target = tempfile.NamedTemporaryFile(dir=directory, delete=False)
+        try:
+            with target:
+                if result.stream is None:
+                    target.write(compressor.compress(result.body))
+                else:
+                    compressor.copy_stream(result.stream, target, size=result.size)
+                    result.stream.seek(0)
+            os.replace(target.name, path)
+        except BaseException:
+            os.unlink(target.name)
+            raise
+        return True
+
+    def open(self, digest: str) -> BinaryIO:
+        """Function responsible for opening a stored body, memory mapped and
+        decompressed as it is read, for documents too large to be read at once
+
+        Parameters
+        ----------
+        digest: str
+
+        Returns
+        -------
+        File-like object with the body
+        """
+        with open(self.path(digest), "rb") as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return zstandard.ZstdDecompressor().stream_reader(buffer)
+
+    def read(self, digest: str) -> bytes:
+        """Function responsible for reading a stored body, decompressed straight
+        from the memory mapped file
+
+        Parameters
+        ----------
+        digest: str
+
+        Returns
+        -------
+        bytes
+        """
+        with open(self.path(digest), "rb") as file, mmap.mmap(
+            file.fileno(), 0, access=mmap.ACCESS_READ
+        ) as buffer:
+            return zstandard.ZstdDecompressor().decompressobj().decompress(buffer)
+
+    def prune(self, at: datetime) -> Tuple[int, int]:
+        """Function responsible for removing the snapshots older than
+        `SNAPSHOT_RETENTION` seconds, except the latest of each feed, and the
+        bodies no snapshot uses any longer
+
+        Parameters
+        ----------
+        at: datetime
+            Current time
+
+        Returns
+        -------
+        Tuple with the number of snapshots and of bodies removed
+        """
+        cutoff = at - timedelta(seconds=settings.SNAPSHOT_RETENTION)
+        latest = (
+            FeedSnapshot.objects.values("feed_id")
+            .annotate(latest=Max("id"))
+            .values("latest")
+        )
+        expired = FeedSnapshot.objects.filter(fetched_at__lt=cutoff).exclude(
+            id__in=latest
+        )
+        removed, digests = 0, set()
+        while True:
+            batch = list(expired.values_list("id", "digest")[:PRUNE_BATCH_SIZE])
+            if not batch:
+                break
+            FeedSnapshot.objects.filter(id__in=[pk for pk, _ in batch]).delete()
+            removed += len(batch)
+            digests.update(digest for _, digest in batch)
+
+        unused = sorted(digests)
+        for start in range(0, len(unused), PRUNE_BATCH_SIZE):
+            digests.difference_update(
+                FeedSnapshot.objects.filter(
+                    digest__in=unused[start : start + PRUNE_BATCH_SIZE]
+                ).values_list("digest", flat=True)
+            )
+        deleted = 0
+        for digest in digests:
+            path = self.path(digest)
+            try:
+                # Stored again since the cutoff, about to be indexed by a fetch
+                if os.stat(path).st_mtime >= cutoff.timestamp():
+                    continue
+                os.unlink(path)
+                deleted += 1
+            except FileNotFoundError:
+                pass
+        return removed, deleted
+
+
+def take_snapshots(results: Iterable[FetchResult], at: datetime) -> Dict[int, str]:
+    """Function responsible for hashing the bodies of fetches and, with
+    `SNAPSHOT_ENABLED`, storing them in the `SnapshotArchive`, indexed with one
+    insert. Bodies that can not be stored are logged and do not stop the fetches.
+
+    Parameters
+    ----------
+    results: Iterable[FetchResult]
+        Fetches, with their `feed_id`
+    at: datetime
+        Time of the fetches
+
+    Returns
+    -------
+    Dict of feed id to the digest of the body, for the fetches with a body
+    """
+    archive = SnapshotArchive()
+    digests, snapshots = {}, []
+    for result in results:
+        if result.status is None or result.not_modified:
+            continue
+        digest = digests[result.feed_id] = body_digest(result)
+        if not settings.SNAPSHOT_ENABLED:
+            continue
+        try:
+            archive.put(result, digest)
+        except OSError:
+            logger.exception("Body of feed %s was not archived", result.feed_id)
+            continue
+        snapshots.append(
+            FeedSnapshot(
+                feed_id=result.feed_id,
+                fetched_at=at,
+                status=result.status,
+                content_type=result.headers.get("content-type", "")[:200],
+                digest=digest,
+                size=result.size,
+            )
+        )
+    FeedSnapshot.objects.bulk_create(snapshots)
+    return digests
@@ -0,0 +1,98 @@
+import json
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+import redis
+from django.conf import settings
+
+ENTRY_FIELDS = ("id", "title", "link", "summary", "published_parsed")
+
+
+@lru_cache(maxsize=None)
+def get_redis_connection() -> redis.Redis:
+    """Function responsible for returning the Redis connection of the process.
+    The connection is created once and shared by every task running in the worker.
+
+    Returns
+    -------
+    redis.Redis
+    """
+    return redis.Redis.from_url(settings.REDIS_URL)
+
+
+def compact_entry(entry: Dict) -> Dict:
+    """Function responsible for reducing a parsed entry to the fields used in ingestion
+
+    Parameters
+    ----------
+    entry: Dict
+        Feed entry, as returned by feedparser
+
+    Returns
+    -------
+    Dict with only the `ENTRY_FIELDS` keys
+    """
+    return {field: entry.get(field) for field in ENTRY_FIELDS}
+
+
+class ContentStore:
+    """Short-lived store for parsed feed entries, keyed by feed url and fetch id.
+    Used to hand the entries of a fetch to the ingestion stage without fetching again.
+
+    """
+
+    prefix = "feed-content"
+
+    def __init__(self, ttl: Optional[int] = None):
+        self.ttl = ttl or settings.FEED_CONTENT_TTL
+        self.connection = get_redis_connection()
+
+    def key(self, url: str, fetch_id: str) -> str:
+        return f"{self.prefix}:{url}:{fetch_id}"
+
+    def put(self, url: str, fetch_id: str, entries: Iterable[Dict]) -> None:
+        """Function responsible for storing the entries of a fetch
+
+        Parameters
+        ----------
+        url: str
+            Feed url
+        fetch_id: str
+            Id of the fetch that produced the entries
+        entries: Iterable[Dict]
+            Parsed feed entries
+
+        Returns
+        -------
+
+        """
+        records = [compact_entry(entry) for entry in entries]
+        self.connection.set(self.key(url, fetch_id), json.dumps(records), ex=self.ttl)
+
+    def pop(self, url: str, fetch_id: str) -> Optional[List[Dict]]:
+        """Function responsible for getting and removing the entries of a fetch
+
+        Parameters
+        ----------
+        url: str
+            Feed url
+        fetch_id: str
+            Id of the fetch that produced the entries
+
+        Returns
+        -------
+        List of entries, or None if they were never stored or already expired
+        """
+        key = self.key(url, fetch_id)
+        pipeline = self.connection.pipeline()
+        pipeline.get(key)
+        pipeline.delete(key)
+        value, _ = pipeline.execute()
+        if value is None:
+            return None
+
+        entries = json.loads(value)
+        for entry in entries:
+            if entry["published_parsed"] is not None:
+                entry["published_parsed"] = tuple(entry["published_parsed"])
+        return entries
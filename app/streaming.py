@@ -0,0 +1,200 @@
+import re
+from typing import BinaryIO, Dict, Iterator, Optional
+
+from django.conf import settings
+from lxml import etree
+
+try:
+    from feedparser.datetimes import _parse_date as parse_date
+    from feedparser.sanitizer import _sanitize_html as sanitize_html
+except ImportError:  # feedparser 5
+    from feedparser import _parse_date as parse_date
+    from feedparser import _sanitizeHTML as sanitize_html
+
+MARKUP = re.compile(r"[<>&]")
+ENTRY_TAGS = ("item", "entry")
+CONTAINER_TAGS = ("channel", "feed")
+FEED_TAGS = {
+    "title": "title",
+    "ttl": "ttl",
+    "lastBuildDate": "modified",
+    "updated": "modified",
+    "description": "description",
+    "subtitle": "description",
+}
+
+
+def localname(element: etree._Element) -> str:
+    return etree.QName(element).localname
+
+
+def text(element: etree._Element) -> str:
+    return "".join(element.itertext()).strip()
+
+
+def sanitize(html: str) -> str:
+    """Function responsible for removing unsafe markup, as feedparser does.
+    Plain text is returned as is, without going through the sanitizer.
+
+    Parameters
+    ----------
+    html: str
+
+    Returns
+    -------
+    str
+    """
+    if not MARKUP.search(html):
+        return html
+    return sanitize_html(html, "utf-8", "text/html")
+
+
+def inner_html(element: etree._Element) -> str:
+    """Function responsible for serializing the content of an Atom xhtml element,
+    without the `div` wrapping it
+
+    Parameters
+    ----------
+    element: etree._Element
+
+    Returns
+    -------
+    str with the html
+    """
+    nodes = list(element)
+    if len(nodes) == 1 and localname(nodes[0]) == "div":
+        element = nodes[0]
+    return (element.text or "") + "".join(
+        etree.tostring(node, encoding="unicode") for node in element
+    )
+
+
+def entry_from_element(element: etree._Element) -> Dict:
+    """Function responsible for building a feed entry from an RSS item or Atom entry,
+    with the same keys feedparser uses for the fields used in ingestion
+
+    Parameters
+    ----------
+    element: etree._Element
+        `item` or `entry` element
+
+    Returns
+    -------
+    Dict with `id`, `title`, `link`, `summary` and `published_parsed`
+    """
+    fields = {}
+    for child in element:
+        if not isinstance(child.tag, str):
+            continue
+        name = localname(child)
+        if name == "link":
+            rel = child.get("rel", "alternate")
+            href = child.get("href")
+            if href and rel == "alternate":
+                fields.setdefault("link", href)
+            elif not href and child.text:
+                fields.setdefault("link", child.text.strip())
+        elif name in ("content", "encoded") and child.get("type") == "xhtml":
+            fields.setdefault("content", inner_html(child))
+        elif name in ("content", "encoded"):
+            fields.setdefault("content", child.text or "")
+        else:
+            fields.setdefault(name, child.text or "")
+
+    summary = fields.get(
+        "description", fields.get("summary", fields.get("content", ""))
+    )
+    # Like feedparser, `date` and `updated` are not publication dates
+    published = fields.get("pubDate") or fields.get("published") or fields.get("issued")
+    return {
+        "id": (fields.get("guid") or fields.get("id") or "").strip() or None,
+        "title": fields.get("title", "").strip(),
+        "link": fields.get("link", ""),
+        "summary": sanitize(summary.strip()),
+        "published_parsed": parse_date(published.strip()) if published else None,
+    }
+
+
+class StreamingFeedParser:
+    """Incremental parser of RSS and Atom documents.
+    Entries are yielded as they are read and dropped from the tree after,
+    so memory does not grow with the size of the document.
+
+    """
+
+    def __init__(self, chunk_size: Optional[int] = None):
+        self.chunk_size = chunk_size or settings.FEED_STREAMING_CHUNK_SIZE
+        self.feed = {}
+        self.size = 0
+        self.root = None
+
+    def iter_entries(self, stream: BinaryIO) -> Iterator[Dict]:
+        """Function responsible for parsing the entries of a document
+
+        Parameters
+        ----------
+        stream: BinaryIO
+            File-like object with the document
+
+        Returns
+        -------
+        Iterator of entries, see `entry_from_element`.
+        The feed fields are in `feed`, the bytes read in `size`
+        and the name of the root element in `root` once the iterator is exhausted
+        """
+        reader = ChunkedReader(stream, self.chunk_size)
+        events = etree.iterparse(
+            reader,
+            events=("end",),
+            huge_tree=True,
+            resolve_entities=False,
+            no_network=True,
+        )
+        for _, element in events:
+            if not isinstance(element.tag, str):
+                continue
+            name = localname(element)
+            parent = element.getparent()
+            if name in ENTRY_TAGS:
+                yield entry_from_element(element)
+            elif parent is not None and localname(parent) in CONTAINER_TAGS:
+                if name == "link" and element.get("href"):
+                    # Atom links of the feed, the WebSub hub among them
+                    self.feed.setdefault("links", []).append(
+                        {
+                            "rel": element.get("rel", "alternate"),
+                            "href": element.get("href"),
+                        }
+                    )
+                elif name in FEED_TAGS and FEED_TAGS[name] not in self.feed:
+                    self.feed[FEED_TAGS[name]] = text(element)
+            else:
+                continue
+            # Drop what was already read, only the open elements are kept
+            element.clear()
+            while element.getprevious() is not None:
+                del parent[0]
+
+        self.size = reader.size
+        self.root = etree.QName(events.root)
+        if "modified" in self.feed:
+            self.feed["modified_parsed"] = parse_date(self.feed["modified"])
+
+
+class ChunkedReader:
+    """File-like wrapper reading at most `chunk_size` bytes at a time,
+    counting the bytes read
+
+    """
+
+    def __init__(self, stream: BinaryIO, chunk_size: int):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self.chunk_size:
+            size = self.chunk_size
+        data = self.stream.read(size)
+        self.size += len(data)
+        return data
@@ -1,28 +1,66 @@
+import base64
+import logging
 from datetime import datetime
-from time import mktime
+from email.utils import parsedate_to_datetime
+from time import mktime, monotonic
+from typing import Dict, Iterable, List, Optional, Union
+from uuid import uuid4
 
 import dramatiq
-import feedparser
 from django.conf import settings
+from django.db import transaction
+from django.utils.timezone import now
+from lxml import etree
 
+from app.breaker import CircuitBreaker, host, is_transient, retry_after, should_retry
+from app.canonical import FeedUrlCache, canonical_url, find_feed
 from app.exceptions import (
+    FetchFeedError,
     FollowFeedError,
     ParseEntriesError,
     ParseFeedError,
+    RetryFeedError,
+    SubscribeFeedError,
     UpdateFeedError,
 )
-from app.models import Item, Notification
+from app.fetch import (
+    FeedFetcher,
+    FetchResult,
+    FetchStats,
+    cache_max_age,
+    conditional_headers,
+    get_http_client,
+)
+from app.item_state import reconcile_counters
+from app.jobs import RefreshJob
+from app.models import HubSubscription, Item, Notification
 from app.models.feed import Feed
 from app.models.user_follow_feed import UserFollowFeed
+from app.parsers import FeedparserParser, ParsedDocument, parse_document, submit_parse
+from app.singleflight import FeedRefreshFlight
+from app.snapshots import take_snapshots
+from app.store import ContentStore
+from app.streaming import StreamingFeedParser
+from app.websub import create_subscription, request_subscription
 
 MAX_RETRIES = settings.DRAMATIQ_MAX_RETRIES
 
+logger = logging.getLogger(__name__)
 
-@dramatiq.actor(max_retries=MAX_RETRIES)
+
+@dramatiq.actor(max_retries=MAX_RETRIES, queue_name=settings.ADD_FEED_QUEUE)
 def parse_feed(url: str, alias: str, user_id: int) -> None:
     """Task responsible for parse the feed url.
     Check if that feed is already created in database, if not, create.
     Call `dramatiq.actor` task follow_feed and parse_entries.
+    The parsed entries are kept in the `ContentStore`, so parse_entries
+    does not need to fetch the url again.
+    The url is fetched with the `HttpClient` of the worker process, and parsed
+    by `parse_document`.
+    Feeds are identified by the canonical url they are fetched from, after
+    redirects, and known feeds are found by `find_feed` without fetching them.
+    Runs on `ADD_FEED_QUEUE`, with the tasks it sends, as a user is waiting.
+    New feeds advertising a WebSub hub are subscribed to it, see `subscribe_feed`.
 
     Parameters
     ----------
@@ -39,31 +77,49 @@ def parse_feed(url: str, alias: str, user_id: int) -> None:
 
     """
     try:
-        parsed = feedparser.parse(url)
+        feed_id = find_feed(url)
+        if feed_id is not None:
+            follow_feed.send(feed_id, user_id)
+            return
+
+        result = _fetch(url)
+        parsed = parse_document(result.body, result.headers)
         parsed_feed = parsed.feed
         feed_dict = {
-            "link": parsed.href,
-            "description": getattr(parsed, "description", None),
-            "ttl": getattr(parsed_feed, "ttl", 0),
-            "etag": getattr(parsed, "etag", None),
+            "title": parsed_feed["title"],
+            "link": result.url,
+            "description": parsed_feed.get("description"),
+            "ttl": parsed_feed.get("ttl") or 0,
+            "etag": result.headers.get("etag"),
             "last_build_date": datetime.fromtimestamp(
-                mktime(parsed_feed.modified_parsed)
+                mktime(parsed_feed["modified_parsed"])
             ),
         }
+        # The unique canonical url makes concurrent creations of a feed get
+        # the same row
         feed_object, created = Feed.objects.get_or_create(
-            title=parsed_feed.title, defaults=feed_dict
+            canonical_url=canonical_url(result.url), defaults=feed_dict
         )
+        FeedUrlCache().set([url, result.url], feed_object.id)
 
         follow_feed.send(feed_object.id, user_id)
         if created:
-            parse_entries.send(url, feed_object.id)
+            fetch_id = uuid4().hex
+            ContentStore().put(url, fetch_id, parsed.entries)
+            parse_entries.send(url, feed_object.id, fetch_id)
+            subscription = create_subscription(
+                feed_object, result.headers, parsed_feed.get("links") or []
+            )
+            if subscription is not None:
+                subscribe_feed.send(subscription.id)
     except Exception as e:
         raise ParseFeedError from e
 
 
-@dramatiq.actor(max_retries=MAX_RETRIES)
+@dramatiq.actor(max_retries=MAX_RETRIES, queue_name=settings.ADD_FEED_QUEUE)
 def follow_feed(feed_id: int, user_id: int) -> None:
-    """Task responsible for creating a UserFollowFeed register in database
+    """Task responsible for creating a UserFollowFeed register in database, or
+    enabling it again if the user had unfollowed the feed
 
     Parameters
     ----------
@@ -76,14 +132,16 @@ def follow_feed(feed_id: int, user_id: int) -> None:
 
     """
     try:
-        UserFollowFeed.objects.create(feed_id=feed_id, user_id=user_id)
+        UserFollowFeed.objects.follow(user_id, feed_id)
     except Exception as e:
         raise FollowFeedError from e
 
 
-@dramatiq.actor(max_retries=MAX_RETRIES)
-def parse_entries(url: str, feed_id: int) -> None:
+@dramatiq.actor(max_retries=MAX_RETRIES, queue_name=settings.ADD_FEED_QUEUE)
+def parse_entries(url: str, feed_id: int, fetch_id: str = None) -> None:
     """Task responsible to parse entries from the url feed.
+    Use the entries stored by the fetch `fetch_id` when available,
+    only fetching the url again if they are missing or expired.
     Call `bulk_entries_create` to create in the dabatase
 
     Parameters
@@ -92,22 +150,230 @@ def parse_entries(url: str, feed_id: int) -> None:
         Url feed to get entries
     feed_id: int
         Feed id
+    fetch_id: str
+        Id of the fetch whose entries are in the `ContentStore`, optional.
     Returns
     -------
 
     """
     try:
-        parsed_entries = feedparser.parse(url)
-        parsed_entries = parsed_entries.entries
+        parsed_entries = None
+        if fetch_id:
+            parsed_entries = ContentStore().pop(url, fetch_id)
+        if parsed_entries is None:
+            result = _fetch(url)
+            parsed_entries = parse_document(result.body, result.headers).entries
         Item.objects.bulk_entries_create(feed_id, parsed_entries)
     except Exception as e:
         raise ParseEntriesError from e
 
 
 @dramatiq.actor(max_retries=MAX_RETRIES)
+def subscribe_feed(subscription_id: int) -> None:
+    """Task responsible for asking the hub of a feed to subscribe it,
+    for a new subscription or to renew its lease
+
+    Parameters
+    ----------
+    subscription_id: int
+        HubSubscription id
+    Returns
+    -------
+
+    Error
+    -----
+        SubscribeFeedError if the hub did not accept the request.
+    """
+    subscription = HubSubscription.objects.get(id=subscription_id)
+    result = request_subscription(subscription)
+    if result.error:
+        raise SubscribeFeedError(f"{subscription.hub}: {result.error}")
+
+
+@dramatiq.actor(max_retries=MAX_RETRIES)
+def ingest_push(feed_id: int, body: str, content_type: str = None) -> None:
+    """Task responsible to create the items of a document pushed by the hub
+    of a feed, as `update_feed` does with a fetched one
+
+    Parameters
+    ----------
+    feed_id: int
+        Feed id
+    body: str
+        Document, base64 encoded as messages are JSON
+    content_type: str
+        `Content-Type` of the document, optional.
+    Returns
+    -------
+
+    """
+    try:
+        headers = {"content-type": content_type} if content_type else {}
+        parsed = parse_document(base64.b64decode(body), headers)
+        Item.objects.bulk_entries_create(feed_id, parsed.entries)
+        Feed.objects.filter(id=feed_id).update(fetched_at=now())
+    except Exception as e:
+        raise ParseEntriesError from e
+
+
+def _fetch(url: str) -> FetchResult:
+    """Function responsible for fetching a feed url with the `HttpClient`
+    of the worker process
+
+    Parameters
+    ----------
+    url: str
+        Feed url
+    Returns
+    -------
+    FetchResult
+
+    Error
+    -----
+        UpdateFeedError if the fetch failed.
+    """
+    result = get_http_client().get(url)
+    if result.error:
+        raise UpdateFeedError(result.error)
+    return result
+
+
+def _notify_not_updated(feed_id: int, user_ids: Iterable[int]) -> None:
+    """Function responsible for notifying the users that a feed was not updated.
+    The Notification is created only once per user.
+
+    Parameters
+    ----------
+    feed_id: int
+        Feed id
+    user_ids: Iterable[int]
+        Ids of the users to notify
+    Returns
+    -------
+
+    """
+    for user_id in user_ids:
+        Notification.objects.get_or_create(
+            user_id=user_id,
+            content=f"Feed {feed_id} was not updated, try again latter",
+            defaults={"read": False},
+        )
+
+
+def _ingest_stream(
+    feed_id: int, result: FetchResult
+) -> Union[StreamingFeedParser, ParsedDocument]:
+    """Function responsible for creating the items of a large document, written
+    as they are parsed with bounded memory. Documents that are not well-formed
+    are parsed again by feedparser, as a whole, like the smaller ones.
+
+    Parameters
+    ----------
+    feed_id: int
+        Feed id
+    result: FetchResult
+        Fetch of the document, with its body in `stream`
+
+    Returns
+    -------
+    StreamingFeedParser or ParsedDocument, with the `feed` fields of the document
+    """
+    parsed = StreamingFeedParser()
+    try:
+        # The items written before the error are rolled back
+        with transaction.atomic():
+            Item.objects.bulk_entries_create(
+                feed_id, parsed.iter_entries(result.stream)
+            )
+        return parsed
+    except etree.XMLSyntaxError:
+        logger.info("Feed %s is not well-formed, parsed by feedparser", feed_id)
+    result.stream.seek(0)
+    document = FeedparserParser().parse(result.stream.read(), result.headers)
+    Item.objects.bulk_entries_create(feed_id, document.entries)
+    return document
+
+
+def _update_feed(feed_id: int) -> bool:
+    """Function responsible for fetching a feed and creating its new items.
+    Large documents are downloaded to a temporary file and parsed incrementally,
+    with bounded memory, and written in batches of `ITEM_BATCH_SIZE`.
+    The body is archived, see `take_snapshots`, and not parsed when it is the same
+    as the last one parsed. Failures are counted by the `CircuitBreaker`.
+
+    Parameters
+    ----------
+    feed_id: int
+        Feed id
+    Returns
+    -------
+    bool, False if the feed or its host is quarantined and it was not fetched
+    """
+    feed = Feed.objects.get(id=feed_id)
+    breaker = CircuitBreaker()
+    if not breaker.allowed([feed]):
+        logger.info("Feed %s is quarantined", feed_id)
+        return False
+
+    result = get_http_client().get(
+        feed.link, conditional_headers(feed), size_hint=feed.content_length
+    )
+    result.feed_id = feed.id
+    try:
+        digest = take_snapshots([result], now()).get(feed.id)
+        if result.error:
+            raise FetchFeedError(
+                result.error, result.status, retry_after(result.headers)
+            )
+        if result.not_modified or digest == feed.content_digest:
+            parsed = None
+        elif result.stream is not None:
+            parsed = _ingest_stream(feed_id, result)
+        else:
+            parsed = parse_document(result.body, result.headers)
+            Item.objects.bulk_entries_create(feed_id, parsed.entries)
+    except Exception as e:
+        feed.save(update_fields=breaker.failed(feed, e))
+        raise
+    finally:
+        if result.stream is not None:
+            result.stream.close()
+
+    breaker.hosts_succeeded([host(feed)])
+    feed.fetched_at = now()
+    update_fields = ["fetched_at"] + breaker.succeeded(feed)
+    if parsed is not None:
+        feed.etag = result.headers.get("etag")
+        feed.last_build_date = (
+            _last_build_date(parsed.feed, result.headers) or feed.last_build_date
+        )
+        feed.content_length = result.size
+        feed.content_digest = digest
+        update_fields += ["last_build_date", "etag", "content_length", "content_digest"]
+    elif not result.not_modified:
+        # Same body as the last one parsed, its validators may have changed
+        feed.etag = result.headers.get("etag")
+        update_fields.append("etag")
+    feed.save(update_fields=update_fields)
+    return True
+
+
+def _retry_update(retries: int, exception: BaseException) -> bool:
+    return isinstance(exception, RetryFeedError) and retries < MAX_RETRIES
+
+
+@dramatiq.actor(
+    max_retries=MAX_RETRIES,
+    retry_when=_retry_update,
+    min_backoff=settings.FEED_RETRY_BACKOFF * 1000,
+    max_backoff=settings.FEED_RETRY_MAX_BACKOFF * 1000,
+)
 def update_feed(feed_id: int, user_id: int) -> None:
     """Task responsible to check and update a feed if necessary.
-    Call `bulk_entries_create` if has new item to create
+    Call `bulk_entries_create` if has new item to create.
+    Concurrent updates of the same feed are coalesced by `FeedRefreshFlight`,
+    only one of them fetches the feed and the others wait on its result.
+    Quarantined feeds are not fetched, see `CircuitBreaker`.
 
     Parameters
     ----------
@@ -120,34 +386,262 @@ def update_feed(feed_id: int, user_id: int) -> None:
 
     Error
     -----
-        If an error is triggered a Notification is created only once.
+        If an error is triggered a Notification is created only once,
+        for the user and for every user waiting on the update.
+        Transient errors raise `RetryFeedError` and are retried with exponential
+        backoff, or after the `Retry-After` of the response. Missing feeds and
+        documents that can not be parsed are not retried.
     """
+    flight = FeedRefreshFlight(feed_id)
+    if not flight.begin(user_id):
+        return
     try:
-        feed = Feed.objects.get(id=feed_id)
+        updated = _update_feed(feed_id)
+    except Exception as e:
+        waiters = flight.finish(succeeded=False)
+        _notify_not_updated(feed_id, {user_id} | waiters)
+        delay = getattr(e, "retry_after", None)
+        if should_retry(e) and (delay or 0) <= settings.FEED_RETRY_MAX_BACKOFF:
+            raise RetryFeedError(str(e), delay * 1000 if delay else None) from e
+        raise UpdateFeedError from e
+    waiters = flight.finish(succeeded=updated)
+    if not updated:
+        _notify_not_updated(feed_id, {user_id} | waiters)
+
+
+def _last_build_date(feed: Dict, headers: Dict[str, str]) -> Optional[datetime]:
+    """Function responsible for getting the last build date of a fetched feed.
+    Use the date in the document, falling back to the `Last-Modified` header
+
+    Parameters
+    ----------
+    feed: Dict
+        Feed fields of the parsed document
+    headers: Dict[str, str]
+        Response headers, with lower case names
+
+    Returns
+    -------
+    datetime, or None if neither is available
+    """
+    modified_parsed = feed.get("modified_parsed")
+    if modified_parsed:
+        return datetime.fromtimestamp(mktime(modified_parsed))
+    last_modified = headers.get("last-modified")
+    if last_modified:
+        return parsedate_to_datetime(last_modified)
+    return None
+
+
+def _insert_entries(entries_by_feed: Dict[int, List]) -> Dict[int, Exception]:
+    """Function responsible for creating the items of many feeds with combined
+    bulk inserts. If they fail the feeds are written one by one, so only the
+    feeds at fault fail.
+
+    Parameters
+    ----------
+    entries_by_feed: Dict[int, List]
+        Parsed entries, by feed id
+    Returns
+    -------
+    Dict of feed id to the error of the feeds whose items were not created
+    """
+    try:
+        with transaction.atomic():
+            Item.objects.bulk_feeds_entries_create(entries_by_feed)
+        return {}
+    except Exception:
+        logger.warning("Combined insert failed, writing feeds one by one")
+    errors = {}
+    for feed_id, entries in entries_by_feed.items():
+        try:
+            with transaction.atomic():
+                Item.objects.bulk_entries_create(feed_id, entries)
+        except Exception as e:
+            logger.exception("Feed %s was not updated", feed_id)
+            errors[feed_id] = e
+    return errors
+
 
-        if feed.etag:
-            parsed_feed = feedparser.parse(feed.link, etag=feed.etag)
+def refresh_feeds(
+    feed_ids: List[int], fetcher: FeedFetcher = None, user_id: int = None
+) -> FetchStats:
+    """Function responsible for fetching a batch of feeds concurrently
+    and creating the items of the ones that changed.
+    The feeds are loaded with one query, their items created with combined
+    bulk inserts, see `_insert_entries`, and their fields saved with one
+    bulk update. A failing feed is logged and reported in `FetchStats.errors`,
+    and does not stop the rest of the batch.
+    Feeds being refreshed elsewhere, or refreshed moments ago, are coalesced
+    with that refresh instead of being fetched again, and quarantined feeds
+    are skipped, see `CircuitBreaker`. The bodies are archived, see
+    `take_snapshots`, and the ones that are the same as the last one parsed
+    are not parsed.
+
+    Parameters
+    ----------
+    feed_ids: List[int]
+        Feed ids
+    fetcher: FeedFetcher
+        Fetcher to use, optional.
+    user_id: int
+        Id of the user waiting on the coalesced refreshes, optional.
+    Returns
+    -------
+    FetchStats of the batch
+    """
+    fetcher = fetcher or FeedFetcher()
+    stats = FetchStats()
+    flights = {}
+    for feed_id in feed_ids:
+        flight = FeedRefreshFlight(feed_id)
+        if flight.begin(user_id):
+            flights[feed_id] = flight
         else:
-            parsed_feed = feedparser.parse(
-                feed.link,
-                modified=feed.last_build_date.strftime(settings.TASKS_DATE_FORMAT),
+            stats.coalesced += 1
+    breaker = CircuitBreaker()
+    candidates = list(Feed.objects.filter(id__in=flights))
+    feeds = {feed.id: feed for feed in breaker.allowed(candidates)}
+    stats.quarantined = len(candidates) - len(feeds)
+    start = monotonic()
+
+    results = fetcher.run(feeds.values())
+    digests = take_snapshots(results, now())
+    # Bodies identical to the last one parsed are not parsed again
+    unchanged = {
+        feed_id
+        for feed_id, digest in digests.items()
+        if digest == feeds[feed_id].content_digest
+    }
+    # Changed documents are all submitted at once, to be parsed in parallel
+    # when `FEED_PARSE_PROCESSES` is set
+    parses = {
+        result.feed_id: submit_parse(result.body, result.headers)
+        for result in results
+        if not result.error
+        and not result.not_modified
+        and result.feed_id not in unchanged
+        and result.stream is None
+    }
+
+    parsed_documents, entries, errors = {}, {}, {}
+    for result in results:
+        stats.add(result)
+        try:
+            if result.error:
+                raise FetchFeedError(
+                    result.error, result.status, retry_after(result.headers)
+                )
+            if result.not_modified or result.feed_id in unchanged:
+                parsed_documents[result.feed_id] = None
+            elif result.stream is not None:
+                parsed_documents[result.feed_id] = _ingest_stream(
+                    result.feed_id, result
+                )
+            else:
+                parsed = parses[result.feed_id].result()
+                entries[result.feed_id] = parsed.entries
+                parsed_documents[result.feed_id] = parsed
+        except Exception as e:
+            logger.exception("Feed %s was not updated", result.feed_id)
+            errors[result.feed_id] = e
+        finally:
+            if result.stream is not None:
+                result.stream.close()
+    errors.update(_insert_entries(entries))
+
+    update_fields = set()
+    for result in results:
+        feed = feeds[result.feed_id]
+        if result.feed_id in errors:
+            update_fields.update(breaker.failed(feed, errors[result.feed_id]))
+            continue
+        feed.fetched_at = now()
+        feed.cache_max_age = cache_max_age(result.headers)
+        update_fields.update(["fetched_at", "cache_max_age"] + breaker.succeeded(feed))
+        parsed = parsed_documents[result.feed_id]
+        if parsed is not None:
+            feed.etag = result.headers.get("etag")
+            feed.last_build_date = (
+                _last_build_date(parsed.feed, result.headers) or feed.last_build_date
             )
-        if parsed_feed.status == 304:
-            return
+            feed.content_length = result.size
+            feed.content_digest = digests[result.feed_id]
+            update_fields.update(
+                ["last_build_date", "etag", "content_length", "content_digest"]
+            )
+        elif result.feed_id in unchanged:
+            feed.etag = result.headers.get("etag")
+            update_fields.add("etag")
+    if update_fields:
+        Feed.objects.bulk_update(feeds.values(), sorted(update_fields))
 
-        feed.etag = getattr(parsed_feed, "etag", None)
-        feed.last_build_date = datetime.fromtimestamp(
-            mktime(parsed_feed.feed.modified_parsed)
-        )
-        feed.save(update_fields=["last_build_date", "etag"])
+    for result in results:
+        succeeded = result.feed_id not in errors
+        if not succeeded:
+            stats.failed.append(result.feed_id)
+            stats.errors[result.feed_id] = str(errors[result.feed_id])
+        waiters = flights.pop(result.feed_id).finish(succeeded)
+        if not succeeded:
+            _notify_not_updated(result.feed_id, waiters)
 
-        parsed_entries = parsed_feed.entries
+    # Hosts that answered
+    breaker.hosts_succeeded(
+        host(feeds[result.feed_id])
+        for result in results
+        if result.status is not None and not is_transient(result.status)
+    )
+    # Feeds that no longer exist or are quarantined
+    for flight in flights.values():
+        flight.finish(succeeded=False)
 
-        Item.objects.bulk_entries_create(feed_id, parsed_entries)
-    except Exception as e:
-        Notification.objects.get_or_create(
-            user_id=user_id,
-            content=f"Feed {feed_id} was not updated, try again latter",
-            defaults={"read": False},
+    stats.elapsed = monotonic() - start
+    return stats
+
+
+@dramatiq.actor(max_retries=MAX_RETRIES)
+def update_feeds_batch(
+    feed_ids: List[int], user_id: int = None, job_id: str = None
+) -> None:
+    """Task responsible to update many feeds with a single message.
+    The feeds are fetched concurrently by `FeedFetcher` and written together,
+    see `refresh_feeds`
+
+    Parameters
+    ----------
+    feed_ids: List[int]
+        Feed ids
+    user_id: int
+        Id of the user to notify about the feeds that failed, optional.
+    job_id: str
+        Id of the `RefreshJob` to report the progress, optional.
+    Returns
+    -------
+
+    """
+    stats = refresh_feeds(feed_ids, user_id=user_id)
+    for feed_id, error in stats.errors.items():
+        logger.warning("Feed %s was not updated: %s", feed_id, error)
+    if user_id:
+        for feed_id in stats.failed:
+            _notify_not_updated(feed_id, [user_id])
+    if job_id:
+        RefreshJob(job_id).add(
+            done=len(feed_ids) - len(stats.failed), failed=len(stats.failed)
         )
-        raise UpdateFeedError from e
+
+
+@dramatiq.actor(max_retries=MAX_RETRIES)
+def reconcile_unread_counters() -> None:
+    """Task responsible to repair the unread counters that drifted, sent by the
+    scheduler every `UNREAD_RECONCILE_INTERVAL` seconds, see
+    `app.item_state.reconcile_counters`
+
+    Returns
+    -------
+
+    """
+    repaired, created = reconcile_counters()
+    if repaired:
+        logger.warning("Repaired %s unread counters", repaired)
+    logger.info("Created %s unread counters", created)
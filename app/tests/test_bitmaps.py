@@ -0,0 +1,58 @@
+import random
+
+import pytest
+
+from app.bitmaps import ARRAY_LIMIT, RoaringBitmap
+
+
+@pytest.mark.parametrize(
+    "count, spread", [(100, 1 << 20), (20_000, 1 << 16), (3000, 1 << 34)]
+)
+def test_bitmap_matches_set(count, spread):
+    generator = random.Random(count)
+    values = {generator.randrange(spread) for _ in range(count)}
+    bitmap = RoaringBitmap(values)
+    assert len(bitmap) == len(values)
+    assert list(bitmap) == sorted(values)
+    assert all(value in bitmap for value in values)
+    assert not any(value in bitmap for value in range(spread, spread + 100))
+
+    removed = set(generator.sample(sorted(values), len(values) // 2))
+    for value in removed:
+        bitmap.discard(value)
+    bitmap.discard(spread + 1)
+    assert list(bitmap) == sorted(values - removed)
+
+
+def test_bitmap_containers():
+    bitmap = RoaringBitmap(range(ARRAY_LIMIT))
+    assert len(bitmap.containers) == 1
+    assert len(bitmap.serialize()) < ARRAY_LIMIT * 2 + 16
+
+    bitmap.add(ARRAY_LIMIT)
+    assert isinstance(bitmap.containers[0], int)
+    assert len(bitmap.serialize()) == 8192 + 7
+
+    bitmap.discard(0)
+    assert not isinstance(bitmap.containers[0], int)
+    for value in range(1, ARRAY_LIMIT + 1):
+        bitmap.discard(value)
+    assert bitmap.containers == {}
+    assert bitmap.serialize() == b""
+
+
+def test_bitmap_operations():
+    first = RoaringBitmap(range(0, 10_000, 2))
+    second = RoaringBitmap(range(0, 100_000, 3))
+    assert list(first | second) == sorted(set(first) | set(second))
+    assert list(first & second) == sorted(set(first) & set(second))
+    assert list(first - second) == sorted(set(first) - set(second))
+    assert first - first == RoaringBitmap()
+
+
+def test_bitmap_serialize_round_trip():
+    bitmap = RoaringBitmap([1, 5, 70_000, 1 << 40] + list(range(200_000, 210_000)))
+    data = bitmap.serialize()
+    assert RoaringBitmap.deserialize(data) == bitmap
+    assert list(RoaringBitmap.deserialize(memoryview(data))) == list(bitmap)
+    assert RoaringBitmap.deserialize(None) == RoaringBitmap()
@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from django.utils.timezone import now
+
+from app.breaker import (
+    CircuitBreaker,
+    is_transient,
+    quarantine_seconds,
+    retry_after,
+    should_retry,
+)
+from app.exceptions import FetchFeedError, UnsupportedDocumentError
+from app.models import Feed
+
+
+def test_is_transient():
+    assert is_transient(None)
+    assert is_transient(503)
+    assert is_transient(429)
+    assert not is_transient(404)
+    assert not is_transient(410)
+
+
+def test_should_retry():
+    assert should_retry(FetchFeedError("timeout"))
+    assert should_retry(FetchFeedError("HTTP 502", 502))
+    assert not should_retry(FetchFeedError("HTTP 404", 404))
+    assert not should_retry(FetchFeedError("HTTP 410", 410))
+    assert not should_retry(UnsupportedDocumentError("Not a feed"))
+    assert should_retry(Exception("database is gone"))
+
+
+def test_retry_after():
+    at = datetime(2020, 7, 24, 15, 0, tzinfo=timezone.utc)
+    assert retry_after({"retry-after": "120"}) == 120
+    assert retry_after({"retry-after": "Fri, 24 Jul 2020 15:10:00 GMT"}, at) == 600
+    assert retry_after({"retry-after": "Fri, 24 Jul 2020 14:00:00 GMT"}, at) == 0
+    assert retry_after({"retry-after": "soon"}) is None
+    assert retry_after({}) is None
+
+
+def test_quarantine_seconds(settings):
+    settings.FEED_QUARANTINE_THRESHOLD = 3
+    settings.FEED_QUARANTINE_DURATION = 100
+    settings.FEED_QUARANTINE_MAX = 1000
+    assert quarantine_seconds(2) == 0
+    assert 75 <= quarantine_seconds(3) <= 100
+    assert 150 <= quarantine_seconds(4) <= 200
+    assert 750 <= quarantine_seconds(50) <= 1000
+
+
+def test_feed_is_quarantined_after_consecutive_failures(settings):
+    settings.FEED_QUARANTINE_THRESHOLD = 2
+    at = now()
+    breaker = CircuitBreaker()
+    feed = Feed(link="http://test.com/feed", failure_count=0)
+
+    assert breaker.failed(feed, FetchFeedError("HTTP 404", 404), at)
+    assert feed.failure_count == 1
+    assert feed.quarantined_until is None
+    assert breaker.allowed([feed], at) == [feed]
+
+    breaker.failed(feed, UnsupportedDocumentError("Not a feed"), at)
+    assert feed.failure_count == 2
+    assert feed.last_error == "Not a feed"
+    assert feed.quarantined_until > at
+    assert breaker.allowed([feed], at) == []
+    assert breaker.allowed([feed], feed.quarantined_until) == [feed]
+
+    assert breaker.succeeded(feed)
+    assert feed.failure_count == 0
+    assert feed.quarantined_until is None
+    assert breaker.succeeded(feed) == []
+
+
+def test_errors_not_caused_by_the_feed_are_not_counted():
+    feed = Feed(link="http://test.com/feed", failure_count=0)
+    assert CircuitBreaker().failed(feed, Exception("database is gone")) == []
+    assert feed.failure_count == 0
+
+
+def test_retry_after_is_honoured():
+    at = now()
+    feed = Feed(link="http://test.com/feed", failure_count=0)
+    CircuitBreaker().failed(feed, FetchFeedError("HTTP 503", 503, 600), at)
+    assert feed.quarantined_until == at + timedelta(seconds=600)
+
+
+@pytest.mark.parametrize("status, opens", [(None, True), (503, True), (404, False)])
+def test_host_opens_after_transient_failures(settings, status, opens):
+    settings.HOST_FAILURE_THRESHOLD = 3
+    breaker = CircuitBreaker()
+    feeds = [Feed(link=f"http://test.com/{i}", failure_count=0) for i in range(3)]
+    other = Feed(link="http://other.com/feed", failure_count=0)
+
+    for feed in feeds:
+        breaker.failed(feed, FetchFeedError("failed", status))
+
+    allowed = breaker.allowed(feeds + [other])
+    assert allowed == ([other] if opens else feeds + [other])
+
+
+def test_host_failures_are_reset_when_it_answers(settings):
+    settings.HOST_FAILURE_THRESHOLD = 2
+    breaker = CircuitBreaker()
+    feed = Feed(link="http://test.com/feed", failure_count=0)
+
+    breaker.failed(feed, FetchFeedError("timeout"))
+    breaker.hosts_succeeded(["test.com"])
+    breaker.failed(feed, FetchFeedError("timeout"))
+
+    assert breaker.open_hosts(["test.com"]) == set()
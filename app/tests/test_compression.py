@@ -0,0 +1,83 @@
+from io import StringIO
+from unittest import mock
+
+import pytest
+import zstandard
+from django.core.management import call_command
+from model_bakery import baker
+
+from app.compression import ZSTD_MAGIC, compress, decompress, train_dictionary
+from app.fields import CompressedText
+from app.models import CompressionDictionary, Item
+
+
+def description(number: int) -> str:
+    return (
+        f'<div class="post"><h2>Post number {number}</h2>'
+        f'<p>Published in <a href="http://test.com/category/{number % 7}">category '
+        f"{number % 7}</a> by author {number % 13}.</p><p>{'Lorem ipsum ' * 10}"
+        f"and {number * 31} more words.</p></div>"
+    )
+
+
+def test_compress_short_text_stored_as_is():
+    assert compress("Short") == b"Short"
+    assert decompress(b"Short") == "Short"
+    assert decompress(compress("")) == ""
+
+
+@pytest.mark.django_db
+def test_compress_round_trip():
+    text = "Ünïcödé " + description(1)
+    stored = compress(text)
+    assert stored.startswith(ZSTD_MAGIC)
+    assert len(stored) < len(text.encode())
+    assert decompress(stored) == text
+
+
+@pytest.mark.django_db
+def test_item_description_decompressed_when_read():
+    text = description(1)
+    baker.make(Item, description=text)
+    stored = Item.objects.values_list("description", flat=True).get()
+    assert isinstance(stored, CompressedText)
+    assert stored.startswith(ZSTD_MAGIC)
+
+    item = Item.objects.get()
+    with mock.patch("app.fields.decompress", wraps=decompress) as decompress_mock:
+        assert item.title
+        decompress_mock.assert_not_called()
+        assert item.description == text
+        assert item.description == text
+    decompress_mock.assert_called_once()
+
+
+@pytest.mark.django_db
+def test_train_dictionary_keeps_older_dictionaries():
+    first = train_dictionary([description(number) for number in range(300)], 4096)
+    stored = compress(description(1000))
+    assert zstandard.get_frame_parameters(stored).dict_id == first.dict_id
+
+    train_dictionary([description(number) for number in range(300, 600)], 4096)
+    assert decompress(stored) == description(1000)
+
+
+@pytest.mark.django_db
+def test_train_compression_dictionary_command():
+    baker.make(
+        Item,
+        description=iter(description(number) for number in range(300)),
+        _quantity=300,
+    )
+    out = StringIO()
+    call_command(
+        "train_compression_dictionary", "--size", "4096", "--recompress", stdout=out,
+    )
+
+    dictionary = CompressionDictionary.objects.get()
+    assert dictionary.samples == 300
+    stored = Item.objects.values_list("description", flat=True).first()
+    assert zstandard.get_frame_parameters(stored).dict_id == dictionary.dict_id
+    for number, item in enumerate(Item.objects.order_by("id")):
+        assert item.description == description(number)
+    assert "Compressed 300 descriptions again" in out.getvalue()
@@ -0,0 +1,28 @@
+from app.excerpts import html_excerpt, text_preview
+
+
+def test_text_preview():
+    html = "<p>Hello <b>world</b> &amp;\n more</p><p>Second</p><script></script>"
+    assert text_preview(html) == "Hello world & more Second"
+    assert text_preview("plain") == "plain"
+    assert text_preview("") == ""
+    assert text_preview("word " * 100, length=20) == "word word word word…"
+
+
+def test_html_excerpt_short_description():
+    assert html_excerpt("<p>Short</p>", length=100) == ("<p>Short</p>", False)
+
+
+def test_html_excerpt_closes_tags():
+    html = "<p>Hello <b>" + "world " * 100 + "</b></p>"
+    excerpt, truncated = html_excerpt(html, length=20)
+    assert excerpt == "<p>Hello <b>world world w…</b></p>"
+    assert truncated
+
+
+def test_html_excerpt_markup_over_max_size(settings):
+    settings.ITEM_EXCERPT_MAX_SIZE = 100
+    html = ('<p><a href="http://test.com/' + "a" * 200 + '">link</a> & text</p>') * 10
+    excerpt, truncated = html_excerpt(html, length=20)
+    assert excerpt == "link &amp; text link &amp; …"
+    assert truncated
@@ -0,0 +1,380 @@
+import zlib
+from datetime import datetime, timezone
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from model_bakery import baker
+from prometheus_client import REGISTRY
+
+from app.exceptions import ContentEncodingError
+from app.fetch import (
+    BodyDecoder,
+    FeedFetcher,
+    FetchResult,
+    FetchStats,
+    cache_max_age,
+    conditional_headers,
+    get_http_client,
+)
+from app.jobs import RefreshJob
+from app.models import Feed, Item, Notification
+from app.parsers import get_parse_pool
+from app.singleflight import FeedRefreshFlight
+from app.tasks import refresh_feeds, update_feeds_batch
+from app.tests.utils import rss_document
+
+
+def test_conditional_headers():
+    feed = Feed(etag="abc", last_build_date=datetime(2020, 7, 24, tzinfo=timezone.utc))
+    assert conditional_headers(feed) == {
+        "If-None-Match": "abc",
+        "If-Modified-Since": "Fri, 24 Jul 2020 00:00:00 GMT",
+    }
+
+
+def test_conditional_headers_without_etag():
+    feed = Feed(etag=None, last_build_date=datetime(2020, 7, 24, tzinfo=timezone.utc))
+    assert conditional_headers(feed) == {
+        "If-Modified-Since": "Fri, 24 Jul 2020 00:00:00 GMT"
+    }
+
+
+def test_cache_max_age():
+    assert cache_max_age({"cache-control": "public, max-age=600"}) == 600
+    assert cache_max_age({"cache-control": "no-cache"}) is None
+    assert (
+        cache_max_age(
+            {
+                "date": "Fri, 24 Jul 2020 15:00:00 GMT",
+                "expires": "Fri, 24 Jul 2020 16:00:00 GMT",
+            }
+        )
+        == 3600
+    )
+    assert cache_max_age({"expires": "0"}) is None
+    assert cache_max_age({}) is None
+
+
+def test_fetch_stats():
+    stats = FetchStats()
+    stats.add(
+        FetchResult(
+            feed_id=1, url="a", status=200, body=b"1234", wire_size=2, reused=True
+        )
+    )
+    stats.add(FetchResult(feed_id=2, url="b", status=304, reused=False))
+    stats.add(FetchResult(feed_id=3, url="c", error="timeout"))
+    stats.elapsed = 2
+
+    assert stats.feeds == 3
+    assert stats.bytes == 4
+    assert stats.wire_bytes == 2
+    assert stats.reused == 1
+    assert stats.statuses == {200: 1, 304: 1, "error": 1}
+    assert stats.feeds_per_second == 1.5
+
+
+def zlib_compress(data: bytes, wbits: int) -> bytes:
+    compressor = zlib.compressobj(wbits=wbits)
+    return compressor.compress(data) + compressor.flush()
+
+
+@pytest.mark.parametrize(
+    "encoding, compress",
+    [
+        ("gzip", lambda data: zlib_compress(data, wbits=31)),
+        ("deflate", zlib.compress),
+        ("deflate", lambda data: zlib_compress(data, wbits=-15)),
+        (None, bytes),
+        ("Identity", bytes),
+    ],
+)
+def test_body_decoder(encoding, compress):
+    body = rss_document("Test", 50)
+    data = compress(body)
+    decoder = BodyDecoder(encoding)
+    chunks = [decoder.decode(data[i : i + 100]) for i in range(0, len(data), 100)]
+    assert b"".join(chunks) + decoder.flush() == body
+
+
+def test_body_decoder_errors():
+    with pytest.raises(ContentEncodingError):
+        BodyDecoder("compress")
+    with pytest.raises(ContentEncodingError):
+        BodyDecoder("gzip").decode(b"not gzip")
+
+
+def test_http_client_compressed(feed_server):
+    url = feed_server.add_feed("/a", entries=50, encoding="gzip")
+    result = get_http_client().get(url)
+
+    assert result.ok
+    assert result.body == rss_document("/a", 50)
+    assert result.size == len(result.body)
+    assert result.wire_size < result.size
+    assert "gzip" in feed_server.requests[0][1]["Accept-Encoding"]
+
+
+def test_http_client_spools_compressed(feed_server, settings):
+    settings.FEED_STREAMING_THRESHOLD = 100
+    url = feed_server.add_feed("/a", entries=50, encoding="deflate")
+    result = get_http_client().get(url)
+
+    assert result.body == b""
+    assert result.stream.read() == rss_document("/a", 50)
+    assert result.wire_size < result.size
+    result.stream.close()
+
+
+def test_http_client_invalid_body(feed_server):
+    feed_server.feeds["/a"] = (200, None, b"not gzip", "gzip", {})
+    result = get_http_client().get(feed_server.url("/a"))
+    assert result.status == 200
+    assert "ContentEncodingError" in result.error
+
+
+def test_http_client_reuses_connections(feed_server):
+    url = feed_server.add_feed("/a")
+
+    def connections(kind):
+        labels = {"host": "127.0.0.1", "connection": kind}
+        return REGISTRY.get_sample_value("pyfeedrss_fetch_connections_total", labels)
+
+    client = get_http_client()
+    first = client.get(url)
+    reused_before = connections("reused")
+    second = client.get(url)
+
+    assert first.reused is False
+    assert second.reused is True
+    assert connections("reused") == reused_before + 1
+    assert get_http_client() is client
+    assert FeedFetcher().client is client
+    assert FeedFetcher(per_host=1).client is not client
+
+
+def test_fetcher_fetch_all(feed_server):
+    feeds = [
+        Feed(id=1, link=feed_server.add_feed("/a", etag="a1"), etag=None),
+        Feed(id=2, link=feed_server.add_feed("/b", etag="b1"), etag="b1"),
+        Feed(id=3, link=feed_server.url("/missing")),
+    ]
+    for feed in feeds:
+        feed.last_build_date = datetime(2020, 7, 24, tzinfo=timezone.utc)
+
+    results = FeedFetcher().run(feeds)
+
+    assert [result.feed_id for result in results] == [1, 2, 3]
+    assert results[0].ok and b"<rss" in results[0].body
+    assert results[0].headers["etag"] == "a1"
+    assert results[1].not_modified
+    assert results[2].error == "HTTP 404"
+    assert feed_server.requests[0][1]["If-Modified-Since"]
+
+
+def test_fetcher_connection_error():
+    feed = Feed(id=1, link="http://127.0.0.1:1/", etag=None, last_build_date=None)
+    result = FeedFetcher(timeout=2).run([feed])[0]
+    assert result.status is None
+    assert result.error
+
+
+def test_fetcher_per_host_limit(feed_server):
+    feed_server.delay = 0.1
+    feeds = [
+        Feed(id=i, link=feed_server.add_feed(f"/{i}"), etag=None, last_build_date=None)
+        for i in range(6)
+    ]
+    results = FeedFetcher(concurrency=10, per_host=2).run(feeds)
+    assert all(result.ok for result in results)
+    assert feed_server.max_active == 2
+
+
+@pytest.mark.django_db
+def test_refresh_feeds(feed_server):
+    feed = baker.make(Feed, link=feed_server.add_feed("/a", etag="new"), etag=None)
+    not_modified = baker.make(
+        Feed, link=feed_server.add_feed("/b", etag="same"), etag="same"
+    )
+    broken = baker.make(Feed, link=feed_server.url("/missing"), etag=None)
+
+    stats = refresh_feeds([feed.id, not_modified.id, broken.id])
+
+    assert stats.feeds == 3
+    assert stats.statuses == {200: 1, 304: 1, 404: 1}
+    assert stats.failed == [broken.id]
+    assert Feed.objects.get(id=feed.id).etag == "new"
+    assert Feed.objects.get(id=not_modified.id).fetched_at is not None
+    assert Feed.objects.get(id=broken.id).fetched_at is None
+    assert Item.objects.filter(feed=feed).count() == 3
+    assert Item.objects.filter(feed=not_modified).count() == 0
+
+
+@pytest.mark.django_db
+def test_refresh_feeds_skips_quarantined_feeds(feed_server, settings):
+    settings.FEED_QUARANTINE_THRESHOLD = 2
+    quarantined = baker.make(
+        Feed,
+        link=feed_server.add_feed("/a"),
+        quarantined_until=datetime(2100, 1, 1, tzinfo=timezone.utc),
+    )
+    recovered = baker.make(
+        Feed, link=feed_server.add_feed("/b"), etag=None, failure_count=1
+    )
+    broken = baker.make(
+        Feed, link=feed_server.url("/missing"), etag=None, failure_count=1
+    )
+
+    stats = refresh_feeds([quarantined.id, recovered.id, broken.id])
+
+    assert stats.quarantined == 1
+    assert stats.failed == [broken.id]
+    assert sorted(path for path, _ in feed_server.requests) == ["/b", "/missing"]
+    assert Feed.objects.get(id=recovered.id).failure_count == 0
+    broken.refresh_from_db()
+    assert broken.failure_count == 2
+    assert broken.quarantined_until is not None
+    assert refresh_feeds([broken.id]).quarantined == 1
+
+
+@pytest.mark.django_db
+def test_refresh_feeds_with_parse_pool(feed_server, settings):
+    settings.FEED_PARSE_PROCESSES = 2
+    get_parse_pool.cache_clear()
+    feeds = [
+        baker.make(Feed, link=feed_server.add_feed(f"/{i}", entries=5), etag=None)
+        for i in range(4)
+    ]
+    try:
+        stats = refresh_feeds([feed.id for feed in feeds])
+    finally:
+        get_parse_pool().shutdown()
+        get_parse_pool.cache_clear()
+
+    assert stats.failed == []
+    assert Item.objects.count() == 20
+
+
+@pytest.mark.django_db
+def test_refresh_feeds_does_not_duplicate_items(feed_server, settings):
+    settings.FEED_REFRESH_COALESCE_WINDOW = 0
+    feed = baker.make(Feed, link=feed_server.add_feed("/a", entries=50), etag=None)
+    refresh_feeds([feed.id])
+    refresh_feeds([feed.id])
+    assert Item.objects.filter(feed=feed).count() == 50
+
+
+@pytest.mark.django_db
+def test_refresh_feeds_coalesces_running_refreshes(feed_server):
+    user = baker.make(User)
+    running = baker.make(Feed, link=feed_server.add_feed("/a"), etag=None)
+    feed = baker.make(Feed, link=feed_server.add_feed("/b"), etag=None)
+    flight = FeedRefreshFlight(running.id)
+    flight.begin()
+
+    stats = refresh_feeds([running.id, feed.id], user_id=user.id)
+
+    assert stats.feeds == 1
+    assert stats.coalesced == 1
+    assert [path for path, _ in feed_server.requests] == ["/b"]
+    assert flight.finish(succeeded=False) == {user.id}
+    assert refresh_feeds([feed.id]).coalesced == 1
+
+
+@pytest.mark.django_db
+def test_refresh_feeds_notifies_waiters_of_failures(feed_server):
+    user = baker.make(User)
+    broken = baker.make(Feed, link=feed_server.url("/missing"), etag=None)
+
+    class JoiningFetcher(FeedFetcher):
+        def run(self, feeds):
+            FeedRefreshFlight(broken.id).begin(user.id)
+            return super().run(feeds)
+
+    stats = refresh_feeds([broken.id], fetcher=JoiningFetcher())
+
+    assert stats.failed == [broken.id]
+    assert Notification.objects.filter(user=user).count() == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_update_feeds_batch(feed_server, broker, worker):
+    feeds = [
+        baker.make(Feed, link=feed_server.add_feed(f"/{i}", entries=2), etag=None)
+        for i in range(3)
+    ]
+    update_feeds_batch.send([feed.id for feed in feeds])
+    broker.join(update_feeds_batch.queue_name)
+    worker.join()
+    assert Item.objects.count() == 6
+
+
+@pytest.mark.django_db(transaction=True)
+def test_update_feeds_batch_reports_progress(feed_server, broker, worker):
+    user = baker.make(User)
+    feed = baker.make(Feed, link=feed_server.add_feed("/a"), etag=None)
+    broken = baker.make(Feed, link=feed_server.url("/missing"), etag=None)
+    job = RefreshJob.create(user.id, total=2)
+
+    update_feeds_batch.send([feed.id, broken.id], user.id, job.job_id)
+    broker.join(update_feeds_batch.queue_name)
+    worker.join()
+
+    progress = job.progress()
+    assert progress["done"] == 1
+    assert progress["failed"] == 1
+    assert progress["finished"]
+    assert Notification.objects.filter(user=user).count() == 1
+
+
+@pytest.mark.django_db
+def test_refresh_feeds_command(feed_server, capsys):
+    baker.make(Feed, link=feed_server.add_feed("/a"), etag=None)
+    baker.make(Feed, link=feed_server.add_feed("/b"), etag=None)
+    call_command("refresh_feeds", "--batch-size", "1")
+    out = capsys.readouterr().out
+    assert "Refreshed 2 feeds" in out
+    assert "feeds/s" in out
+    assert "200: 2" in out
+    assert "Over the wire" in out
+
+
+@pytest.mark.django_db
+def test_refresh_feeds_reports_failures_per_feed(feed_server):
+    feed = baker.make(Feed, link=feed_server.add_feed("/a"), etag=None)
+    # Entries without a publication date can not be stored
+    body = rss_document("/b", 2).replace(b"<pubDate>", b"<date>")
+    body = body.replace(b"</pubDate>", b"</date>")
+    broken = baker.make(Feed, link=feed_server.add_feed("/b", body=body), etag=None)
+    missing = baker.make(Feed, link=feed_server.url("/missing"), etag=None)
+
+    stats = refresh_feeds([feed.id, broken.id, missing.id])
+
+    assert sorted(stats.failed) == sorted([broken.id, missing.id])
+    assert stats.errors[missing.id] == "HTTP 404"
+    assert broken.id in stats.errors
+    assert Item.objects.filter(feed=feed).count() == 3
+    assert Feed.objects.get(id=feed.id).fetched_at is not None
+    assert Feed.objects.get(id=broken.id).fetched_at is None
+    assert Feed.objects.get(id=missing.id).failure_count == 1
+
+
+@pytest.mark.django_db
+def test_refresh_feeds_queries_do_not_grow_with_feeds(feed_server, settings):
+    settings.SEEN_FILTER_ENABLED = False
+
+    def queries(count):
+        feeds = [
+            baker.make(
+                Feed, link=feed_server.add_feed(f"/{count}/{i}", entries=2), etag=None
+            )
+            for i in range(count)
+        ]
+        with CaptureQueriesContext(connection) as captured:
+            refresh_feeds([feed.id for feed in feeds])
+        return len(captured)
+
+    assert queries(2) == queries(8)
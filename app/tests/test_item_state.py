@@ -0,0 +1,172 @@
+import random
+from io import StringIO
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db.models import Count
+from django.shortcuts import resolve_url
+from django.utils.timezone import now
+from model_bakery import baker
+
+from app.bitmaps import RoaringBitmap
+from app.item_state import (
+    load_states,
+    load_unread_counts,
+    mark,
+    rebuild_states,
+    reconcile_counters,
+    reference_states,
+    unread_counts,
+)
+from app.models import (
+    Feed,
+    Item,
+    ItemStateBitmap,
+    UnreadCounter,
+    UserFollowFeed,
+    UserRelItem,
+)
+from app.models.user_rel_item import UserRelItemKind
+
+
+def entry(number):
+    return {
+        "id": f"test.com/{number}",
+        "title": f"Test {number}",
+        "link": f"http://test.com/{number}",
+        "summary": "Mysummary test",
+        "published_parsed": now().timetuple(),
+    }
+
+
+def reference_unread_counts(user_id, feed_ids):
+    # Per user anti join on the marks, what the bitmaps replace
+    read = UserRelItem.read.filter(user_id=user_id)
+    return dict(
+        Item.objects.filter(feed_id__in=feed_ids)
+        .exclude(id__in=read.values("item_id"))
+        .values("feed_id")
+        .annotate(unread=Count("id"))
+        .values_list("feed_id", "unread")
+    )
+
+
+@pytest.mark.django_db
+def test_item_state_matches_reference(client):
+    generator = random.Random(7)
+    users = baker.make(User, _quantity=2)
+    feeds = baker.make(Feed, _quantity=3)
+    items = [
+        item for feed in feeds for item in baker.make(Item, feed=feed, _quantity=15)
+    ]
+    for _ in range(120):
+        user = generator.choice(users)
+        client.force_login(user)
+        item = generator.choice(items)
+        kind = generator.choice(["read", "favorite", "unfavorite"])
+        response = client.post(
+            resolve_url("mark_item"), data={"item_id": item.id, "kind": kind}
+        )
+        assert response.status_code == 200
+
+    feed_ids = [feed.id for feed in feeds]
+    reference = reference_states()
+    for user in users:
+        states = load_states(user.id, feed_ids)
+        for (feed_id, kind), bitmap in states.items():
+            assert bitmap == reference.get((user.id, feed_id, kind), RoaringBitmap())
+        expected = reference_unread_counts(user.id, feed_ids)
+        assert unread_counts(user.id, feed_ids) == {
+            feed_id: expected.get(feed_id, 0) for feed_id in feed_ids
+        }
+
+
+@pytest.mark.django_db
+def test_rebuild_states():
+    user = baker.make(User)
+    feed = baker.make(Feed)
+    first, second = baker.make(Item, feed=feed, _quantity=2)
+    baker.make(UserRelItem, user=user, item=first, kind=UserRelItemKind.read)
+    baker.make(UserRelItem, user=user, item=first, kind=UserRelItemKind.read)
+    baker.make(
+        UserRelItem,
+        user=user,
+        item=second,
+        kind=UserRelItemKind.favorite,
+        disabled_at=None,
+    )
+    baker.make(UserRelItem, user=user, item=first, kind=UserRelItemKind.comment)
+    assert not load_states(user.id, [feed.id])[feed.id, UserRelItemKind.read]
+
+    assert rebuild_states(user.id) == 2
+    states = load_states(user.id, [feed.id])
+    assert list(states[feed.id, UserRelItemKind.read]) == [first.id]
+    assert list(states[feed.id, UserRelItemKind.favorite]) == [second.id]
+    assert unread_counts(user.id, [feed.id]) == {feed.id: 1}
+
+    assert rebuild_states(user.id) == 2
+    assert ItemStateBitmap.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_rebuild_item_states_command():
+    user = baker.make(User)
+    baker.make(UserRelItem, user=user, kind=UserRelItemKind.read)
+    out = StringIO()
+    call_command("rebuild_item_states", "--user", str(user.id), stdout=out)
+    assert "Wrote 1 bitmaps" in out.getvalue()
+
+
+@pytest.mark.django_db
+def test_unread_counters_follow_ingestion_and_marks(client):
+    users = baker.make(User, _quantity=2)
+    feeds = baker.make(Feed, _quantity=2)
+    for user in users:
+        assert load_unread_counts(user.id, [feed.id for feed in feeds]) == {
+            feeds[0].id: 0,
+            feeds[1].id: 0,
+        }
+
+    Item.objects.bulk_feeds_entries_create(
+        {
+            feeds[0].id: [entry(number) for number in range(3)],
+            feeds[1].id: [entry(number) for number in range(3, 4)],
+        }
+    )
+    Item.objects.bulk_entries_create(feeds[0].id, [entry(0), entry(4)])
+    assert load_unread_counts(users[0].id, [feeds[0].id, feeds[1].id]) == {
+        feeds[0].id: 4,
+        feeds[1].id: 1,
+    }
+
+    client.force_login(users[0])
+    item = Item.objects.filter(feed=feeds[0]).first()
+    for _ in range(2):
+        client.post(resolve_url("mark_item"), data={"item_id": item.id, "kind": "read"})
+    client.post(resolve_url("mark_item"), data={"item_id": item.id, "kind": "favorite"})
+    assert load_unread_counts(users[0].id, [feeds[0].id]) == {feeds[0].id: 3}
+    assert load_unread_counts(users[1].id, [feeds[0].id]) == {feeds[0].id: 4}
+    assert reconcile_counters() == (0, 0)
+
+
+@pytest.mark.django_db
+def test_reconcile_counters():
+    user = baker.make(User)
+    feeds = baker.make(Feed, _quantity=3)
+    baker.make(Item, feed=feeds[0], _quantity=3)
+    baker.make(Item, feed=feeds[1], _quantity=2)
+    mark(user.id, feeds[0].id, UserRelItemKind.read, [Item.objects.first().id])
+    baker.make(UnreadCounter, user=user, feed=feeds[0], unread=10)
+    baker.make(UnreadCounter, user=user, feed=feeds[2], unread=0)
+    baker.make(UserFollowFeed, user=user, feed=feeds[1], disabled_at=None)
+
+    out = StringIO()
+    call_command("reconcile_unread_counters", stdout=out)
+    assert "Repaired 1 counters and created 1" in out.getvalue()
+    assert dict(UnreadCounter.objects.values_list("feed_id", "unread")) == {
+        feeds[0].id: 2,
+        feeds[1].id: 2,
+        feeds[2].id: 0,
+    }
+    assert reconcile_counters() == (0, 0)
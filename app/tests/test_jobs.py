@@ -0,0 +1,43 @@
+from app.jobs import RefreshJob
+
+
+def test_refresh_job_progress():
+    job = RefreshJob.create(user_id=1, total=5, skipped=2)
+    assert job.progress() == {
+        "user_id": 1,
+        "total": 5,
+        "skipped": 2,
+        "done": 0,
+        "failed": 0,
+        "finished": False,
+    }
+
+    job.add(done=3)
+    job.add(done=1, failed=1)
+
+    progress = RefreshJob(job.job_id).progress()
+    assert progress["done"] == 4
+    assert progress["failed"] == 1
+    assert progress["finished"]
+
+
+def test_refresh_job_without_feeds_is_finished():
+    assert RefreshJob.create(user_id=1, total=0).progress()["finished"]
+
+
+def test_refresh_job_does_not_exist():
+    assert RefreshJob("missing").progress() is None
+
+
+def test_refresh_job_expires(redis_connection, settings):
+    settings.REFRESH_JOB_TTL = 30
+    job = RefreshJob.create(user_id=1, total=1)
+    assert 0 < redis_connection.ttl(job.key) <= 30
+
+
+def test_refresh_job_add_after_expired(redis_connection):
+    job = RefreshJob.create(user_id=1, total=1)
+    redis_connection.delete(job.key)
+    job.add(done=1)
+    assert not redis_connection.exists(job.key)
+    assert job.progress() is None
@@ -0,0 +1,52 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+from prometheus_client import CollectorRegistry
+from prometheus_client.multiprocess import MultiProcessCollector
+
+# Boots like a dramatiq worker: the tasks are imported before the Prometheus
+# middleware sets `prometheus_multiproc_dir`, then a feed is fetched and parsed
+WORKER = textwrap.dedent(
+    """
+    import sys
+
+    import django
+
+    django.setup()
+
+    import dramatiq
+    from dramatiq.middleware import Prometheus
+
+    from app.fetch import get_http_client
+    from app.parsers import parse_document
+    import app.tasks
+
+    Prometheus().after_process_boot(dramatiq.get_broker())
+    result = get_http_client().get(sys.argv[1])
+    parse_document(result.body, result.headers)
+    """
+)
+
+
+def test_worker_metrics_are_exported(feed_server, tmp_path):
+    url = feed_server.add_feed("/a", entries=5, encoding="gzip")
+    env = dict(os.environ, dramatiq_prom_db=str(tmp_path))
+    env.pop("prometheus_multiproc_dir", None)
+    subprocess.run([sys.executable, "-c", WORKER, url], env=env, check=True)
+
+    registry = CollectorRegistry()
+    MultiProcessCollector(registry, path=str(tmp_path))
+    host = {"host": "127.0.0.1"}
+    connections = registry.get_sample_value(
+        "pyfeedrss_fetch_connections_total", dict(host, connection="new")
+    )
+    wire_bytes = registry.get_sample_value("pyfeedrss_fetch_wire_bytes_total", host)
+    body_bytes = registry.get_sample_value("pyfeedrss_fetch_body_bytes_total", host)
+    parsed = registry.get_sample_value(
+        "pyfeedrss_parsed_documents_total", {"parser": "lxml"}
+    )
+    assert connections == 1
+    assert 0 < wire_bytes < body_bytes
+    assert parsed == 1
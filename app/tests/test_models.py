@@ -0,0 +1,176 @@
+import pytest
+from django.utils.timezone import now
+from model_bakery import baker
+
+from app.models import Feed, Item
+from app.models.item import entry_identity, link_identity
+
+
+def make_entry(number, **kwargs):
+    entry = {
+        "id": f"test.com/{number}",
+        "title": f"Test {number}",
+        "link": f"http://test.com/{number}",
+        "summary": "Mysummary test",
+        "published_parsed": now().timetuple(),
+    }
+    entry.update(kwargs)
+    return entry
+
+
+def test_entry_identity():
+    assert entry_identity({"id": "abc", "link": "test.com"}) == "abc"
+    assert entry_identity({"guid": "abc", "link": "test.com"}) == "abc"
+    assert entry_identity({"id": "", "link": "test.com"}) == link_identity("test.com")
+    assert len(entry_identity({"id": "a" * 300, "link": "test.com"})) == 40
+
+
+@pytest.mark.django_db
+def test_bulk_entries_create_is_idempotent():
+    feed = baker.make(Feed)
+    entries = [make_entry(number) for number in range(5)]
+
+    assert Item.objects.bulk_entries_create(feed.id, entries) == 5
+    assert Item.objects.bulk_entries_create(feed.id, entries) == 0
+    assert Item.objects.filter(feed=feed).count() == 5
+
+
+@pytest.mark.django_db
+def test_bulk_entries_create_only_writes_new_or_changed(django_assert_num_queries):
+    feed = baker.make(Feed)
+    entries = [make_entry(number) for number in range(3)]
+    Item.objects.bulk_entries_create(feed.id, entries)
+    entries[0]["title"] = "Changed"
+    entries.append(make_entry(3))
+
+    assert Item.objects.bulk_entries_create(feed.id, entries) == 1
+
+    assert Item.objects.filter(feed=feed).count() == 4
+    assert Item.objects.get(feed=feed, guid="test.com/0").title == "Changed"
+    with django_assert_num_queries(1):
+        Item.objects.bulk_entries_create(feed.id, entries)
+
+
+@pytest.mark.django_db
+def test_bulk_entries_create_in_batches(django_assert_num_queries, settings):
+    settings.SEEN_FILTER_ENABLED = False
+    feed = baker.make(Feed)
+    entries = [make_entry(number) for number in range(5)]
+    # Lookup, insert and read back of each batch, then the unread counters
+    with django_assert_num_queries(10):
+        Item.objects.bulk_entries_create(feed.id, entries, batch_size=2)
+    assert Item.objects.filter(feed=feed).count() == 5
+
+
+@pytest.mark.django_db
+def test_bulk_entries_create_skips_lookup_of_unseen_entries(django_assert_num_queries):
+    feed = baker.make(Feed)
+    entries = [make_entry(number) for number in range(5)]
+    # Warming the filter, then only the inserts, read back, and the unread counters
+    with django_assert_num_queries(8):
+        Item.objects.bulk_entries_create(feed.id, entries, batch_size=2)
+    with django_assert_num_queries(7):
+        Item.objects.bulk_entries_create(
+            feed.id, [make_entry(number) for number in range(5, 11)], batch_size=2
+        )
+    assert Item.objects.filter(feed=feed).count() == 11
+
+
+@pytest.mark.django_db
+def test_bulk_entries_create_looks_up_seen_entries(django_assert_num_queries):
+    feed = baker.make(Feed)
+    entries = [make_entry(number) for number in range(3)]
+    Item.objects.bulk_entries_create(feed.id, entries)
+    entries[0]["title"] = "Changed"
+
+    with django_assert_num_queries(2):
+        assert Item.objects.bulk_entries_create(feed.id, entries) == 0
+    assert Item.objects.get(feed=feed, guid="test.com/0").title == "Changed"
+
+
+@pytest.mark.django_db
+def test_bulk_entries_create_updates_entries_missed_by_seen_filter():
+    feed = baker.make(Feed)
+    Item.objects.seen_entries(feed.id)
+    # Inserted by another worker, after the filter was built
+    baker.make(Item, feed=feed, guid="test.com/0", digest="old")
+    entries = [make_entry(0, title="Changed"), make_entry(1)]
+
+    assert Item.objects.bulk_entries_create(feed.id, entries) == 1
+    assert Item.objects.filter(feed=feed).count() == 2
+    assert Item.objects.get(feed=feed, guid="test.com/0").title == "Changed"
+    assert "test.com/0" in Item.objects.seen_entries(feed.id)
+
+
+@pytest.mark.django_db
+def test_seen_entries_filter_is_warmed_from_stored_items():
+    feed = baker.make(Feed)
+    items = baker.make(Item, feed=feed, _quantity=3)
+    seen = Item.objects.seen_entries(feed.id)
+    assert all(item.guid in seen for item in items)
+    assert "missing" not in seen
+
+
+@pytest.mark.django_db
+def test_bulk_entries_create_duplicated_entries():
+    feed = baker.make(Feed)
+    entries = [make_entry(1), make_entry(1, title="Last")]
+    assert Item.objects.bulk_entries_create(feed.id, entries) == 1
+    assert Item.objects.get(feed=feed).title == "Last"
+
+
+@pytest.mark.django_db
+def test_bulk_entries_create_same_guid_in_other_feed():
+    feeds = baker.make(Feed, _quantity=2)
+    for feed in feeds:
+        Item.objects.bulk_entries_create(feed.id, [make_entry(1)])
+    assert Item.objects.filter(guid="test.com/1").count() == 2
+
+
+@pytest.mark.django_db
+def test_bulk_entries_create_adopts_link_identity():
+    feed = baker.make(Feed)
+    legacy = baker.make(
+        Item,
+        feed=feed,
+        link="http://test.com/1",
+        guid=link_identity("http://test.com/1"),
+    )
+
+    assert Item.objects.bulk_entries_create(feed.id, [make_entry(1)]) == 0
+
+    legacy.refresh_from_db()
+    assert legacy.guid == "test.com/1"
+    assert Item.objects.filter(feed=feed).count() == 1
+
+
+@pytest.mark.django_db
+def test_bulk_feeds_entries_create(django_assert_num_queries, settings):
+    settings.SEEN_FILTER_ENABLED = False
+    feeds = baker.make(Feed, _quantity=3)
+    Item.objects.bulk_entries_create(feeds[0].id, [make_entry(1)])
+    entries = {feed.id: [make_entry(number) for number in range(3)] for feed in feeds}
+    entries[feeds[2].id] = []
+
+    # Lookup, insert and read back of the batch, then the unread counters
+    with django_assert_num_queries(4):
+        created = Item.objects.bulk_feeds_entries_create(entries)
+
+    assert created == {feeds[0].id: 2, feeds[1].id: 3, feeds[2].id: 0}
+    assert Item.objects.filter(feed=feeds[0]).count() == 3
+    assert Item.objects.filter(feed=feeds[1]).count() == 3
+
+
+@pytest.mark.django_db
+def test_bulk_entries_create_stores_excerpt(settings):
+    settings.ITEM_EXCERPT_LENGTH = 20
+    feed = baker.make(Feed)
+    summary = "<p>Long " + "summary " * 50 + "</p>"
+    Item.objects.bulk_entries_create(feed.id, [make_entry(1, summary=summary)])
+
+    item = Item.objects.get(feed=feed)
+    assert item.description == summary
+    assert item.excerpt == "<p>Long summary summar…</p>"
+    assert item.truncated
+    assert item.preview.startswith("Long summary summary")
+    assert len(item.preview) == settings.ITEM_PREVIEW_LENGTH
@@ -0,0 +1,64 @@
+from datetime import timedelta
+
+import pytest
+from django.utils.timezone import now
+from model_bakery import baker
+
+from app.models import Feed, Item
+from app.pagination import decode_cursor, encode_cursor, keyset_page
+
+
+def test_cursor_round_trip():
+    published_at = now()
+    cursor = encode_cursor(published_at, 42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (published_at, 42)
+
+
+@pytest.mark.parametrize("cursor", ["invalid", "", "bm8tc2VwYXJhdG9y", "YXw="])
+def test_decode_cursor_invalid(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+@pytest.mark.django_db
+def test_keyset_page_matches_offset_pages():
+    feed = baker.make(Feed)
+    published_at = now()
+    for hours in (0, 0, 1, 2, 2, 2, 3):
+        baker.make(Item, feed=feed, published_at=published_at - timedelta(hours=hours))
+    queryset = Item.objects.filter(feed=feed)
+    expected = list(
+        queryset.order_by("-published_at", "-id").values_list("id", flat=True)
+    )
+
+    pages, cursor = [], None
+    while True:
+        items, cursor = keyset_page(queryset, cursor, 3)
+        pages.append([item.id for item in items])
+        if cursor is None:
+            break
+    assert pages == [expected[:3], expected[3:6], expected[6:]]
+
+
+@pytest.mark.django_db
+def test_keyset_page_bounds_filtered_batches(django_assert_num_queries):
+    feed = baker.make(Feed)
+    published_at = now()
+    items = [
+        baker.make(Item, feed=feed, published_at=published_at - timedelta(hours=hours))
+        for hours in range(30)
+    ]
+    queryset = Item.objects.filter(feed=feed)
+
+    def keep(item):
+        return item.id == items[-1].id
+
+    with django_assert_num_queries(2):
+        page, cursor = keyset_page(queryset, None, 2, keep=keep, batches=2)
+    assert page == []
+    assert decode_cursor(cursor) == (items[23].published_at, items[23].id)
+
+    page, cursor = keyset_page(queryset, cursor, 2, keep=keep, batches=2)
+    assert page == [items[-1]]
+    assert cursor is None
@@ -0,0 +1,127 @@
+from pathlib import Path
+
+import feedparser
+import pytest
+
+from app.exceptions import UnsupportedDocumentError
+from app.parsers import (
+    FeedparserParser,
+    LxmlParser,
+    get_parse_pool,
+    get_parsers,
+    parse_document,
+    submit_parse,
+)
+from app.store import ENTRY_FIELDS as COMPACT_FIELDS
+
+CORPUS = sorted((Path(__file__).parent / "corpus").glob("*.xml"))
+ENTRY_FIELDS = ("id", "title", "link", "summary", "published_parsed")
+
+
+@pytest.fixture
+def parsers(settings):
+    def configure(*paths):
+        settings.FEED_PARSERS = list(paths)
+        get_parsers.cache_clear()
+
+    yield configure
+    get_parsers.cache_clear()
+
+
+@pytest.fixture
+def parse_pool(settings):
+    settings.FEED_PARSE_PROCESSES = 2
+    get_parse_pool.cache_clear()
+    yield get_parse_pool()
+    get_parse_pool().shutdown()
+    get_parse_pool.cache_clear()
+
+
+@pytest.mark.parametrize("path", CORPUS, ids=[path.name for path in CORPUS])
+def test_parse_document_matches_feedparser(path):
+    body = path.read_bytes()
+    parsed = parse_document(body)
+    expected = feedparser.parse(body)
+
+    assert parsed.parser == (
+        "feedparser" if path.name.startswith("fallback_") else "lxml"
+    )
+    assert [
+        {field: entry.get(field) for field in ENTRY_FIELDS} for entry in parsed.entries
+    ] == [
+        {field: entry.get(field) for field in ENTRY_FIELDS}
+        for entry in expected.entries
+    ]
+    assert parsed.feed.get("modified_parsed") == expected.feed.get("modified_parsed")
+    for field in ("title", "description"):
+        assert parsed.feed.get(field) == expected.feed.get(field)
+
+
+@pytest.mark.parametrize(
+    "document",
+    [
+        b'<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom"><channel>'
+        b"<title>Rss</title><link>http://test.com</link>"
+        b'<atom:link rel="hub" href="https://hub.test/"/></channel></rss>',
+        b'<feed xmlns="http://www.w3.org/2005/Atom"><title>Atom</title>'
+        b'<link href="http://test.com"/><link rel="hub" href="https://hub.test/"/>'
+        b"</feed>",
+    ],
+)
+def test_lxml_parser_reads_feed_links(document):
+    parsed = LxmlParser().parse(document)
+    expected = feedparser.parse(document)
+
+    def hubs(links):
+        return [link["href"] for link in links if link.get("rel") == "hub"]
+
+    assert (
+        hubs(parsed.feed["links"]) == hubs(expected.feed.links) == ["https://hub.test/"]
+    )
+
+
+def test_lxml_parser_rejects_malformed_documents():
+    with pytest.raises(UnsupportedDocumentError):
+        LxmlParser().parse(b"<rss><channel><title>Broken</channel></rss>")
+
+
+def test_feedparser_parser_uses_response_headers():
+    body = "<?xml version='1.0'?><rss><channel><title>Ol\xe1</title></channel></rss>"
+    parsed = FeedparserParser().parse(
+        body.encode("latin-1"), {"content-type": "application/xml; charset=iso-8859-1"}
+    )
+    assert parsed.feed["title"] == "Ol\xe1"
+
+
+def test_parse_document_without_fallback(parsers):
+    parsers("app.parsers.LxmlParser")
+    with pytest.raises(UnsupportedDocumentError):
+        parse_document(b"<rss><channel><title>Broken</channel></rss>")
+
+
+def test_parse_document_uses_configured_parsers(parsers):
+    parsers("app.parsers.FeedparserParser")
+    body = (Path(__file__).parent / "corpus" / "rss2_basic.xml").read_bytes()
+    assert parse_document(body).parser == "feedparser"
+
+
+def test_submit_parse_without_pool_raises_on_result(parsers):
+    parsers("app.parsers.LxmlParser")
+    future = submit_parse(b"<rss><channel><title>Broken</channel></rss>")
+    assert future.done()
+    with pytest.raises(UnsupportedDocumentError):
+        future.result()
+
+
+def test_parse_document_in_parse_pool(parse_pool):
+    paths = [path for path in CORPUS if path.name.startswith(("rss2", "fallback"))]
+    futures = [submit_parse(path.read_bytes()) for path in paths]
+
+    for path, future in zip(paths, futures):
+        parsed = future.result(timeout=60)
+        expected = feedparser.parse(path.read_bytes())
+        assert parsed.entries == [
+            {field: entry.get(field) for field in COMPACT_FIELDS}
+            for entry in expected.entries
+        ]
+        assert parsed.feed["modified_parsed"] == expected.feed.get("modified_parsed")
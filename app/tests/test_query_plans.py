@@ -0,0 +1,141 @@
+from datetime import timedelta
+
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection
+from django.shortcuts import resolve_url
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+from model_bakery import baker
+
+from app.canonical import find_feed
+from app.models import (
+    Feed,
+    HubSubscription,
+    Item,
+    ItemStateBitmap,
+    Notification,
+    UnreadCounter,
+    UserFollowFeed,
+    UserRelItem,
+)
+from app.models.hub_subscription import HubSubscriptionState
+from app.models.user_rel_item import UserRelItemKind
+from app.pagination import encode_cursor
+from app.scheduler import publish_cadences
+from app.tasks import _notify_not_updated
+from app.tests.utils import seq_scans
+from app.websub import due_renewals
+
+# The requests and tasks that run on every page view or refresh, their queries are
+# captured as they run and explained
+HOT_PATHS = {
+    "feed_list": lambda client, data: client.get(resolve_url("list_feed")),
+    "follow": lambda client, data: client.post(
+        resolve_url("follow_feed"), {"feed_id": data["feed"]}
+    ),
+    "unfollow": lambda client, data: client.post(
+        resolve_url("unfollow_feed"), {"feed_id": data["feed"]}
+    ),
+    "update_all": lambda client, data: client.post(resolve_url("update_all")),
+    "item_list": lambda client, data: client.get(
+        resolve_url("list_item", feed_id=data["feed"])
+    ),
+    "item_list_unread": lambda client, data: client.get(
+        resolve_url("list_item", feed_id=data["feed"]), {"unread": 1}
+    ),
+    "item_page": lambda client, data: client.get(
+        resolve_url("item_page", feed_id=data["feed"]),
+        {"cursor": encode_cursor(data["at"], data["items"][0])},
+    ),
+    "item_body": lambda client, data: client.get(
+        resolve_url("item_body", item_id=data["items"][0])
+    ),
+    "mark_read": lambda client, data: client.post(
+        resolve_url("mark_item"),
+        {"item_id": data["items"][0], "kind": UserRelItemKind.read},
+    ),
+    "unfavorite": lambda client, data: client.post(
+        resolve_url("mark_item"),
+        {"item_id": data["items"][0], "kind": UserRelItemKind.unfavorite},
+    ),
+    "find_feed": lambda client, data: find_feed("https://feed.test/1"),
+    "ingest_entries": lambda client, data: Item.objects.bulk_entries_create(
+        data["feed"],
+        [
+            {
+                "id": guid,
+                "title": guid,
+                "link": guid,
+                "summary": guid,
+                "published_parsed": data["at"].timetuple(),
+            }
+            for guid in ("guid/0/1", "guid/0/2", "guid/new")
+        ],
+    ),
+    "notify_not_updated": lambda client, data: _notify_not_updated(
+        data["feed"], [data["user"]]
+    ),
+    "publish_cadences": lambda client, data: publish_cadences(
+        data["feeds"], data["at"]
+    ),
+    "due_renewals": lambda client, data: list(due_renewals(data["at"])),
+}
+
+
+@pytest.fixture
+def dataset():
+    users = baker.make(User, _quantity=3)
+    feeds = baker.make(Feed, _quantity=5)
+    at = now()
+    for number, feed in enumerate(feeds):
+        baker.make(
+            Item,
+            feed=feed,
+            guid=iter(f"guid/{number}/{i}" for i in range(20)),
+            published_at=iter(at - timedelta(hours=i) for i in range(20)),
+            _quantity=20,
+        )
+        baker.make(HubSubscription, feed=feed, state=HubSubscriptionState.active)
+    items = list(Item.objects.values_list("id", flat=True)[:10])
+    for user in users:
+        for feed in feeds:
+            baker.make(UserFollowFeed, user=user, feed=feed, disabled_at=None)
+            baker.make(UnreadCounter, user=user, feed=feed)
+            baker.make(ItemStateBitmap, user=user, feed=feed, kind=UserRelItemKind.read)
+        for item_id in items:
+            baker.make(
+                UserRelItem, user=user, item_id=item_id, kind=UserRelItemKind.read
+            )
+        baker.make(Notification, user=user, _quantity=3)
+    return {
+        "user": users[0].id,
+        "feed": feeds[0].id,
+        "feeds": [feed.id for feed in feeds[:2]],
+        "items": items,
+        "at": at - timedelta(hours=5),
+    }
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("name", sorted(HOT_PATHS))
+def test_hot_path_uses_indexes(name, dataset, client, broker):
+    client.force_login(User.objects.get(id=dataset["user"]))
+    with CaptureQueriesContext(connection) as context:
+        HOT_PATHS[name](client, dataset)
+    queries = [
+        query["sql"]
+        for query in context.captured_queries
+        if query["sql"].startswith(("SELECT", "UPDATE", "DELETE"))
+    ]
+
+    assert queries
+    scans = {sql: seq_scans(sql) for sql in queries}
+    assert {sql: tables for sql, tables in scans.items() if tables} == {}
+
+
+@pytest.mark.django_db
+def test_seq_scans_reports_scanned_tables(dataset):
+    assert seq_scans(Notification.objects.filter(content="test")) == [
+        Notification._meta.db_table
+    ]
@@ -0,0 +1,81 @@
+import pytest
+from django.contrib.auth.models import User
+from model_bakery import baker
+
+from app.fetch import FetchResult, get_http_client
+from app.models import Feed, Item
+from app.parsers import parse_document
+from app.replay import ReplayConfig, ReplayServer, synthetic_document
+from app.snapshots import SnapshotArchive, body_digest
+from app.tasks import update_feed
+
+
+@pytest.fixture
+def replay_server():
+    server = ReplayServer(ReplayConfig(entries=5, summary_size=100)).start()
+    yield server
+    server.stop()
+
+
+@pytest.mark.parametrize("kind", ["rss", "atom"])
+def test_synthetic_document(kind):
+    parsed = parse_document(synthetic_document(kind, 1, 0, 5, 100))
+    assert [entry["title"] for entry in parsed.entries] == [
+        f"Entry {entry}" for entry in range(4, -1, -1)
+    ]
+    assert len(parsed.entries[0]["summary"]) > 100
+
+    changed = parse_document(synthetic_document(kind, 1, 2, 5, 100))
+    assert changed.entries[0]["title"] == "Entry 6"
+    assert changed.entries[-1]["link"] == parsed.entries[-3]["link"]
+
+
+def test_replay_server_etag(replay_server):
+    client = get_http_client()
+    result = client.get(replay_server.url(1))
+    assert result.status == 200
+    assert result.headers["content-type"] == "application/rss+xml"
+
+    etag = result.headers["etag"]
+    assert client.get(replay_server.url(1), {"If-None-Match": etag}).status == 304
+
+    replay_server.config.change_rate = 1.0
+    changed = client.get(replay_server.url(1), {"If-None-Match": etag})
+    assert changed.status == 200
+    assert changed.headers["etag"] != etag
+
+    replay_server.config.etag = False
+    assert "etag" not in client.get(replay_server.url(1)).headers
+
+
+def test_replay_server_errors(replay_server):
+    replay_server.config.error_rate = 1.0
+    client = get_http_client()
+    statuses = {client.get(replay_server.url(number)).status for number in range(20)}
+    assert statuses == {500, 503}
+    assert client.get(f"{replay_server.base_url}/other/1").status == 404
+    assert replay_server.statuses[404] == 1
+
+
+def test_replay_server_recorded(replay_server):
+    body = synthetic_document("atom", 7, 0, 2, 10)
+    digest = body_digest(FetchResult(feed_id=None, url="", body=body))
+    SnapshotArchive().put(FetchResult(feed_id=None, url="", body=body), digest)
+
+    client = get_http_client()
+    assert client.get(replay_server.recorded_url(digest)).body == body
+    assert client.get(replay_server.recorded_url("0" * 64)).status == 404
+
+
+@pytest.mark.django_db
+def test_update_feed_from_replay_server(replay_server, settings):
+    settings.FEED_REFRESH_COALESCE_WINDOW = 0
+    user = baker.make(User)
+    feed = baker.make(Feed, link=replay_server.url(1, "atom"), etag=None)
+
+    update_feed(feed.id, user.id)
+    assert Item.objects.filter(feed=feed).count() == 5
+
+    replay_server.config.change_rate = 1.0
+    update_feed(feed.id, user.id)
+    assert Item.objects.filter(feed=feed).count() == 6
@@ -0,0 +1,162 @@
+from datetime import timedelta
+from unittest import mock
+
+import pytest
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils.timezone import now
+from model_bakery import baker
+from prometheus_client import REGISTRY
+
+from app.models import Feed, HubSubscription, Item, UserFollowFeed
+from app.models.hub_subscription import HubSubscriptionState
+from app.scheduler import FeedScheduler, fetch_interval, publish_cadences
+
+
+@override_settings(
+    SCHEDULER_MIN_INTERVAL=300,
+    SCHEDULER_DEFAULT_INTERVAL=3600,
+    SCHEDULER_MAX_INTERVAL=86400,
+)
+def test_fetch_interval():
+    assert fetch_interval(ttl=0, max_age=None, cadence=None, followers=0) == 86400
+    assert fetch_interval(ttl=0, max_age=None, cadence=None, followers=1) == 3600
+    assert fetch_interval(ttl=0, max_age=None, cadence=7200, followers=1) == 3600
+    assert fetch_interval(ttl=0, max_age=None, cadence=7200, followers=1000) == 900
+    assert fetch_interval(ttl=0, max_age=None, cadence=60, followers=1) == 300
+    assert fetch_interval(ttl=0, max_age=None, cadence=10 ** 7, followers=1) == 86400
+
+
+def test_fetch_interval_respects_ttl_and_cache():
+    assert fetch_interval(ttl=120, max_age=None, cadence=600, followers=1) == 7200
+    assert fetch_interval(ttl=0, max_age=5400, cadence=600, followers=1) == 5400
+
+
+@pytest.mark.django_db
+def test_publish_cadences():
+    start = now() - timedelta(days=1)
+    busy, single, empty = baker.make(Feed, _quantity=3)
+    for hours in (0, 1, 2, 4, 5):
+        baker.make(Item, feed=busy, published_at=start + timedelta(hours=hours))
+    baker.make(Item, feed=single, published_at=start)
+    baker.make(Item, feed=busy, published_at=start - timedelta(days=60))
+
+    cadences = publish_cadences(
+        [busy.id, single.id, empty.id], since=start - timedelta(days=30)
+    )
+
+    assert cadences == {busy.id: 3600.0}
+
+
+@pytest.mark.django_db
+def test_publish_cadences_even_number_of_gaps():
+    start = now() - timedelta(days=1)
+    feed = baker.make(Feed)
+    for hours in (0, 1, 4):
+        baker.make(Item, feed=feed, published_at=start + timedelta(hours=hours))
+    assert publish_cadences([feed.id], since=start) == {feed.id: 2 * 3600.0}
+
+
+@pytest.mark.django_db
+@mock.patch("app.scheduler.update_feeds_batch")
+def test_scheduler_run_once(update_feeds_batch_mock):
+    at = now()
+    new = baker.make(Feed, ttl=0, next_fetch_at=None)
+    late = baker.make(Feed, ttl=0, next_fetch_at=at - timedelta(minutes=2))
+    later = baker.make(Feed, ttl=0, next_fetch_at=at + timedelta(hours=1))
+    baker.make(UserFollowFeed, feed=late, disabled_at=None)
+    lag_count = REGISTRY.get_sample_value("pyfeedrss_schedule_lag_seconds_count") or 0
+
+    scheduler = FeedScheduler()
+    scheduler.load(at)
+    dispatched = scheduler.run_once(at)
+
+    assert sorted(dispatched) == sorted([new.id, late.id])
+    update_feeds_batch_mock.send.assert_called_once()
+    assert scheduler.max_lag == pytest.approx(120, abs=1)
+    assert (
+        REGISTRY.get_sample_value("pyfeedrss_schedule_lag_seconds_count")
+        == lag_count + 2
+    )
+    late.refresh_from_db()
+    new.refresh_from_db()
+    assert late.fetch_interval < new.fetch_interval
+    assert late.next_fetch_at == at + timedelta(seconds=late.fetch_interval)
+    assert Feed.objects.get(id=later.id).next_fetch_at == later.next_fetch_at
+
+    assert scheduler.run_once(at) == []
+    assert len(scheduler.queue) == 3
+    assert scheduler.seconds_until_due(at) == pytest.approx(3600)
+
+
+@pytest.mark.django_db
+@mock.patch("app.scheduler.update_feeds_batch")
+def test_scheduler_dispatches_in_batches(update_feeds_batch_mock):
+    baker.make(Feed, next_fetch_at=None, ttl=0, _quantity=5)
+    scheduler = FeedScheduler(batch_size=2)
+    scheduler.load()
+    scheduler.run_once()
+    assert update_feeds_batch_mock.send.call_count == 3
+
+
+@pytest.mark.django_db
+@mock.patch("app.scheduler.update_feeds_batch")
+def test_schedule_feeds_command_once(update_feeds_batch_mock, capsys):
+    baker.make(Feed, next_fetch_at=None, ttl=0, _quantity=2)
+    call_command("schedule_feeds", "--once")
+    assert "Dispatched 2 feeds" in capsys.readouterr().out
+    assert not Feed.objects.filter(next_fetch_at__isnull=True).exists()
+
+
+@pytest.mark.django_db
+@mock.patch("app.scheduler.update_feeds_batch")
+def test_scheduler_waits_for_quarantine(update_feeds_batch_mock):
+    at = now()
+    feed = baker.make(
+        Feed, ttl=0, next_fetch_at=None, quarantined_until=at + timedelta(days=3)
+    )
+    scheduler = FeedScheduler()
+    scheduler.load(at)
+    scheduler.run_once(at)
+    assert Feed.objects.get(id=feed.id).next_fetch_at == feed.quarantined_until
+
+
+@pytest.mark.django_db
+@mock.patch("app.scheduler.update_feeds_batch")
+def test_scheduler_skips_pushed_feeds(update_feeds_batch_mock):
+    at = now()
+    pushed, lapsed = baker.make(Feed, ttl=0, next_fetch_at=None, _quantity=2)
+    subscription = baker.make(
+        HubSubscription,
+        feed=pushed,
+        state=HubSubscriptionState.active,
+        lease_expires_at=at + timedelta(days=1),
+    )
+    baker.make(
+        HubSubscription,
+        feed=lapsed,
+        state=HubSubscriptionState.active,
+        lease_expires_at=at - timedelta(minutes=1),
+    )
+    scheduler = FeedScheduler()
+    scheduler.load(at)
+    assert scheduler.run_once(at) == [lapsed.id]
+
+    # Pushed after being loaded
+    scheduler.queue = [(at.timestamp(), pushed.id)]
+    assert scheduler.run_once(at) == []
+    assert scheduler.queue == []
+    pushed.refresh_from_db()
+    assert pushed.next_fetch_at == subscription.lease_expires_at
+
+
+@pytest.mark.django_db
+@mock.patch("app.scheduler.subscribe_feed")
+def test_scheduler_renews_subscriptions(subscribe_feed_mock):
+    subscription = baker.make(
+        HubSubscription,
+        state=HubSubscriptionState.active,
+        lease_expires_at=now() + timedelta(minutes=5),
+    )
+    assert FeedScheduler().renew_subscriptions() == 1
+    subscribe_feed_mock.send.assert_called_once_with(subscription.id)
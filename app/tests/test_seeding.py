@@ -0,0 +1,153 @@
+import random
+from collections import Counter
+from datetime import datetime, timezone
+from io import StringIO
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+
+from app.item_state import reconcile_counters, reference_states
+from app.models import (
+    Feed,
+    Item,
+    ItemStateBitmap,
+    UnreadCounter,
+    UserFollowFeed,
+    UserRelItem,
+)
+from app.models.user_rel_item import UserRelItemKind
+from app.seeding import (
+    BulkLoader,
+    ScaleConfig,
+    copy_value,
+    followed_feeds,
+    item_counts,
+    seed_scale,
+    zipf_cum_weights,
+)
+
+CONFIG = ScaleConfig(users=60, feeds=20, items=2000, read_window=100, batch_size=500)
+
+
+def dataset():
+    # Rows by their natural keys, the ids depend on what the database had before
+    follows = set(
+        UserFollowFeed.objects.values_list("user__username", "feed__canonical_url")
+    )
+    marks = Counter(
+        UserRelItem.objects.values_list("user__username", "item__guid", "kind")
+    )
+    counters = set(
+        UnreadCounter.objects.values_list(
+            "user__username", "feed__canonical_url", "unread"
+        )
+    )
+    return follows, marks, counters
+
+
+def clear():
+    for model in (ItemStateBitmap, UnreadCounter, UserRelItem, UserFollowFeed, Item):
+        model.objects.all().delete()
+    Feed.objects.all().delete()
+    User.objects.all().delete()
+
+
+def test_copy_value():
+    assert copy_value(None) == r"\N"
+    assert copy_value(True) == "t"
+    assert copy_value(0) == "0"
+    assert copy_value(b"\x00\xff") == r"\\x00ff"
+    assert copy_value("a\tb\nc\\d\r") == r"a\tb\nc\\d\r"
+    assert (
+        copy_value(datetime(2020, 8, 1, tzinfo=timezone.utc))
+        == "2020-08-01T00:00:00+00:00"
+    )
+
+
+def test_item_counts():
+    counts = item_counts(random.Random(0), 100, 10000, 1.2)
+
+    assert sum(counts) == 10000
+    # A long tail, the largest tenth of the feeds has several times its share
+    assert sum(sorted(counts, reverse=True)[:10]) > 3000
+    assert counts == item_counts(random.Random(0), 100, 10000, 1.2)
+
+
+def test_followed_feeds():
+    cum_weights = zipf_cum_weights(50, 1.1)
+    generator = random.Random(0)
+    draws = Counter(
+        rank for _ in range(500) for rank in followed_feeds(generator, cum_weights, 5)
+    )
+
+    assert len(followed_feeds(generator, cum_weights, 5)) == 5
+    assert len(set(followed_feeds(generator, cum_weights, 100))) == 25
+    assert draws[0] > draws[10] > draws[49]
+
+
+@pytest.mark.django_db
+def test_bulk_loader():
+    loader = BulkLoader(batch_size=2)
+    for number in range(3):
+        loader.add(User(username=f"loaded{number}"))
+
+    assert User.objects.count() == 2
+    loader.flush()
+    assert User.objects.count() == 3
+    assert loader.counts[User] == 3
+
+
+@pytest.mark.django_db
+def test_seed_scale():
+    counts = seed_scale(CONFIG)
+
+    assert counts["User"] == User.objects.count() == 60
+    assert counts["Feed"] == Feed.objects.count() == 20
+    assert counts["Item"] == Item.objects.count() == 2000
+    assert counts["UserFollowFeed"] == UserFollowFeed.objects.count()
+    assert counts["UserRelItem"] == UserRelItem.objects.count()
+    followers = Counter(UserFollowFeed.objects.values_list("feed__title", flat=True))
+    assert followers.most_common(1)[0][0] == "Scale feed 0"
+    assert UserRelItem.objects.filter(kind=UserRelItemKind.favorite).exists()
+    item = Item.objects.order_by("-published_at").first()
+    assert item.description.startswith("<p>")
+    assert item.preview
+    # The bitmaps and counters are the ones the marks and items give
+    assert {
+        (state.user_id, state.feed_id, state.kind): state.bitmap
+        for state in ItemStateBitmap.objects.all()
+    } == reference_states()
+    assert reconcile_counters() == (0, 0)
+
+
+@pytest.mark.django_db
+def test_seed_scale_deterministic():
+    seed_scale(CONFIG)
+    first = dataset()
+    clear()
+    seed_scale(CONFIG)
+
+    assert dataset() == first
+
+
+@pytest.mark.django_db
+def test_seed_scale_command():
+    out = StringIO()
+    call_command(
+        "seed_scale",
+        "--users",
+        "5",
+        "--feeds",
+        "3",
+        "--items",
+        "30",
+        "--seed",
+        "7",
+        stdout=out,
+    )
+
+    assert "Item: 30 rows" in out.getvalue()
+    assert User.objects.filter(username__startswith="scale7-").count() == 5
+    with pytest.raises(CommandError):
+        call_command("seed_scale", "--seed", "7", stdout=out)
@@ -0,0 +1,50 @@
+from app.seen import SeenEntries
+
+
+def test_seen_entries_size():
+    seen = SeenEntries(1, capacity=1000, error_rate=0.01)
+    assert seen.size == 9592
+    assert seen.hashes == 7
+
+
+def test_seen_entries_add_and_load():
+    seen = SeenEntries(1)
+    seen.warm(["a", "b"])
+    seen.add(["c"])
+
+    loaded = SeenEntries(1)
+    assert loaded.load()
+    assert all(key in loaded for key in ["a", "b", "c"])
+    assert "d" not in loaded
+    assert not SeenEntries(2).load()
+
+
+def test_seen_entries_matches_redis_bits(redis_connection):
+    seen = SeenEntries(1)
+    seen.warm([])
+    seen.add(["a"])
+    assert all(
+        redis_connection.getbit(seen.key, offset) for offset in seen.offsets("a")
+    )
+
+
+def test_seen_entries_warm_keeps_existing_filter():
+    SeenEntries(1).warm(["a"])
+    seen = SeenEntries(1)
+    seen.warm(["b"])
+    assert "a" in seen
+
+
+def test_seen_entries_false_positive_rate():
+    seen = SeenEntries(1, capacity=1000, error_rate=0.01)
+    seen.warm(str(number) for number in range(1000))
+    false_positives = sum(f"other {number}" in seen for number in range(10_000))
+    assert false_positives < 200
+
+
+def test_seen_entries_dropped_when_expired(redis_connection):
+    seen = SeenEntries(1)
+    seen.warm([])
+    redis_connection.delete(seen.key)
+    seen.add(["a"])
+    assert not SeenEntries(1).load()
@@ -0,0 +1,63 @@
+from app.singleflight import FeedRefreshFlight
+
+
+def test_only_one_refresh_holds_the_lease():
+    first, second = FeedRefreshFlight(1), FeedRefreshFlight(1)
+    assert first.begin(user_id=1)
+    assert not second.begin(user_id=2)
+    assert FeedRefreshFlight(2).begin(user_id=2)
+
+
+def test_waiters_are_returned_once():
+    flight = FeedRefreshFlight(1)
+    flight.begin(user_id=1)
+    FeedRefreshFlight(1).begin(user_id=2)
+    FeedRefreshFlight(1).begin(user_id=3)
+
+    assert flight.finish(succeeded=False) == {2, 3}
+    assert FeedRefreshFlight(1).finish(succeeded=False) == set()
+
+
+def test_failed_refresh_is_not_coalesced():
+    flight = FeedRefreshFlight(1)
+    flight.begin()
+    flight.finish(succeeded=False)
+    assert FeedRefreshFlight(1).begin()
+
+
+def test_refresh_is_coalesced_within_the_window(redis_connection, settings):
+    settings.FEED_REFRESH_COALESCE_WINDOW = 30
+    flight = FeedRefreshFlight(1)
+    flight.begin()
+    flight.finish(succeeded=True)
+
+    assert not FeedRefreshFlight(1).begin(user_id=2)
+    assert 0 < redis_connection.ttl(flight.refreshed_key) <= 30
+    redis_connection.delete(flight.refreshed_key)
+    assert FeedRefreshFlight(1).begin(user_id=2)
+
+
+def test_coalescing_window_disabled(settings):
+    settings.FEED_REFRESH_COALESCE_WINDOW = 0
+    flight = FeedRefreshFlight(1)
+    flight.begin()
+    flight.finish(succeeded=True)
+    assert FeedRefreshFlight(1).begin()
+
+
+def test_join_after_the_refresh_finished():
+    flight = FeedRefreshFlight(1)
+    assert not flight.join(user_id=2)
+    assert flight.finish(succeeded=False) == set()
+
+
+def test_expired_lease_keeps_the_waiters_of_the_new_holder(redis_connection):
+    expired = FeedRefreshFlight(1)
+    expired.begin()
+    redis_connection.delete(expired.lease_key)
+    holder = FeedRefreshFlight(1)
+    holder.begin()
+    FeedRefreshFlight(1).begin(user_id=2)
+
+    assert expired.finish(succeeded=False) == set()
+    assert holder.finish(succeeded=False) == {2}
@@ -0,0 +1,161 @@
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.utils.timezone import now
+from model_bakery import baker
+
+from app.fetch import FetchResult
+from app.models import Feed, FeedSnapshot, Item
+from app.parsers import submit_parse
+from app.snapshots import SnapshotArchive, body_digest, take_snapshots
+from app.tasks import refresh_feeds, update_feed
+from app.tests.utils import rss_document
+
+
+def test_archive_dedupes_bodies(snapshot_root):
+    archive = SnapshotArchive()
+    result = FetchResult(feed_id=1, url="http://test.com", status=200, body=b"body")
+    digest = body_digest(result)
+
+    assert archive.put(result, digest)
+    assert not archive.put(result, digest)
+    path = archive.path(digest)
+    assert path == os.path.join(snapshot_root, digest[:2], digest[2:4], f"{digest}.zst")
+    assert os.listdir(os.path.dirname(path)) == [f"{digest}.zst"]
+    assert archive.read(digest) == b"body"
+    assert archive.open(digest).read() == b"body"
+
+
+def test_archive_stores_streamed_bodies():
+    archive = SnapshotArchive()
+    body = rss_document("Large", 100)
+    stream = tempfile.TemporaryFile()
+    stream.write(body)
+    stream.seek(0)
+    result = FetchResult(feed_id=1, url="x", status=200, stream=stream, size=len(body))
+
+    digest = body_digest(result)
+    assert digest == body_digest(FetchResult(feed_id=1, url="x", body=body))
+    archive.put(result, digest)
+    assert stream.tell() == 0
+    assert archive.read(digest) == body
+
+
+@pytest.mark.django_db
+def test_take_snapshots(settings):
+    feeds = baker.make(Feed, _quantity=3)
+    results = [
+        FetchResult(feed_id=feeds[0].id, url="a", status=200, body=b"same"),
+        FetchResult(feed_id=feeds[1].id, url="b", status=500, body=b"same"),
+        FetchResult(feed_id=feeds[2].id, url="c", status=304),
+    ]
+    digests = take_snapshots(results, now())
+
+    assert set(digests) == {feeds[0].id, feeds[1].id}
+    assert digests[feeds[0].id] == digests[feeds[1].id]
+    assert sorted(FeedSnapshot.objects.values_list("status", flat=True)) == [200, 500]
+
+    settings.SNAPSHOT_ENABLED = False
+    assert take_snapshots(results, now()) == digests
+    assert FeedSnapshot.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_update_feed_skips_parsing_unchanged_body(feed_server, settings):
+    settings.FEED_REFRESH_COALESCE_WINDOW = 0
+    user = baker.make(User)
+    feed = baker.make(Feed, link=feed_server.add_feed("/feed", entries=2), etag=None)
+
+    update_feed(feed.id, user.id)
+    feed.refresh_from_db()
+    snapshot = FeedSnapshot.objects.get()
+    assert feed.content_digest == snapshot.digest
+    assert Item.objects.count() == 2
+
+    with mock.patch("app.tasks.parse_document") as parse_document_mock:
+        update_feed(feed.id, user.id)
+    parse_document_mock.assert_not_called()
+    assert FeedSnapshot.objects.filter(digest=snapshot.digest).count() == 2
+
+    feed_server.add_feed("/feed", entries=3)
+    update_feed(feed.id, user.id)
+    assert Item.objects.count() == 3
+    assert FeedSnapshot.objects.values("digest").distinct().count() == 2
+
+
+@pytest.mark.django_db
+def test_refresh_feeds_skips_parsing_unchanged_bodies(feed_server, settings):
+    settings.FEED_REFRESH_COALESCE_WINDOW = 0
+    feeds = [
+        baker.make(Feed, link=feed_server.add_feed(f"/{i}", entries=2), etag=None)
+        for i in range(2)
+    ]
+    refresh_feeds([feed.id for feed in feeds])
+    assert FeedSnapshot.objects.count() == 2
+
+    feed_server.add_feed("/1", entries=3)
+    with mock.patch("app.tasks.submit_parse", wraps=submit_parse) as submit_parse_mock:
+        stats = refresh_feeds([feed.id for feed in feeds])
+    assert not stats.failed
+    assert submit_parse_mock.call_count == 1
+    assert Item.objects.filter(feed=feeds[1]).count() == 3
+    assert FeedSnapshot.objects.count() == 4
+
+
+@pytest.mark.django_db
+def test_prune_snapshots(settings):
+    settings.SNAPSHOT_RETENTION = 3600
+    archive = SnapshotArchive()
+    feed = baker.make(Feed)
+    old, recent = now() - timedelta(days=1), now()
+    for body, at in [(b"old", old), (b"shared", old), (b"shared", recent)]:
+        take_snapshots(
+            [FetchResult(feed_id=feed.id, url="x", status=200, body=body)], at
+        )
+    take_snapshots(
+        [FetchResult(feed_id=feed.id, url="x", status=200, body=b"new")], recent
+    )
+    old_digest = body_digest(FetchResult(feed_id=None, url="x", body=b"old"))
+    os.utime(archive.path(old_digest), (old.timestamp(), old.timestamp()))
+
+    out = StringIO()
+    call_command("prune_snapshots", stdout=out)
+
+    assert "Removed 2 snapshots and 1 bodies" in out.getvalue()
+    assert not os.path.exists(archive.path(old_digest))
+    assert sorted(
+        archive.read(digest)
+        for digest in FeedSnapshot.objects.values_list("digest", flat=True)
+    ) == [b"new", b"shared"]
+
+
+@pytest.mark.django_db
+def test_prune_snapshots_keeps_latest_of_each_feed(settings):
+    settings.SNAPSHOT_RETENTION = 3600
+    feed = baker.make(Feed)
+    take_snapshots(
+        [FetchResult(feed_id=feed.id, url="x", status=200, body=b"body")],
+        now() - timedelta(days=30),
+    )
+    assert SnapshotArchive().prune(now()) == (0, 0)
+
+
+@pytest.mark.django_db
+def test_replay_snapshots(feed_server, settings):
+    settings.FEED_REFRESH_COALESCE_WINDOW = 0
+    feed = baker.make(Feed, link=feed_server.add_feed("/feed", entries=4), etag=None)
+    update_feed(feed.id, baker.make(User).id)
+
+    out = StringIO()
+    call_command("replay_snapshots", "--feed", str(feed.id), stdout=out)
+    assert "status=200 entries=4" in out.getvalue()
+
+    out = StringIO()
+    call_command("replay_snapshots", "--body", stdout=out)
+    assert out.getvalue().startswith("<?xml")
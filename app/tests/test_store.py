@@ -0,0 +1,49 @@
+from time import struct_time
+
+from django.utils.timezone import now
+
+from app.store import ContentStore, compact_entry
+
+
+def test_compact_entry():
+    entry = {
+        "id": "test.com/1",
+        "title": "Test",
+        "link": "test.com",
+        "summary": "Summary",
+        "published_parsed": None,
+        "links": [{"href": "test.com"}],
+    }
+    assert compact_entry(entry) == {
+        "id": "test.com/1",
+        "title": "Test",
+        "link": "test.com",
+        "summary": "Summary",
+        "published_parsed": None,
+    }
+
+
+def test_content_store_put_and_pop():
+    published: struct_time = now().timetuple()
+    store = ContentStore()
+    store.put("test.com", "fetch", [{"title": "Test", "published_parsed": published}])
+
+    entries = store.pop("test.com", "fetch")
+
+    assert len(entries) == 1
+    assert entries[0]["title"] == "Test"
+    assert entries[0]["published_parsed"] == tuple(published)
+    assert store.pop("test.com", "fetch") is None
+
+
+def test_content_store_keyed_by_fetch():
+    store = ContentStore()
+    store.put("test.com", "first", [{"title": "First"}])
+    assert store.pop("test.com", "second") is None
+    assert store.pop("test.com", "first")[0]["title"] == "First"
+
+
+def test_content_store_ttl(redis_connection):
+    store = ContentStore(ttl=30)
+    store.put("test.com", "fetch", [])
+    assert 0 < redis_connection.ttl(store.key("test.com", "fetch")) <= 30
@@ -0,0 +1,131 @@
+import io
+import tracemalloc
+
+import feedparser
+import pytest
+from model_bakery import baker
+
+from app.models import Feed, Item
+from app.streaming import ChunkedReader, StreamingFeedParser
+from app.tasks import refresh_feeds, update_feed
+from app.tests.utils import rss_document
+
+ATOM_DOCUMENT = b"""<?xml version="1.0" encoding="utf-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+<title>Atom</title><updated>2020-07-24T10:00:00Z</updated>
+<entry><title>First</title><id>urn:1</id>
+<link rel="edit" href="http://test.com/edit/1"/><link href="http://test.com/1"/>
+<published>2020-07-24T10:00:00+02:00</published>
+<summary type="html">&lt;p onclick="x()"&gt;Summary&lt;/p&gt;</summary></entry>
+<entry><title>Second</title><id>urn:2</id><link href="http://test.com/2"/>
+<published>2020-07-23T10:00:00Z</published>
+<content type="xhtml"><div xmlns="http://www.w3.org/1999/xhtml">
+<p>Content</p></div></content></entry></feed>"""
+
+
+def entries_fields(entries):
+    return [
+        {
+            field: entry.get(field)
+            for field in ("id", "title", "link", "summary", "published_parsed")
+        }
+        for entry in entries
+    ]
+
+
+@pytest.mark.parametrize("document", [rss_document("Rss", 3), ATOM_DOCUMENT])
+def test_streaming_parser_matches_feedparser(document):
+    parser = StreamingFeedParser(chunk_size=16)
+    entries = list(parser.iter_entries(io.BytesIO(document)))
+    parsed = feedparser.parse(document)
+
+    assert entries_fields(entries) == entries_fields(parsed.entries)
+    assert parser.feed["modified_parsed"] == parsed.feed.modified_parsed
+    assert parser.size == len(document)
+
+
+def test_streaming_parser_sanitizes_summary():
+    entries = list(StreamingFeedParser().iter_entries(io.BytesIO(ATOM_DOCUMENT)))
+    assert entries[0]["summary"] == "<p>Summary</p>"
+
+
+def test_chunked_reader_reads_at_most_chunk_size():
+    reader = ChunkedReader(io.BytesIO(b"x" * 10), chunk_size=4)
+    assert [len(reader.read(100)) for _ in range(4)] == [4, 4, 2, 0]
+    assert reader.size == 10
+
+
+def parse_peak(entries):
+    document = rss_document("Large", entries)
+    tracemalloc.start()
+    count = sum(1 for _ in StreamingFeedParser().iter_entries(io.BytesIO(document)))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert count == entries
+    return peak
+
+
+def test_streaming_parser_memory_does_not_grow_with_entries():
+    # The document itself is outside tracemalloc, only the parsing is measured
+    assert parse_peak(10_000) < 2 * parse_peak(1_000)
+
+
+@pytest.mark.django_db
+def test_refresh_feeds_streams_large_feeds(feed_server, settings):
+    settings.FEED_STREAMING_THRESHOLD = 1024
+    feed = baker.make(Feed, link=feed_server.add_feed("/large", entries=50), etag=None)
+
+    stats = refresh_feeds([feed.id])
+
+    feed.refresh_from_db()
+    assert stats.failed == []
+    assert stats.bytes == feed.content_length > 1024
+    assert Item.objects.filter(feed=feed).count() == 50
+
+
+@pytest.mark.django_db(transaction=True)
+def test_update_feed_streams_large_feeds(feed_server, settings, broker, worker):
+    settings.FEED_STREAMING_THRESHOLD = 1024
+    link = feed_server.add_feed("/large", entries=50, etag="new")
+    feed = baker.make(Feed, link=link, etag="old", content_length=2048)
+
+    update_feed.send(feed.id, 1)
+    broker.join(update_feed.queue_name, fail_fast=True)
+    worker.join()
+
+    feed.refresh_from_db()
+    assert feed.etag == "new"
+    assert feed.content_length == len(rss_document("/large", 50))
+    assert Item.objects.filter(feed=feed).count() == 50
+
+
+@pytest.mark.django_db
+def test_update_feed_streaming_not_modified(feed_server, settings):
+    settings.FEED_STREAMING_THRESHOLD = 1024
+    link = feed_server.add_feed("/large", entries=50, etag="same")
+    feed = baker.make(Feed, link=link, etag="same", content_length=2048)
+
+    update_feed(feed.id, 1)
+
+    feed.refresh_from_db()
+    assert feed.fetched_at is not None
+    assert feed.last_build_date is not None
+    assert Item.objects.filter(feed=feed).count() == 0
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("batch", [False, True])
+def test_large_malformed_feed_falls_back_to_feedparser(feed_server, settings, batch):
+    settings.FEED_STREAMING_THRESHOLD = 1024
+    # A bare ampersand is not well-formed xml
+    body = rss_document("/large", 50).replace(b"Summary 1<", b"Summary 1 & 2<")
+    feed = baker.make(Feed, link=feed_server.add_feed("/large", body=body), etag=None)
+
+    if batch:
+        assert refresh_feeds([feed.id]).failed == []
+    else:
+        update_feed(feed.id, 1)
+
+    feed.refresh_from_db()
+    assert feed.content_length == len(body)
+    assert Item.objects.filter(feed=feed).count() == 50
@@ -1,68 +1,82 @@
-from datetime import datetime
+from datetime import timedelta
 from unittest import mock
-from unittest.mock import Mock
 
 import pytest
 from django.contrib.auth.models import User
+from django.utils.http import http_date
 from django.utils.timezone import now
 from freezegun import freeze_time
 from model_bakery import baker
 
+from app.canonical import FeedUrlCache, canonical_url
 from app.exceptions import (
     FollowFeedError,
     ParseEntriesError,
     ParseFeedError,
+    RetryFeedError,
     UpdateFeedError,
 )
+from app.fetch import FetchResult
 from app.models import Feed, Item, Notification, UserFollowFeed
+from app.parsers import ParsedDocument
+from app.singleflight import FeedRefreshFlight
+from app.store import ContentStore
 from app.tasks import follow_feed, parse_entries, parse_feed, update_feed
-
-
-class FeedMock(object):
-    def __init__(self, ttl, title, modified_parsed, **kwargs):
-        self.ttl = ttl
-        self.title = title
-        self.modified_parsed = modified_parsed.timetuple()
+from app.tests.utils import rss_document
+
+
+@pytest.fixture
+def http_client():
+    with mock.patch("app.tasks.get_http_client") as get_http_client:
+        client = get_http_client.return_value
+        client.get.return_value = FetchResult(
+            feed_id=None,
+            url="test.com",
+            status=200,
+            body=b"<rss></rss>",
+            headers={"etag": "test"},
+        )
+        yield client
+
+
+def parsed_document(entries=(), **feed):
+    return ParsedDocument(
+        feed={
+            "title": "Test",
+            "ttl": "60",
+            "modified_parsed": now().timetuple(),
+            "links": [{"rel": "alternate", "href": "test.com"}],
+            **feed,
+        },
+        entries=list(entries),
+    )
 
 
 @freeze_time("2020-07-24")
 @pytest.mark.django_db(transaction=True)
 @mock.patch("app.tasks.parse_entries")
 @mock.patch("app.tasks.follow_feed")
-def test_parse_feed(follow_feed_mock, parse_entries_mock, broker, worker):
+def test_parse_feed(follow_feed_mock, parse_entries_mock, broker, worker, http_client):
     user = baker.make(User)
 
-    with mock.patch("app.tasks.feedparser") as mock_parser:
-        mock_feed_dict = Mock(
-            feed=FeedMock(
-                ttl=60,
-                title="Test",
-                modified_parsed=now(),
-                kwargs={
-                    "title": "Test",
-                    "links": [{"test": "test"}, {"test": "test", "href": "test.com"}],
-                    "ttl": 60,
-                    "link": "la",
-                    "updated": "Fri, 24 Jul 2020 15:38:57 GMT",
-                },
-            ),
-            etag="test",
-            href="test.com",
-            description="test",
-            modified="Fri, 24 Jul 2020 15:38:57 GMT",
-        )
-
-        mock_parser.parse.return_value = mock_feed_dict
+    with mock.patch("app.tasks.parse_document") as parse_document_mock:
+        parse_document_mock.return_value = parsed_document(description="test")
         parse_feed.send("test.com", "test", user.id)
 
         broker.join(parse_feed.queue_name)
         worker.join()
 
-        feed_obj = Feed.objects.get(title=mock_feed_dict.feed.title)
+        feed_obj = Feed.objects.get(title="Test")
 
+        parse_document_mock.assert_called_once_with(b"<rss></rss>", {"etag": "test"})
         follow_feed_mock.send.assert_called_once_with(feed_obj.id, user.id)
-        parse_entries_mock.send.assert_called_once_with("test.com", feed_obj.id)
-        assert Feed.objects.filter(title=mock_feed_dict.feed.title).count() == 1
+        parse_entries_mock.send.assert_called_once_with(
+            "test.com", feed_obj.id, mock.ANY
+        )
+        assert Feed.objects.filter(title="Test").count() == 1
+        assert feed_obj.link == "test.com"
+        assert feed_obj.etag == "test"
+        assert feed_obj.description == "test"
 
 
 @freeze_time("2020-07-24")
@@ -70,52 +84,40 @@ def test_parse_feed(follow_feed_mock, parse_entries_mock, broker, worker):
 @mock.patch("app.tasks.parse_entries")
 @mock.patch("app.tasks.follow_feed")
 def test_parse_feed_already_created(
-    follow_feed_mock, parse_entries_mock, broker, worker
+    follow_feed_mock, parse_entries_mock, broker, worker, http_client
 ):
     user = baker.make(User)
-    baker.make(Feed, title="Test")
-
-    with mock.patch("app.tasks.feedparser") as mock_parser:
-        mock_feed_dict = Mock(
-            feed=FeedMock(
-                ttl=60,
-                title="Test",
-                modified_parsed=datetime.now(),
-                kwargs={
-                    "title": "Test",
-                    "links": [{"test": "test"}, {"test": "test", "href": "test.com"}],
-                    "ttl": 60,
-                    "link": "la",
-                    "updated": "Fri, 24 Jul 2020 15:38:57 GMT",
-                },
-            ),
-            href="test.com",
-            description="",
-            modified="Fri, 24 Jul 2020 15:38:57 GMT",
-        )
+    baker.make(Feed, title="Test", canonical_url="https://test.com/")
 
-        mock_parser.parse.return_value = mock_feed_dict
+    with mock.patch("app.tasks.parse_document") as parse_document_mock:
         parse_feed.send("test.com", "test", user.id)
 
         broker.join(parse_feed.queue_name)
         worker.join()
 
-        feed_obj = Feed.objects.get(title=mock_feed_dict.feed.title)
+        feed_obj = Feed.objects.get(title="Test")
 
         follow_feed_mock.send.assert_called_once_with(feed_obj.id, user.id)
         parse_entries_mock.assert_not_called()
-        assert Feed.objects.filter(title=mock_feed_dict.feed.title).count() == 1
+        http_client.get.assert_not_called()
+        parse_document_mock.assert_not_called()
+        assert Feed.objects.filter(title="Test").count() == 1
 
 
 @pytest.mark.django_db(transaction=True)
 @mock.patch("app.tasks.parse_entries")
 @mock.patch("app.tasks.follow_feed")
-@mock.patch("app.tasks.feedparser")
+@mock.patch("app.tasks.parse_document")
 def test_parse_feed_exception(
-    mock_parser, follow_feed_mock, parse_entries_mock, broker, worker
+    parse_document_mock,
+    follow_feed_mock,
+    parse_entries_mock,
+    broker,
+    worker,
+    http_client,
 ):
     user = baker.make(User)
-    mock_parser.parse.side_effect = Exception("error")
+    parse_document_mock.side_effect = Exception("error")
     with pytest.raises(ParseFeedError):
         parse_feed.send("test.com", "test", user.id)
         broker.join(parse_feed.queue_name, fail_fast=True)
@@ -126,6 +128,87 @@ def test_parse_feed_exception(
     assert Feed.objects.all().count() == 0
 
 
+@pytest.mark.django_db(transaction=True)
+@mock.patch("app.tasks.parse_entries")
+@mock.patch("app.tasks.follow_feed")
+def test_parse_feed_compressed(
+    follow_feed_mock, parse_entries_mock, feed_server, broker, worker
+):
+    user = baker.make(User)
+    url = feed_server.add_feed("/a", etag="a1", encoding="gzip")
+    parse_feed.send(url, "test", user.id)
+    broker.join(parse_feed.queue_name)
+    worker.join()
+
+    feed_obj = Feed.objects.get(title="/a")
+    assert feed_obj.link == url
+    assert feed_obj.etag == "a1"
+    assert "gzip" in request_headers(feed_server)[0]["accept-encoding"]
+
+
+@pytest.mark.django_db(transaction=True)
+@mock.patch("app.tasks.parse_entries")
+@mock.patch("app.tasks.follow_feed")
+def test_parse_feed_identifies_feeds_by_url(
+    follow_feed_mock, parse_entries_mock, feed_server, broker, worker
+):
+    user = baker.make(User)
+    same_title = feed_server.add_feed("/a", body=rss_document("Test", 1))
+    other = feed_server.add_feed("/b", body=rss_document("Test", 1))
+    for url in (same_title, other, other.upper().replace("/B", "/b/")):
+        parse_feed.send(url, "test", user.id)
+        broker.join(parse_feed.queue_name)
+        worker.join()
+
+    assert Feed.objects.filter(title="Test").count() == 2
+    assert [path for path, _ in feed_server.requests] == ["/a", "/b"]
+    assert follow_feed_mock.send.call_count == 3
+    assert FeedUrlCache().get(other) == Feed.objects.get(link=other).id
+
+
+@pytest.mark.django_db(transaction=True)
+@mock.patch("app.tasks.follow_feed")
+def test_parse_feed_fetch_error(follow_feed_mock, feed_server, broker, worker):
+    user = baker.make(User)
+    with pytest.raises(ParseFeedError):
+        parse_feed.send(feed_server.url("/missing"), "test", user.id)
+        broker.join(parse_feed.queue_name, fail_fast=True)
+        worker.join()
+
+    follow_feed_mock.send.assert_not_called()
+    assert Feed.objects.count() == 0
+
+
+@freeze_time("2020-07-24")
+@pytest.mark.django_db(transaction=True)
+@mock.patch("app.tasks.parse_document")
+def test_parse_feed_fetches_known_feed_once(
+    parse_document_mock, broker, worker, http_client
+):
+    users = baker.make(User, _quantity=2)
+    parse_document_mock.return_value = parsed_document(
+        entries=[
+            {
+                "id": "test.com/1",
+                "title": "Test",
+                "link": "imatest.com",
+                "summary": "Mysummary test",
+                "published_parsed": now().timetuple(),
+            }
+        ]
+    )
+
+    for user in users:
+        parse_feed.send("test.com", "test", user.id)
+        broker.join(parse_feed.queue_name)
+        worker.join()
+
+    assert http_client.get.call_count == 1
+    assert parse_document_mock.call_count == 1
+    assert UserFollowFeed.objects.count() == len(users)
+    assert Item.objects.count() == 1
+
+
 @pytest.mark.django_db(transaction=True)
 def test_follow_feed(broker, worker):
     feed = baker.make(Feed)
@@ -157,22 +240,18 @@ def test_follow_feed_user_dont_exist(broker, worker):
 
 @freeze_time("2020-07-24")
 @pytest.mark.django_db(transaction=True)
-@mock.patch("app.tasks.feedparser")
-def test_parse_entries(mock_parser, broker, worker):
-    mock_entries_dict = Mock(
+@mock.patch("app.tasks.parse_document")
+def test_parse_entries(parse_document_mock, broker, worker, http_client):
+    parse_document_mock.return_value = ParsedDocument(
         entries=[
             {
                 "title": "Test",
-                "links": [{"test": "test"}, {"test": "test", "href": "test.com"}],
                 "link": "imatest.com",
-                "ttl": 60,
                 "summary": "Mysummary test",
-                "updated": "Fri, 24 Jul 2020 15:38:57 GMT",
                 "published_parsed": now().timetuple(),
             }
         ]
     )
-    mock_parser.parse.return_value = mock_entries_dict
     feed = baker.make(Feed)
     parse_entries.send("teste.com", feed.id)
     broker.join(parse_entries.queue_name)
@@ -180,10 +259,46 @@ def test_parse_entries(mock_parser, broker, worker):
     assert Item.objects.all().count() == 1
 
 
+@freeze_time("2020-07-24")
+@pytest.mark.django_db(transaction=True)
+@mock.patch("app.tasks.parse_document")
+def test_parse_entries_from_content_store(parse_document_mock, broker, worker):
+    feed = baker.make(Feed)
+    entry = {
+        "id": "teste.com/1",
+        "title": "Test",
+        "link": "imatest.com",
+        "summary": "Mysummary test",
+        "published_parsed": now().timetuple(),
+    }
+    ContentStore().put("teste.com", "fetch", [entry])
+    parse_entries.send("teste.com", feed.id, "fetch")
+    broker.join(parse_entries.queue_name)
+    worker.join()
+    parse_document_mock.assert_not_called()
+    assert Item.objects.filter(feed=feed, link="imatest.com").count() == 1
+    assert ContentStore().pop("teste.com", "fetch") is None
+
+
+@freeze_time("2020-07-24")
 @pytest.mark.django_db(transaction=True)
-@mock.patch("app.tasks.feedparser")
-def test_parse_entries_exception(mock_parser, broker, worker):
-    mock_parser.parse.side_effect = Exception("error")
+@mock.patch("app.tasks.parse_document")
+def test_parse_entries_content_store_expired(
+    parse_document_mock, broker, worker, http_client
+):
+    parse_document_mock.return_value = ParsedDocument()
+    feed = baker.make(Feed)
+    parse_entries.send("teste.com", feed.id, "expired")
+    broker.join(parse_entries.queue_name)
+    worker.join()
+    http_client.get.assert_called_once_with("teste.com")
+    parse_document_mock.assert_called_once_with(b"<rss></rss>", {"etag": "test"})
+
+
+@pytest.mark.django_db(transaction=True)
+@mock.patch("app.tasks.parse_document")
+def test_parse_entries_exception(parse_document_mock, broker, worker, http_client):
+    parse_document_mock.side_effect = Exception("error")
     feed = baker.make(Feed)
     with pytest.raises(ParseEntriesError):
         parse_entries.send("teste.com", feed.id)
@@ -191,93 +306,46 @@ def test_parse_entries_exception(mock_parser, broker, worker):
         worker.join()
 
 
-@freeze_time("2020-07-24", tick=True)
+def request_headers(feed_server):
+    return [
+        {name.lower(): value for name, value in headers.items()}
+        for _, headers in feed_server.requests
+    ]
+
+
 @pytest.mark.django_db(transaction=True)
-@mock.patch("app.tasks.feedparser")
-def test_update_feed_using_modified(mock_parser, broker, worker):
+def test_update_feed_using_modified(feed_server, broker, worker):
     user = baker.make(User)
-    feed = baker.make(Feed, last_build_date=now, etag=None)
-    baker.make(Item, feed=feed, _quantity=10)
-    mock_entries_dict = Mock(
-        feed=FeedMock(
-            ttl=60,
-            title="Test",
-            modified_parsed=datetime.now(),
-            kwargs={
-                "title": "Test",
-                "links": [{"test": "test"}, {"test": "test", "href": "test.com"}],
-                "ttl": 60,
-                "link": "la",
-                "updated": "Fri, 24 Jul 2020 15:38:57 GMT",
-            },
-        ),
-        status=301,
-        etag="test",
-        modified="Fri, 24 Jul 2020 15:38:57 GMT",
-        modified_parsed=datetime.now().timetuple(),
-        entries=[
-            {
-                "title": "Test",
-                "links": [{"test": "test"}, {"test": "test", "href": "test.com"}],
-                "link": "imatest.com",
-                "ttl": 60,
-                "summary": "Mysummary test",
-                "updated": "Fri, 24 Jul 2020 15:38:57 GMT",
-                "published_parsed": now().timetuple(),
-            }
-        ],
+    feed = baker.make(
+        Feed,
+        link=feed_server.add_feed("/feed", entries=1),
+        last_build_date=now,
+        etag=None,
     )
-    mock_parser.parse.return_value = mock_entries_dict
+    baker.make(Item, feed=feed, _quantity=10)
     update_feed.send(feed.id, user.id)
     broker.join(update_feed.queue_name)
     worker.join()
-    mock_parser.parse.assert_called_once_with(
-        f"{feed.link}", modified="Fri, 24 Jul 2020 00:00:00 UTC"
+    headers = request_headers(feed_server)
+    assert len(headers) == 1
+    assert headers[0]["if-modified-since"] == http_date(
+        feed.last_build_date.timestamp()
     )
+    assert "if-none-match" not in headers[0]
     assert Feed.objects.get(id=feed.id).last_build_date != feed.last_build_date
     assert Item.objects.all().count() == 11
 
 
 @pytest.mark.django_db(transaction=True)
-@mock.patch("app.tasks.feedparser")
-def test_update_feed_using_etag(mock_parser, broker, worker):
+def test_update_feed_using_etag(feed_server, broker, worker):
     user = baker.make(User)
-    feed = baker.make(Feed, last_build_date=now, etag="test")
+    link = feed_server.add_feed("/feed", entries=1, etag="new")
+    feed = baker.make(Feed, link=link, last_build_date=now, etag="test")
     baker.make(Item, feed=feed, _quantity=10)
-    mock_entries_dict = Mock(
-        feed=FeedMock(
-            ttl=60,
-            title="Test",
-            modified_parsed=datetime.now(),
-            kwargs={
-                "title": "Test",
-                "links": [{"test": "test"}, {"test": "test", "href": "test.com"}],
-                "ttl": 60,
-                "link": "la",
-                "updated": "Fri, 24 Jul 2020 15:38:57 GMT",
-            },
-        ),
-        status=301,
-        etag="new",
-        modified="Fri, 24 Jul 2020 15:38:57 GMT",
-        modified_parsed=datetime.now().timetuple(),
-        entries=[
-            {
-                "title": "Test",
-                "links": [{"test": "test"}, {"test": "test", "href": "test.com"}],
-                "link": "imatest.com",
-                "ttl": 60,
-                "summary": "Mysummary test",
-                "updated": "Fri, 24 Jul 2020 15:38:57 GMT",
-                "published_parsed": now().timetuple(),
-            }
-        ],
-    )
-    mock_parser.parse.return_value = mock_entries_dict
     update_feed.send(feed.id, user.id)
     broker.join(update_feed.queue_name)
     worker.join()
-    mock_parser.parse.assert_called_once_with(f"{feed.link}", etag=feed.etag)
+    assert request_headers(feed_server)[0]["if-none-match"] == "test"
     new_feed = Feed.objects.get(id=feed.id)
     assert new_feed.last_build_date != feed.last_build_date
     assert new_feed.etag == "new"
@@ -285,12 +353,10 @@ def test_update_feed_using_etag(mock_parser, broker, worker):
 
 
 @pytest.mark.django_db(transaction=True)
-@mock.patch("app.tasks.feedparser")
-def test_update_feed_exception(mock_parser, broker, worker):
+def test_update_feed_exception(feed_server, broker, worker):
     user = baker.make(User)
-    feed = baker.make(Feed, last_build_date=now)
+    feed = baker.make(Feed, link=feed_server.url("/missing"), last_build_date=now)
     baker.make(Item, feed=feed, _quantity=10)
-    mock_parser.parse.side_effect = Exception
     with pytest.raises(UpdateFeedError):
         update_feed.send(feed.id, user.id)
         broker.join(update_feed.queue_name, fail_fast=True)
@@ -299,17 +365,137 @@ def test_update_feed_exception(mock_parser, broker, worker):
 
 
 @pytest.mark.django_db(transaction=True)
-@mock.patch("app.tasks.feedparser")
-def test_update_feed_status_is_304(mock_parser, broker, worker):
+def test_update_feed_status_is_304(feed_server, broker, worker):
     user = baker.make(User)
-    feed = baker.make(Feed, last_build_date=now)
+    link = feed_server.add_feed("/feed", etag="same")
+    feed = baker.make(Feed, link=link, last_build_date=now, etag="same")
     baker.make(Item, feed=feed, _quantity=10)
-    mock_entries_dict = Mock(
-        feed={}, status=304, modified="Fri, 24 Jul 2020 15:38:57 GMT", entries=[]
-    )
-    mock_parser.parse.return_value = mock_entries_dict
     update_feed.send(feed.id, user.id)
     broker.join(update_feed.queue_name)
     worker.join()
     assert Notification.objects.all().count() == 0
     assert Item.objects.all().count() == 10
+    assert Feed.objects.get(id=feed.id).fetched_at is not None
+
+
+@pytest.mark.django_db(transaction=True)
+def test_update_feed_is_coalesced_across_users(feed_server, broker, worker):
+    users = baker.make(User, _quantity=3)
+    link = feed_server.add_feed("/feed", etag="same")
+    feed = baker.make(Feed, link=link, last_build_date=now, etag="same")
+    for user in users:
+        update_feed.send(feed.id, user.id)
+    broker.join(update_feed.queue_name)
+    worker.join()
+    assert len(feed_server.requests) == 1
+
+
+@pytest.mark.django_db(transaction=True)
+@mock.patch("app.tasks.parse_document")
+def test_update_feed_exception_notifies_waiting_users(
+    mock_parse, feed_server, broker, worker
+):
+    user, waiting = baker.make(User, _quantity=2)
+    feed = baker.make(Feed, link=feed_server.add_feed("/feed"), last_build_date=now)
+
+    def parse(*args, **kwargs):
+        FeedRefreshFlight(feed.id).begin(waiting.id)
+        raise Exception
+
+    mock_parse.side_effect = parse
+    with pytest.raises(UpdateFeedError):
+        update_feed.send(feed.id, user.id)
+        broker.join(update_feed.queue_name, fail_fast=True)
+        worker.join()
+    assert set(Notification.objects.values_list("user_id", flat=True)) == {
+        user.id,
+        waiting.id,
+    }
+
+
+@pytest.mark.django_db(transaction=True)
+@mock.patch("app.tasks.MAX_RETRIES", 2)
+def test_update_feed_not_found_is_not_retried(feed_server, broker, worker):
+    user = baker.make(User)
+    feed = baker.make(Feed, link=feed_server.url("/missing"), last_build_date=now)
+    with pytest.raises(UpdateFeedError) as error:
+        update_feed.send(feed.id, user.id)
+        broker.join(update_feed.queue_name, fail_fast=True)
+        worker.join()
+    assert not isinstance(error.value, RetryFeedError)
+    assert len(feed_server.requests) == 1
+    feed.refresh_from_db()
+    assert feed.failure_count == 1
+    assert feed.last_error == "HTTP 404"
+
+
+@pytest.mark.django_db(transaction=True)
+@mock.patch("app.tasks.MAX_RETRIES", 1)
+def test_update_feed_retries_after_retry_after(feed_server, broker, worker, settings):
+    settings.FEED_REFRESH_COALESCE_WINDOW = 0
+    user = baker.make(User)
+    link = feed_server.add_feed("/feed", status=503, headers={"Retry-After": "1"})
+    feed = baker.make(Feed, link=link, last_build_date=now)
+    with pytest.raises(RetryFeedError):
+        update_feed.send(feed.id, user.id)
+        broker.join(update_feed.queue_name, fail_fast=True)
+        worker.join()
+    assert len(feed_server.requests) == 2
+    assert Feed.objects.get(id=feed.id).failure_count == 2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_update_feed_skips_quarantined_feed(feed_server, broker, worker):
+    user = baker.make(User)
+    feed = baker.make(
+        Feed,
+        link=feed_server.add_feed("/feed"),
+        last_build_date=now,
+        failure_count=5,
+        quarantined_until=now() + timedelta(hours=1),
+    )
+    update_feed.send(feed.id, user.id)
+    broker.join(update_feed.queue_name)
+    worker.join()
+    assert feed_server.requests == []
+    assert Notification.objects.filter(user=user).count() == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_update_feed_resets_failures(feed_server, broker, worker):
+    user = baker.make(User)
+    feed = baker.make(
+        Feed,
+        link=feed_server.add_feed("/feed"),
+        last_build_date=now,
+        failure_count=3,
+        last_error="HTTP 503",
+    )
+    update_feed.send(feed.id, user.id)
+    broker.join(update_feed.queue_name)
+    worker.join()
+    feed.refresh_from_db()
+    assert feed.failure_count == 0
+    assert feed.last_error is None
+
+
+@pytest.mark.django_db(transaction=True)
+@mock.patch("app.tasks.parse_entries")
+@mock.patch("app.tasks.follow_feed")
+def test_parse_feed_follows_redirects(
+    follow_feed_mock, parse_entries_mock, feed_server, broker, worker
+):
+    user = baker.make(User)
+    url = feed_server.add_feed("/feed")
+    old = feed_server.add_feed("/old", status=301, body=b"", headers={"Location": url})
+    baker.make(Feed, link=url, canonical_url=canonical_url(url))
+
+    for _ in range(2):
+        parse_feed.send(old, "test", user.id)
+        broker.join(parse_feed.queue_name)
+        worker.join()
+
+    assert Feed.objects.count() == 1
+    assert [path for path, _ in feed_server.requests] == ["/old", "/feed"]
+    assert follow_feed_mock.send.call_count == 2
+    parse_entries_mock.send.assert_not_called()
@@ -0,0 +1,126 @@
+import hmac
+from datetime import timedelta
+from unittest import mock
+
+import pytest
+from django.contrib.auth.models import User
+from django.utils.timezone import now
+from model_bakery import baker
+
+from app.exceptions import SubscribeFeedError
+from app.models import Feed, HubSubscription, Item
+from app.models.hub_subscription import HubSubscriptionState
+from app.tasks import ingest_push, parse_feed, subscribe_feed
+from app.tests.utils import rss_document
+from app.websub import due_renewals, find_hub, verify_signature
+
+
+def hub_document(hub: str, topic: str) -> bytes:
+    return (
+        f'<?xml version="1.0" encoding="utf-8"?>'
+        f'<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom"><channel>'
+        f"<title>Pushed</title><link>http://test.com</link>"
+        f'<atom:link rel="hub" href="{hub}"/><atom:link rel="self" href="{topic}"/>'
+        f"<lastBuildDate>Fri, 24 Jul 2020 15:38:57 GMT</lastBuildDate>"
+        f"</channel></rss>"
+    ).encode()
+
+
+def test_find_hub():
+    headers = {
+        "link": '<https://hub.test/>; rel="hub", <https://test.com/feed>; rel="self"'
+    }
+    assert find_hub(headers, [], "http://test.com") == (
+        "https://hub.test/",
+        "https://test.com/feed",
+    )
+    links = [{"rel": "alternate", "href": "x"}, {"rel": "hub", "href": "https://h/"}]
+    assert find_hub({}, links, "http://test.com") == ("https://h/", "http://test.com")
+    assert find_hub({"link": "<https://test.com/>; rel=self"}, [], "a") is None
+
+
+def test_verify_signature():
+    digest = hmac.new(b"secret", b"body", "sha1").hexdigest()
+    assert verify_signature("secret", f"sha1={digest}", b"body")
+    assert not verify_signature("other", f"sha1={digest}", b"body")
+    assert not verify_signature("secret", "md5=abc", b"body")
+    assert not verify_signature("secret", None, b"body")
+
+
+@pytest.mark.django_db
+def test_subscribe_and_ingest_pushed_content(feed_server, websub_hub, client):
+    user = baker.make(User)
+    topic = "https://test.com/feed"
+    url = feed_server.add_feed("/a", body=hub_document(websub_hub.url, topic))
+
+    parse_feed(url, "", user.id)
+    subscription = HubSubscription.objects.get()
+    assert subscription.hub == websub_hub.url
+    assert subscription.state == HubSubscriptionState.pending
+
+    subscribe_feed(subscription.id)
+    request = websub_hub.subscriptions[0]
+    assert request["hub.mode"] == "subscribe"
+    assert request["hub.topic"] == topic
+    assert request["hub.callback"] == f"http://testserver/websub/{subscription.token}/"
+
+    response = websub_hub.verify(client, lease_seconds="3600")
+    assert response.status_code == 200
+    assert response.content == b"challenge"
+    subscription.refresh_from_db()
+    assert subscription.state == HubSubscriptionState.active
+    assert subscription.lease_expires_at > now() + timedelta(seconds=3500)
+
+    with mock.patch("app.views.websub.ingest_push") as ingest_push_mock:
+        response = websub_hub.publish(client, rss_document("Pushed", 2))
+    assert response.status_code == 202
+    ingest_push(*ingest_push_mock.send.call_args[0])
+    assert Item.objects.filter(feed=subscription.feed).count() == 2
+    assert Feed.objects.get(id=subscription.feed_id).fetched_at is not None
+
+
+@pytest.mark.django_db
+def test_parse_feed_without_callback_url(feed_server, websub_hub, settings):
+    settings.WEBSUB_CALLBACK_URL = None
+    url = feed_server.add_feed("/a", body=hub_document(websub_hub.url, "t"))
+    parse_feed(url, "", baker.make(User).id)
+    assert not HubSubscription.objects.exists()
+
+
+@pytest.mark.django_db
+def test_subscribe_feed_refused(websub_hub):
+    websub_hub.status = 400
+    subscription = baker.make(HubSubscription, hub=websub_hub.url)
+    with pytest.raises(SubscribeFeedError):
+        subscribe_feed(subscription.id)
+    subscription.refresh_from_db()
+    assert subscription.requested_at is not None
+
+
+@pytest.mark.django_db
+def test_due_renewals(settings):
+    settings.WEBSUB_RENEW_BEFORE = 3600
+    settings.WEBSUB_RENEW_RETRY = 600
+    at = now()
+    expiring = baker.make(
+        HubSubscription,
+        state=HubSubscriptionState.active,
+        lease_expires_at=at + timedelta(minutes=30),
+    )
+    baker.make(
+        HubSubscription,
+        state=HubSubscriptionState.active,
+        lease_expires_at=at + timedelta(minutes=30),
+        requested_at=at - timedelta(minutes=5),
+    )
+    baker.make(
+        HubSubscription,
+        state=HubSubscriptionState.active,
+        lease_expires_at=at + timedelta(days=2),
+    )
+    baker.make(
+        HubSubscription,
+        state=HubSubscriptionState.denied,
+        lease_expires_at=at + timedelta(minutes=30),
+    )
+    assert list(due_renewals(at)) == [expiring.id]
@@ -0,0 +1,214 @@
+import gzip
+import hmac
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Union
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+from django.db import connection
+from django.db.models import QuerySet
+
+
+def rss_document(title: str, entries: int, link: str = "http://test.com") -> bytes:
+    items = "".join(
+        f"<item><title>{title} {i}</title><link>{link}/{i}</link>"
+        f"<guid>{link}/{i}</guid><description>Summary {i}</description>"
+        f"<pubDate>Fri, 24 Jul 2020 15:38:57 GMT</pubDate></item>"
+        for i in range(entries)
+    )
+    return (
+        f'<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel>'
+        f"<title>{title}</title><link>{link}</link><description>Test</description>"
+        f"<lastBuildDate>Fri, 24 Jul 2020 15:38:57 GMT</lastBuildDate><ttl>60</ttl>"
+        f"{items}</channel></rss>"
+    ).encode()
+
+
+def _postgresql_seq_scans(plan: Dict) -> Iterator[str]:
+    if plan.get("Node Type") == "Seq Scan":
+        yield plan["Relation Name"]
+    for child in plan.get("Plans", []):
+        yield from _postgresql_seq_scans(child)
+
+
+def seq_scans(query: Union[QuerySet, str]) -> List[str]:
+    """Function responsible for telling the tables that a query reads whole, from
+    its `EXPLAIN`. On PostgreSQL sequential scans are disabled for the query, so
+    a table is only scanned if no index can serve the query, whatever the size of
+    the seeded dataset. On SQLite, whose planner assumes large tables, a table
+    scanned without an index is reported. Other databases skip the test.
+
+    Parameters
+    ----------
+    query: QuerySet or str
+        A queryset, or the SQL of a query captured with its parameters
+
+    Returns
+    -------
+    List of the tables read with a sequential scan
+    """
+    vendor = connection.vendor
+    if vendor not in ("postgresql", "sqlite"):
+        pytest.skip(f"Query plans are not checked on {vendor}")
+    if isinstance(query, QuerySet):
+        sql, params = query.query.sql_with_params()
+    else:
+        sql, params = query, None
+    with connection.cursor() as cursor:
+        if vendor == "postgresql":
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+            plan = json.loads(plan) if isinstance(plan, str) else plan
+            return list(_postgresql_seq_scans(plan[0]["Plan"]))
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        details = [row[-1] for row in cursor.fetchall()]
+    scans = []
+    for detail in details:
+        # "SCAN TABLE app_item" on older versions, "SCAN app_item" on newer ones
+        words = detail.replace("SCAN TABLE ", "SCAN ").split()
+        if words and words[0] == "SCAN" and "USING" not in words:
+            scans.append(words[1])
+    return scans
+
+
+class FeedServer:
+    """Local HTTP stand-in serving RSS documents, honouring `If-None-Match`.
+    Documents added with an `encoding` are sent compressed with it.
+
+    """
+
+    def __init__(self):
+        self.feeds = {}
+        self.requests = []
+        self.delay = 0.0
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        self.httpd.daemon_threads = True
+
+    def add_feed(
+        self,
+        path,
+        entries=3,
+        etag=None,
+        status=200,
+        body=None,
+        encoding=None,
+        headers=None,
+    ):
+        body = body if body is not None else rss_document(path, entries)
+        if encoding == "gzip":
+            body = gzip.compress(body)
+        elif encoding == "deflate":
+            body = zlib.compress(body)
+        self.feeds[path] = (status, etag, body, encoding, headers or {})
+        return self.url(path)
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.httpd.server_port}{path}"
+
+    def handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are separate writes, that would wait on delayed acks
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                with server.lock:
+                    server.active += 1
+                    server.max_active = max(server.max_active, server.active)
+                    server.requests.append((self.path, dict(self.headers)))
+                try:
+                    time.sleep(server.delay)
+                    status, etag, body, encoding, headers = server.feeds.get(
+                        self.path, (404, None, b"", None, {})
+                    )
+                    if etag and self.headers.get("If-None-Match") == etag:
+                        status, body = 304, b""
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/rss+xml")
+                    self.send_header("Content-Length", str(len(body)))
+                    if etag:
+                        self.send_header("ETag", etag)
+                    if encoding:
+                        self.send_header("Content-Encoding", encoding)
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with server.lock:
+                        server.active -= 1
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+class WebSubHub:
+    """Local WebSub hub stand-in, accepting subscription requests and driving
+    the verification and content distribution of the callbacks through
+    the Django test client.
+
+    """
+
+    def __init__(self):
+        self.subscriptions = []
+        self.status = 202
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_port}/"
+
+    def handler(self):
+        hub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                form = parse_qs(self.rfile.read(length).decode())
+                hub.subscriptions.append(
+                    {name: value[0] for name, value in form.items()}
+                )
+                self.send_response(hub.status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def verify(self, client, lease_seconds=None, topic=None):
+        subscription = self.subscriptions[-1]
+        params = {
+            "hub.mode": "subscribe",
+            "hub.topic": topic or subscription["hub.topic"],
+            "hub.challenge": "challenge",
+            "hub.lease_seconds": lease_seconds or subscription["hub.lease_seconds"],
+        }
+        return client.get(urlsplit(subscription["hub.callback"]).path, params)
+
+    def publish(self, client, body, secret=None):
+        subscription = self.subscriptions[-1]
+        secret = secret or subscription["hub.secret"]
+        signature = hmac.new(secret.encode(), body, "sha256").hexdigest()
+        return client.post(
+            urlsplit(subscription["hub.callback"]).path,
+            body,
+            content_type="application/rss+xml",
+            HTTP_X_HUB_SIGNATURE=f"sha256={signature}",
+        )
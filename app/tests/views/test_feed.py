@@ -1,3 +1,4 @@
+from datetime import timedelta
 from unittest import mock
 
 import pytest
@@ -7,7 +8,9 @@ from django.utils.timezone import now
 from freezegun import freeze_time
 from model_bakery import baker
 
-from app.models import Feed, Notification, UserFollowFeed
+from app.jobs import RefreshJob
+from app.models import Feed, Item, Notification, UnreadCounter, UserFollowFeed
+from app.tasks import follow_feed, parse_entries, parse_feed
 
 
 def test_feed_list_view_user_not_logged(client):
@@ -36,7 +39,7 @@ def test_feed_list_view(signal_mock, logged_client):
     response = logged_client.get(resolve_url("list_feed"))
     assert response.status_code == 200
     assert response.resolver_match.url_name == "list_feed"
-    assert response.context["feeds_followed"].count() == 1
+    assert len(response.context["feeds_followed"]) == 1
     assert response.context["feeds_unfollowed"].count() == 1
     assert [m.message for m in list(response.context["messages"])] == []
     signal_mock.send.assert_not_called()
@@ -55,7 +58,7 @@ def test_feed_list_view_notification(signal_mock, logged_client):
     response = logged_client.get(resolve_url("list_feed"))
     assert response.status_code == 200
     assert response.resolver_match.url_name == "list_feed"
-    assert response.context["feeds_followed"].count() == 1
+    assert len(response.context["feeds_followed"]) == 1
     assert response.context["feeds_unfollowed"].count() == 1
     assert [m.message for m in list(response.context["messages"])] == ["test"]
     signal_mock.send.assert_called()
@@ -91,6 +94,85 @@ def test_mark_as_kind_view_kind_read(update_feed_mock, logged_client):
     update_feed_mock.send.assert_called_once_with(feed.id, user_id_)
 
 
+def test_update_all_view_user_not_logged(client):
+    response = client.get(resolve_url("update_all"))
+    assert response.status_code == 302
+    assert response.url == "/accounts/login/?next=/feed/update/all"
+
+
+def test_update_all_view_wrong_method(logged_client):
+    response = logged_client.get(resolve_url("update_all"))
+    assert response.json() == {"error": "An unexpected error occurred"}
+    assert response.status_code == 500
+
+
+@mock.patch("app.views.feed.group")
+@mock.patch("app.views.feed.update_feeds_batch")
+def test_update_all_view(update_feeds_batch_mock, group_mock, logged_client, settings):
+    settings.UPDATE_ALL_BATCH_SIZE = 2
+    settings.FEED_FRESHNESS_WINDOW = 600
+    user_id_ = int(logged_client.session._session["_auth_user_id"])
+    stale = baker.make(Feed, fetched_at=now() - timedelta(hours=1), _quantity=2)
+    never = baker.make(Feed, fetched_at=None)
+    fresh = baker.make(Feed, fetched_at=now() - timedelta(minutes=1))
+    hot = baker.make(Feed, fetched_at=now() - timedelta(minutes=3), fetch_interval=60)
+    unfollowed = baker.make(Feed, fetched_at=None)
+    for feed in stale + [never, fresh, hot]:
+        baker.make(UserFollowFeed, feed=feed, user_id=user_id_, disabled_at=None)
+    baker.make(UserFollowFeed, feed=unfollowed, user_id=user_id_, disabled_at=now())
+    baker.make(UserFollowFeed, feed=baker.make(Feed, fetched_at=None))
+
+    response = logged_client.post(resolve_url("update_all"))
+
+    assert response.status_code == 200
+    job_id = response.json()["job_id"]
+    assert response.json()["message"] == "4 feeds were sent to update."
+    sent = [call[0] for call in update_feeds_batch_mock.message.call_args_list]
+    assert len(sent) == 2
+    assert sorted(sum((list(args[0]) for args in sent), [])) == sorted(
+        [stale[0].id, stale[1].id, never.id, hot.id]
+    )
+    assert all(args[1:] == (user_id_, job_id) for args in sent)
+    group_mock.return_value.run.assert_called_once()
+    progress = RefreshJob(job_id).progress()
+    assert progress["total"] == 4
+    assert progress["skipped"] == 1
+
+
+@mock.patch("app.views.feed.group")
+def test_update_all_view_no_feeds(group_mock, logged_client):
+    response = logged_client.post(resolve_url("update_all"))
+    assert response.status_code == 200
+    assert response.json()["message"] == "0 feeds were sent to update."
+    assert RefreshJob(response.json()["job_id"]).progress()["finished"]
+
+
+def test_update_status_view(logged_client):
+    user_id_ = int(logged_client.session._session["_auth_user_id"])
+    job = RefreshJob.create(user_id=user_id_, total=3)
+    job.add(done=1, failed=1)
+    response = logged_client.get(resolve_url("update_status", job_id=job.job_id))
+    assert response.status_code == 200
+    assert response.json() == {
+        "total": 3,
+        "skipped": 0,
+        "done": 1,
+        "failed": 1,
+        "finished": False,
+    }
+
+
+def test_update_status_view_other_user(logged_client):
+    job = RefreshJob.create(user_id=-1, total=3)
+    response = logged_client.get(resolve_url("update_status", job_id=job.job_id))
+    assert response.status_code == 404
+
+
+def test_update_status_view_job_dont_exist(logged_client):
+    response = logged_client.get(resolve_url("update_status", job_id="missing"))
+    assert response.status_code == 404
+
+
 def test_add_feed_view_unlogged_user(client):
     response = client.get(resolve_url("add_feed"))
     assert response.status_code == 302
@@ -188,3 +270,66 @@ def test_unfollow_feed_view(logged_client):
         UserFollowFeed.objects.get(feed_id=ufeed.feed_id, user_id=user_id_).disabled_at
         == timezone.now()
     )
+
+
+@pytest.mark.django_db
+@mock.patch("app.views.feed.parse_feed")
+def test_add_feed_view_known_feed(
+    parse_feed_mock, logged_client, django_assert_num_queries
+):
+    feed = baker.make(Feed, canonical_url="https://test.com/")
+    user_id_ = int(logged_client.session._session["_auth_user_id"])
+    # The follow is enabled again, or created
+    with django_assert_num_queries(5):
+        response = logged_client.post(
+            resolve_url("add_feed"), data={"url": "http://test.com/"}
+        )
+    assert response.status_code == 302
+    assert UserFollowFeed.objects.filter(feed=feed, user_id=user_id_).exists()
+    parse_feed_mock.send.assert_not_called()
+
+
+@pytest.mark.django_db
+@mock.patch("app.views.feed.parse_feed")
+def test_add_feed_view_known_feed_followed_again(parse_feed_mock, logged_client):
+    feed = baker.make(Feed, canonical_url="https://test.com/")
+    user_id_ = int(logged_client.session._session["_auth_user_id"])
+    baker.make(UserFollowFeed, feed=feed, user_id=user_id_, disabled_at=now())
+    for _ in range(2):
+        logged_client.post(resolve_url("add_feed"), data={"url": "http://test.com/"})
+    follow = UserFollowFeed.objects.get(feed=feed, user_id=user_id_)
+    assert follow.disabled_at is None
+
+
+def test_add_feed_tasks_queue(settings):
+    assert parse_feed.queue_name == settings.ADD_FEED_QUEUE
+    assert follow_feed.queue_name == settings.ADD_FEED_QUEUE
+    assert parse_entries.queue_name == settings.ADD_FEED_QUEUE
+
+
+@pytest.mark.django_db
+def test_feed_list_view_unread_count(logged_client):
+    feed = baker.make(Feed)
+    user_id_ = int(logged_client.session._session["_auth_user_id"])
+    baker.make(UserFollowFeed, feed_id=feed.id, user_id=user_id_)
+    items = baker.make(Item, feed=feed, _quantity=3)
+    logged_client.post(
+        resolve_url("mark_item"), data={"item_id": items[0].id, "kind": "read"}
+    )
+    response = logged_client.get(resolve_url("list_feed"))
+    assert [feed.unread_count for feed in response.context["feeds_followed"]] == [2]
+
+
+@pytest.mark.django_db
+def test_feed_list_view_reads_counters(logged_client):
+    user_id_ = int(logged_client.session._session["_auth_user_id"])
+    feeds = baker.make(Feed, _quantity=2)
+    for feed in feeds:
+        baker.make(UserFollowFeed, feed_id=feed.id, user_id=user_id_)
+    baker.make(Item, feed=feeds[1], _quantity=3)
+    baker.make(UnreadCounter, user_id=user_id_, feed=feeds[0], unread=42)
+
+    response = logged_client.get(resolve_url("list_feed"))
+    counts = {feed.id: feed.unread_count for feed in response.context["feeds_followed"]}
+    assert counts == {feeds[0].id: 42, feeds[1].id: 3}
+    assert UnreadCounter.objects.get(user_id=user_id_, feed=feeds[1]).unread == 3
@@ -1,7 +1,14 @@
+from datetime import timedelta
+
 import pytest
+from django.contrib.auth.models import User
+from django.db import connection
 from django.shortcuts import resolve_url
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
 from model_bakery import baker
 
+from app.item_state import mark
 from app.models import Feed, Item, UserRelItem
 from app.models.user_rel_item import UserRelItemKind
 
@@ -28,7 +35,7 @@ def test_item_list_view(logged_client):
     response = logged_client.get(resolve_url("list_item", feed_id=feed.id))
     assert response.status_code == 200
     assert response.resolver_match.url_name == "list_item"
-    assert response.context["items"].count() == 1
+    assert len(response.context["items"]) == 1
     assert response.context["feed"].id == feed.id
 
 
@@ -37,7 +44,7 @@ def test_item_list_view_items_empty(logged_client):
     response = logged_client.get(resolve_url("list_item", feed_id=feed.id))
     assert response.status_code == 200
     assert response.resolver_match.url_name == "list_item"
-    assert response.context["items"].count() == 0
+    assert len(response.context["items"]) == 0
     assert response.context["feed"].id == feed.id
 
 
@@ -175,3 +182,183 @@ def test_add_comment_view(logged_client):
             user_id=user_id_, item_id=item.id, kind=UserRelItemKind.comment
         ).count()
     )
+
+
+def test_item_list_view_shows_excerpt(logged_client):
+    feed = baker.make(Feed)
+    item = baker.make(
+        Item,
+        feed_id=feed.id,
+        description="<p>Full description</p>",
+        excerpt="<p>Full…</p>",
+        truncated=True,
+        preview="Full…",
+    )
+    short = baker.make(
+        Item,
+        feed_id=feed.id,
+        description="<p>Short</p>",
+        excerpt="<p>Short</p>",
+        truncated=False,
+        preview="Short",
+    )
+    response = logged_client.get(resolve_url("list_item", feed_id=feed.id))
+    content = response.content.decode()
+    assert "<p>Full…</p>" in content
+    assert "Full description" not in content
+    assert resolve_url("item_body", item.id) in content
+    assert resolve_url("item_body", short.id) not in content
+    assert "description" in response.context["items"][0].get_deferred_fields()
+
+
+def test_item_body_view(logged_client):
+    item = baker.make(Item, description="<p>Full description</p>")
+    response = logged_client.get(resolve_url("item_body", item.id))
+    assert response.json() == {"description": "<p>Full description</p>"}
+    assert logged_client.get(resolve_url("item_body", 789456)).status_code == 404
+
+
+def test_item_list_view_paginates(logged_client, settings):
+    settings.ITEM_PAGE_SIZE = 2
+    feed = baker.make(Feed)
+    published_at = now()
+    # Two items share a publication date, they are ordered by id
+    items = [
+        baker.make(
+            Item,
+            feed=feed,
+            published_at=published_at - timedelta(hours=hours),
+            truncated=True,
+        )
+        for hours in (0, 1, 1, 2, 3)
+    ]
+    expected = [items[0].id, items[2].id, items[1].id, items[3].id, items[4].id]
+
+    response = logged_client.get(resolve_url("list_item", feed_id=feed.id))
+    pages = [[item.id for item in response.context["items"]]]
+    next_url = response.context["next_url"]
+    while next_url:
+        response = logged_client.get(next_url)
+        assert response.status_code == 200
+        pages.append([item.id for item in response.context["items"]])
+        assert resolve_url("item_body", pages[-1][0]) in response.json()["html"]
+        next_url = response.json()["next"]
+
+    assert pages == [expected[:2], expected[2:4], expected[4:]]
+
+
+def test_item_list_view_last_page(logged_client, settings):
+    settings.ITEM_PAGE_SIZE = 2
+    feed = baker.make(Feed)
+    baker.make(Item, feed=feed, _quantity=2)
+    response = logged_client.get(resolve_url("list_item", feed_id=feed.id))
+    assert response.context["next_url"] is None
+    assert 'id="more"' not in response.content.decode()
+
+
+def test_item_page_view_invalid_cursor(logged_client):
+    feed = baker.make(Feed)
+    response = logged_client.get(
+        resolve_url("item_page", feed_id=feed.id), {"cursor": "invalid"}
+    )
+    assert response.status_code == 400
+    assert "Invalid cursor" in response.json()["error"]
+
+
+def test_item_page_view_user_not_logged(client):
+    response = client.get(resolve_url("item_page", feed_id=2))
+    assert response.status_code == 302
+
+
+def test_item_list_view_user_state(logged_client):
+    user_id_ = int(logged_client.session._session["_auth_user_id"])
+    feed = baker.make(Feed)
+    read, favorite, commented = baker.make(Item, feed=feed, _quantity=3)
+    for item, kind in [
+        (read, "read"),
+        (read, "favorite"),
+        (read, "unfavorite"),
+        (favorite, "favorite"),
+    ]:
+        logged_client.post(
+            resolve_url("mark_item"), data={"item_id": item.id, "kind": kind}
+        )
+    baker.make(
+        UserRelItem,
+        user_id=user_id_,
+        item=commented,
+        kind=UserRelItemKind.comment,
+        content="Nice",
+        disabled_at=None,
+    )
+    # State of other users
+    mark(baker.make(User).id, feed.id, UserRelItemKind.read, [favorite.id])
+
+    response = logged_client.get(resolve_url("list_item", feed_id=feed.id))
+    state = {
+        item.id: (item.read, item.favorite, item.commented, item.comment)
+        for item in response.context["items"]
+    }
+    assert state == {
+        read.id: (True, False, False, None),
+        favorite.id: (False, True, False, None),
+        commented.id: (False, False, True, "Nice"),
+    }
+
+    response = logged_client.get(
+        resolve_url("list_item", feed_id=feed.id), {"unread": 1}
+    )
+    assert [item.id for item in response.context["items"]] == [
+        commented.id,
+        favorite.id,
+    ]
+
+
+def test_item_list_view_unread_pages(logged_client, settings):
+    settings.ITEM_PAGE_SIZE = 2
+    user_id_ = int(logged_client.session._session["_auth_user_id"])
+    feed = baker.make(Feed)
+    published_at = now()
+    items = [
+        baker.make(Item, feed=feed, published_at=published_at - timedelta(hours=hours))
+        for hours in range(12)
+    ]
+    read = {item.id for item in items if item.id % 3}
+    mark(user_id_, feed.id, UserRelItemKind.read, read)
+
+    response = logged_client.get(
+        resolve_url("list_item", feed_id=feed.id), {"unread": 1}
+    )
+    pages = [[item.id for item in response.context["items"]]]
+    next_url = response.context["next_url"]
+    while next_url:
+        assert "unread=1" in next_url
+        response = logged_client.get(next_url)
+        pages.append([item.id for item in response.context["items"]])
+        next_url = response.json()["next"]
+
+    unread = [item.id for item in items if item.id not in read]
+    assert pages == [unread[start : start + 2] for start in range(0, len(unread), 2)]
+
+
+def test_mark_as_kind_view_item_dont_exists(logged_client):
+    response = logged_client.post(
+        resolve_url("mark_item"), data={"item_id": 789456, "kind": "read"}
+    )
+    assert response.status_code == 404
+
+
+def test_item_list_view_queries_dont_grow(logged_client, settings):
+    settings.ITEM_PAGE_SIZE = 5
+    user_id_ = int(logged_client.session._session["_auth_user_id"])
+    small, large = baker.make(Feed, _quantity=2)
+    baker.make(Item, feed=small, _quantity=2)
+    for item in baker.make(Item, feed=large, _quantity=30):
+        baker.make(UserRelItem, user_id=user_id_, item=item, kind=UserRelItemKind.read)
+
+    queries = []
+    for feed in (small, large):
+        with CaptureQueriesContext(connection) as context:
+            logged_client.get(resolve_url("list_item", feed_id=feed.id))
+        queries.append(len(context))
+    assert queries[0] == queries[1]
@@ -0,0 +1,128 @@
+from datetime import timedelta
+from unittest import mock
+
+import pytest
+from django.shortcuts import resolve_url
+from django.utils.timezone import now
+from model_bakery import baker
+
+from app.models import HubSubscription
+from app.models.hub_subscription import HubSubscriptionState
+
+
+def verification(subscription, **params):
+    return {
+        "hub.mode": "subscribe",
+        "hub.topic": subscription.topic,
+        "hub.challenge": "challenge",
+        **params,
+    }
+
+
+@pytest.mark.django_db
+def test_websub_callback_unknown_subscription(client):
+    response = client.get(resolve_url("websub_callback", "unknown"))
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_websub_callback_wrong_topic(client):
+    subscription = baker.make(
+        HubSubscription, topic="https://test.com/feed", requested_at=now()
+    )
+    response = client.get(
+        resolve_url("websub_callback", subscription.token),
+        verification(subscription, **{"hub.topic": "https://other.com/"}),
+    )
+    assert response.status_code == 404
+    subscription.refresh_from_db()
+    assert subscription.state == HubSubscriptionState.pending
+
+
+@pytest.mark.django_db
+def test_websub_callback_default_lease(client, settings):
+    subscription = baker.make(
+        HubSubscription, topic="https://test.com/feed", requested_at=now()
+    )
+    response = client.get(
+        resolve_url("websub_callback", subscription.token), verification(subscription)
+    )
+    assert response.content == b"challenge"
+    subscription.refresh_from_db()
+    assert subscription.lease_expires_at > now() + timedelta(
+        seconds=settings.WEBSUB_LEASE_SECONDS - 60
+    )
+    assert subscription.requested_at is None
+
+
+@pytest.mark.django_db
+def test_websub_callback_lease_capped(client, settings):
+    subscription = baker.make(
+        HubSubscription, topic="https://test.com/feed", requested_at=now()
+    )
+    response = client.get(
+        resolve_url("websub_callback", subscription.token),
+        verification(subscription, **{"hub.lease_seconds": "9" * 30}),
+    )
+    assert response.content == b"challenge"
+    subscription.refresh_from_db()
+    assert subscription.lease_expires_at <= now() + timedelta(
+        seconds=settings.WEBSUB_LEASE_SECONDS
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("requested_at", [None, timedelta(days=1)])
+def test_websub_callback_not_requested(client, requested_at):
+    subscription = baker.make(
+        HubSubscription,
+        topic="https://test.com/feed",
+        requested_at=requested_at and now() - requested_at,
+    )
+    response = client.get(
+        resolve_url("websub_callback", subscription.token), verification(subscription)
+    )
+    assert response.status_code == 404
+    subscription.refresh_from_db()
+    assert subscription.state == HubSubscriptionState.pending
+
+
+@pytest.mark.django_db
+def test_websub_callback_denied(client):
+    subscription = baker.make(HubSubscription, topic="https://test.com/feed")
+    response = client.get(
+        resolve_url("websub_callback", subscription.token),
+        {"hub.mode": "denied", "hub.topic": subscription.topic},
+    )
+    assert response.status_code == 200
+    subscription.refresh_from_db()
+    assert subscription.state == HubSubscriptionState.denied
+
+
+@pytest.mark.django_db
+@mock.patch("app.views.websub.ingest_push")
+def test_websub_callback_wrong_signature(ingest_push_mock, client):
+    subscription = baker.make(
+        HubSubscription, secret="secret", state=HubSubscriptionState.active
+    )
+    response = client.post(
+        resolve_url("websub_callback", subscription.token),
+        b"<rss></rss>",
+        content_type="application/rss+xml",
+        HTTP_X_HUB_SIGNATURE="sha1=0000",
+    )
+    assert response.status_code == 202
+    ingest_push_mock.send.assert_not_called()
+
+
+@pytest.mark.django_db
+@mock.patch("app.views.websub.ingest_push")
+def test_websub_callback_inactive_subscription(ingest_push_mock, client):
+    subscription = baker.make(HubSubscription, state=HubSubscriptionState.denied)
+    response = client.post(
+        resolve_url("websub_callback", subscription.token),
+        b"<rss></rss>",
+        content_type="application/rss+xml",
+    )
+    assert response.status_code == 410
+    ingest_push_mock.send.assert_not_called()
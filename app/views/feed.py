@@ -1,17 +1,21 @@
+from datetime import datetime, timedelta
+
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db.models import F, Q
-from django.db.models.aggregates import Count
 from django.dispatch import Signal, receiver
 from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.shortcuts import redirect, render
 from django.utils import timezone
+from dramatiq import group
 
+from app.canonical import find_feed
 from app.forms import AddFeedForm, FeedForm
+from app.item_state import load_unread_counts
+from app.jobs import RefreshJob
 from app.models import Notification, UserFollowFeed
 from app.models.feed import Feed
-from app.models.user_rel_item import UserRelItemKind
-from app.tasks import parse_feed, update_feed
+from app.tasks import parse_feed, update_feed, update_feeds_batch
 
 notification_read_signal = Signal(providing_args=["notifications"])
 
@@ -27,7 +31,8 @@ def mark_notification_as_read_receiver(sender, **kwargs):
 def add(request: HttpRequest) -> HttpResponse:
     """View for adding new feed for a user.
     Use AddFeedForm, with `url` and `alias` parameters, and `alias` being optional.
-    if is valid, send a message to a dramatiq.actor task called `parse_feed`
+    If the url is a known feed the user follows it right away, otherwise
+    send a message to a dramatiq.actor task called `parse_feed`
 
     Parameters
     ----------
@@ -43,8 +48,13 @@ def add(request: HttpRequest) -> HttpResponse:
         if form.is_valid():
             url = form.cleaned_data.get("url")
             alias = form.cleaned_data.get("alias")
-            parse_feed.send(url, alias, request.user.id)
-            messages.success(request, "Feed added and sent to be parsed.")
+            feed_id = find_feed(url)
+            if feed_id is not None:
+                UserFollowFeed.objects.follow(request.user.id, feed_id)
+                messages.success(request, "Feed added.")
+            else:
+                parse_feed.send(url, alias, request.user.id)
+                messages.success(request, "Feed added and sent to be parsed.")
             return redirect("list_feed")
         else:
             messages.error(request, f"Form not valid: {form.errors}")
@@ -66,21 +76,19 @@ def list(request: HttpRequest) -> HttpResponse:
 
     Returns
     -------
-    render list_feed.html with the followed and unfollowed feeds from a user
+    render list_feed.html with the followed and unfollowed feeds from a user,
+    the followed ones with their `unread_count`, read from the `UnreadCounter`
     """
 
     user_id = request.user.id
     users_feed = Feed.objects.filter(userfollowfeed__user_id=user_id)
-    feeds_followed = users_feed.filter(userfollowfeed__disabled_at__isnull=True)
+    feeds_followed = [
+        feed for feed in users_feed.filter(userfollowfeed__disabled_at__isnull=True)
+    ]
     feeds_unfollowed = users_feed.filter(userfollowfeed__disabled_at__isnull=False)
-    feeds_followed = feeds_followed.annotate(
-        read_count=Count(
-            "item__userrelitem__id",
-            filter=Q(item__userrelitem__kind=UserRelItemKind.read),
-        ),
-        total=Count("item__id", distinct=True),
-        unread_count=F("total") - F("read_count"),
-    )
+    counts = load_unread_counts(user_id, [feed.id for feed in feeds_followed])
+    for feed in feeds_followed:
+        feed.unread_count = counts[feed.id]
     notifications = Notification.objects.filter(user_id=user_id, read=False)
     to_notify = []
     for notification in notifications:
@@ -118,6 +126,94 @@ def update(request: HttpRequest) -> JsonResponse:
     return JsonResponse({"error": "An unexpected error occurred"}, status=500)
 
 
+def _is_fresh(fetched_at: datetime, fetch_interval: int, at: datetime) -> bool:
+    """Function responsible for telling if a feed was fetched within its freshness
+    window, the smaller of its fetch interval and `FEED_FRESHNESS_WINDOW`
+
+    Parameters
+    ----------
+    fetched_at: datetime
+    fetch_interval: int
+    at: datetime
+
+    Returns
+    -------
+    bool
+    """
+    if fetched_at is None:
+        return False
+    window = min(
+        fetch_interval or settings.FEED_FRESHNESS_WINDOW, settings.FEED_FRESHNESS_WINDOW
+    )
+    return fetched_at > at - timedelta(seconds=window)
+
+
+@login_required()
+def update_all(request: HttpRequest) -> JsonResponse:
+    """View to update all feeds followed by the user.
+    Feeds fetched within their freshness window are skipped, the others are sent
+    to the `dramatiq.actor` task `update_feeds_batch` as a group of batches.
+
+    Parameters
+    ----------
+    request: HttpRequest
+
+    Returns
+    -------
+    JsonResponse with the `job_id` to poll the progress in `update_status`
+    """
+    if request.is_ajax and request.method == "POST":
+        at = timezone.now()
+        follows = UserFollowFeed.objects.filter(
+            user_id=request.user.id, disabled_at__isnull=True
+        ).values_list("feed_id", "feed__fetched_at", "feed__fetch_interval")
+        feed_ids = [
+            feed_id
+            for feed_id, fetched_at, fetch_interval in follows
+            if not _is_fresh(fetched_at, fetch_interval, at)
+        ]
+        job = RefreshJob.create(
+            request.user.id, total=len(feed_ids), skipped=len(follows) - len(feed_ids)
+        )
+
+        batch_size = settings.UPDATE_ALL_BATCH_SIZE
+        group(
+            [
+                update_feeds_batch.message(
+                    feed_ids[start : start + batch_size], request.user.id, job.job_id
+                )
+                for start in range(0, len(feed_ids), batch_size)
+            ]
+        ).run()
+        return JsonResponse(
+            {
+                "message": f"{len(feed_ids)} feeds were sent to update.",
+                "job_id": job.job_id,
+            },
+            status=200,
+        )
+    return JsonResponse({"error": "An unexpected error occurred"}, status=500)
+
+
+@login_required()
+def update_status(request: HttpRequest, job_id: str) -> JsonResponse:
+    """View to get the progress of an `update_all` job
+
+    Parameters
+    ----------
+    request: HttpRequest
+    job_id: str
+
+    Returns
+    -------
+    JsonResponse
+    """
+    progress = RefreshJob(job_id).progress()
+    if progress is None or progress.pop("user_id") != request.user.id:
+        return JsonResponse({"error": "Job does not exist"}, status=404)
+    return JsonResponse(progress, status=200)
+
+
 @login_required()
 def unfollow(request: HttpRequest) -> JsonResponse:
     """"View to mark a feed as unfollowed by the user.
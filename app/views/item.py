@@ -1,19 +1,98 @@
+from typing import List, Optional, Tuple
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db.models import Exists, OuterRef
+from django.db import transaction
 from django.http import Http404, HttpRequest, HttpResponse, JsonResponse
 from django.shortcuts import render
+from django.template.loader import render_to_string
+from django.urls import reverse
 
 from app.forms import AddCommentForm, MarkItemForm
+from app.item_state import STATE_KINDS, load_states, mark
 from app.models import UserRelItem
 from app.models.feed import Feed
 from app.models.item import Item
 from app.models.user_rel_item import UserRelItemKind
+from app.pagination import keyset_page
+
+
+def _item_page(
+    user_id: int, feed_id: int, cursor: Optional[str], unread: bool = False
+) -> Tuple[List[Item], Optional[str]]:
+    """Function responsible for getting a page of the items of a feed, with the
+    state of each item for the user, see `keyset_page`.
+    Items only carry what the lists show, the excerpt and preview, the description
+    of truncated items is loaded by `body`.
+    The read and favorite state comes from the bitmaps of the user, see
+    `app.item_state`, and the comments from the `UserRelItem` of the page.
+
+    Parameters
+    ----------
+    user_id: int
+    feed_id: int
+    cursor: str
+        Cursor of the page, None for the first page
+    unread: bool
+        Only the items the user did not read, pages can be short when most items
+        were read, see `keyset_page`
+
+    Returns
+    -------
+    Tuple with the items and the cursor of the next page
+    """
+    states = load_states(user_id, [feed_id])
+    read = states[feed_id, UserRelItemKind.read]
+    favorite = states[feed_id, UserRelItemKind.favorite]
+    items, next_cursor = keyset_page(
+        Item.objects.filter(feed_id=feed_id).only(
+            "id",
+            "feed_id",
+            "title",
+            "link",
+            "excerpt",
+            "truncated",
+            "preview",
+            "published_at",
+        ),
+        cursor,
+        settings.ITEM_PAGE_SIZE,
+        keep=(lambda item: item.id not in read) if unread else None,
+    )
+    by_id = {item.id: item for item in items}
+    for item in items:
+        item.read = item.id in read
+        item.favorite = item.id in favorite
+        item.commented = False
+        item.comment = None
+    comments = (
+        UserRelItem.commented.filter(
+            user_id=user_id, item_id__in=by_id, disabled_at__isnull=True
+        )
+        .order_by("id")
+        .values_list("item_id", "content")
+    )
+    for item_id, content in comments:
+        by_id[item_id].commented = True
+        by_id[item_id].comment = content
+    return items, next_cursor
+
+
+def _page_url(feed_id: int, cursor: Optional[str], unread: bool) -> Optional[str]:
+    if cursor is None:
+        return None
+    query = {"cursor": cursor, "unread": 1} if unread else {"cursor": cursor}
+    return f"{reverse('item_page', args=[feed_id])}?{urlencode(query)}"
 
 
 @login_required()
 def list(request: HttpRequest, feed_id: int) -> HttpResponse:
-    """View to list all items from a feed.
+    """View to list the items from a feed, newest first, one page at a time.
+    Items show their title and preview, the next pages are loaded by `page`
+    while scrolling and the full description by `body` when an item is expanded.
+    With `unread` in the query string only the unread items are listed.
 
     Parameters
     ----------
@@ -26,27 +105,69 @@ def list(request: HttpRequest, feed_id: int) -> HttpResponse:
     """
     try:
         feed = Feed.objects.get(id=feed_id)
-        items = Item.objects.filter(feed_id=feed.id)
-
-        reads = UserRelItem.read.filter(item=OuterRef("pk"))
-        favorites = UserRelItem.favorite.filter(item=OuterRef("pk"))
-        commented = UserRelItem.commented.filter(item=OuterRef("pk"))
-        comment_content = commented.values("content")
-
-        items = items.annotate(
-            read=Exists(reads),
-            favorite=Exists(favorites),
-            commented=Exists(commented),
-            comment=comment_content,
+        unread = bool(request.GET.get("unread"))
+        items, next_cursor = _item_page(request.user.id, feed.id, None, unread)
+        return render(
+            request,
+            "list_item.html",
+            {
+                "items": items,
+                "feed": feed,
+                "unread": unread,
+                "next_url": _page_url(feed.id, next_cursor, unread),
+            },
         )
-
-        return render(request, "list_item.html", {"items": items, "feed": feed},)
     except Feed.DoesNotExist:
         raise Http404("Feed does not exist")
     except Exception as e:
         raise e
 
 
+@login_required()
+def page(request: HttpRequest, feed_id: int) -> JsonResponse:
+    """View to get the next page of the items of a feed, for the infinite scroll
+    of `list`.
+
+    Parameters
+    ----------
+    request: HttpRequest
+    feed_id: int
+
+    Returns
+    -------
+    JsonResponse with the `html` of the items and the `next` page url,
+    null on the last page
+    """
+    unread = bool(request.GET.get("unread"))
+    try:
+        items, next_cursor = _item_page(
+            request.user.id, feed_id, request.GET.get("cursor"), unread
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    html = render_to_string("list_item_page.html", {"items": items}, request)
+    return JsonResponse({"html": html, "next": _page_url(feed_id, next_cursor, unread)})
+
+
+@login_required()
+def body(request: HttpRequest, item_id: int) -> JsonResponse:
+    """View to get the full description of an item, when it is expanded.
+
+    Parameters
+    ----------
+    request: HttpRequest
+    item_id: int
+
+    Returns
+    -------
+    JsonResponse with the `description`
+    """
+    item = Item.objects.filter(id=item_id).only("description").first()
+    if item is None:
+        raise Http404("Item does not exist")
+    return JsonResponse({"description": item.description})
+
+
 @login_required()
 def add_comment(request: HttpRequest, item_id: int) -> HttpResponse:
     """View to add a private commentary for a item.
@@ -81,7 +202,9 @@ def add_comment(request: HttpRequest, item_id: int) -> HttpResponse:
 
 @login_required()
 def mark_as_kind(request: HttpRequest) -> JsonResponse:
-    """View to mark a item as favorite.
+    """View to mark a item as read, favorite or unfavorite.
+    The mark is kept as a `UserRelItem` and in the state bitmaps of the user,
+    see `app.item_state`.
 
     Parameters
     ----------
@@ -96,23 +219,38 @@ def mark_as_kind(request: HttpRequest) -> JsonResponse:
         if form.is_valid():
             item_id = form.cleaned_data.get("item_id")
             kind = form.cleaned_data.get("kind")
-
-            if kind == UserRelItemKind.unfavorite:
-                favorite_rel = UserRelItem.objects.filter(
-                    user_id=request.user.id,
-                    item_id=item_id,
-                    kind=UserRelItemKind.favorite,
-                    disabled_at__isnull=True,
-                )
-                UserRelItem.objects.bulk_update_favorite(favorite_rel)
-                return JsonResponse(
-                    {"message": f"The item was marked as {kind}."}, status=200
-                )
-            UserRelItem.objects.create(
-                user_id=request.user.id,
-                item_id=item_id,
-                kind=UserRelItemKind.get_choice(kind).value,
+            feed_id = (
+                Item.objects.filter(id=item_id)
+                .values_list("feed_id", flat=True)
+                .first()
             )
+            if feed_id is None:
+                return JsonResponse({"error": "Item does not exist"}, status=404)
+
+            with transaction.atomic():
+                if kind == UserRelItemKind.unfavorite:
+                    favorite_rel = UserRelItem.objects.filter(
+                        user_id=request.user.id,
+                        item_id=item_id,
+                        kind=UserRelItemKind.favorite,
+                        disabled_at__isnull=True,
+                    )
+                    UserRelItem.objects.bulk_update_favorite(favorite_rel)
+                    mark(
+                        request.user.id,
+                        feed_id,
+                        UserRelItemKind.favorite,
+                        [item_id],
+                        value=False,
+                    )
+                else:
+                    UserRelItem.objects.create(
+                        user_id=request.user.id,
+                        item_id=item_id,
+                        kind=UserRelItemKind.get_choice(kind).value,
+                    )
+                    if kind in STATE_KINDS:
+                        mark(request.user.id, feed_id, kind, [item_id])
             return JsonResponse(
                 {"message": f"The item was marked as {kind}."}, status=200
             )
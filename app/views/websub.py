@@ -0,0 +1,56 @@
+import base64
+import logging
+
+from django.http import Http404, HttpRequest, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from app.models.hub_subscription import HubSubscription, HubSubscriptionState
+from app.tasks import ingest_push
+from app.websub import verify_intent, verify_signature
+
+logger = logging.getLogger(__name__)
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def callback(request: HttpRequest, token: str) -> HttpResponse:
+    """View for the WebSub hubs, the callback of a subscription.
+    A GET verifies the intent of subscribing, see `verify_intent`.
+    A POST distributes the new content of the feed, sent to the task `ingest_push`
+    if it is signed with the secret of the subscription. Content with a wrong
+    signature is acknowledged and ignored, as WebSub asks.
+
+    Parameters
+    ----------
+    request: HttpRequest
+    token: str
+        HubSubscription token
+
+    Returns
+    -------
+    HttpResponse
+    """
+    subscription = get_object_or_404(HubSubscription, token=token)
+    if request.method == "GET":
+        challenge = verify_intent(subscription, request.GET)
+        if challenge is None:
+            raise Http404("Unknown subscription")
+        return HttpResponse(challenge, content_type="text/plain")
+
+    if subscription.state != HubSubscriptionState.active:
+        # Tells the hub to stop sending the content
+        return HttpResponse(status=410)
+    body = request.body
+    if not verify_signature(
+        subscription.secret, request.headers.get("X-Hub-Signature"), body
+    ):
+        logger.warning("Ignored content with a wrong signature for %s", subscription)
+        return HttpResponse(status=202)
+    ingest_push.send(
+        subscription.feed_id,
+        base64.b64encode(body).decode("ascii"),
+        request.headers.get("Content-Type"),
+    )
+    return HttpResponse(status=202)
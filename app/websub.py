@@ -0,0 +1,229 @@
+import hmac
+import re
+import secrets
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Q
+from django.urls import reverse
+from django.utils.timezone import now
+
+from app.fetch import FetchResult, get_http_client
+from app.models.feed import Feed
+from app.models.hub_subscription import HubSubscription, HubSubscriptionState, new_token
+
+LINK_HEADER = re.compile(r"<([^>]*)>([^,<]*)")
+LINK_REL = re.compile(r';\s*rel\s*=\s*"?([^";]*)"?', re.IGNORECASE)
+SIGNATURE_METHODS = {"sha1", "sha256", "sha384", "sha512"}
+
+
+def find_hub(
+    headers: Dict[str, str], links: Iterable[Dict], url: str
+) -> Optional[Tuple[str, str]]:
+    """Function responsible for discovering the WebSub hub of a fetched feed,
+    from the `Link` header or the `rel="hub"` links of the document
+
+    Parameters
+    ----------
+    headers: Dict[str, str]
+        Response headers, with lower case names
+    links: Iterable[Dict]
+        Links of the parsed feed, with `rel` and `href`
+    url: str
+        Url the feed was fetched from
+
+    Returns
+    -------
+    Tuple with the hub and the topic, the `rel="self"` link or `url`,
+    None if the feed does not advertise a hub
+    """
+    found = {}
+    for href, params in LINK_HEADER.findall(headers.get("link", "")):
+        rel = LINK_REL.search(params)
+        for name in rel.group(1).lower().split() if rel else []:
+            found.setdefault(name, href.strip())
+    for link in links:
+        found.setdefault(link.get("rel"), link.get("href"))
+    if not found.get("hub"):
+        return None
+    return found["hub"], found.get("self") or url
+
+
+def callback_url(subscription: HubSubscription) -> str:
+    return settings.WEBSUB_CALLBACK_URL.rstrip("/") + reverse(
+        "websub_callback", args=[subscription.token]
+    )
+
+
+def create_subscription(
+    feed: Feed, headers: Dict[str, str], links: Iterable[Dict]
+) -> Optional[HubSubscription]:
+    """Function responsible for creating the subscription of a feed to its hub,
+    when it advertises one and `WEBSUB_CALLBACK_URL` is set
+
+    Parameters
+    ----------
+    feed: Feed
+    headers: Dict[str, str]
+        Response headers, with lower case names
+    links: Iterable[Dict]
+        Links of the parsed feed
+
+    Returns
+    -------
+    HubSubscription pending to be requested, or None
+    """
+    found = find_hub(headers, links, feed.link)
+    if not settings.WEBSUB_CALLBACK_URL or found is None:
+        return None
+    hub, topic = found
+    subscription, _ = HubSubscription.objects.update_or_create(
+        feed=feed,
+        defaults={
+            "hub": hub,
+            "topic": topic,
+            "secret": secrets.token_hex(32),
+            "token": new_token(),
+            "state": HubSubscriptionState.pending,
+        },
+    )
+    return subscription
+
+
+def request_subscription(subscription: HubSubscription) -> FetchResult:
+    """Function responsible for asking the hub to subscribe, or renew the lease.
+    The hub verifies the intent later with a GET to the callback, see
+    `verify_intent`
+
+    Parameters
+    ----------
+    subscription: HubSubscription
+
+    Returns
+    -------
+    FetchResult of the hub response, accepted with a 202
+    """
+    subscription.requested_at = now()
+    subscription.save(update_fields=["requested_at"])
+    return get_http_client().post(
+        subscription.hub,
+        {
+            "hub.callback": callback_url(subscription),
+            "hub.mode": "subscribe",
+            "hub.topic": subscription.topic,
+            "hub.lease_seconds": str(settings.WEBSUB_LEASE_SECONDS),
+            "hub.secret": subscription.secret,
+        },
+    )
+
+
+def verify_intent(
+    subscription: HubSubscription, params: Dict[str, str], at: Optional[datetime] = None
+) -> Optional[str]:
+    """Function responsible for answering the verification of a subscription
+    by the hub, activating it for the lease granted, or recording it was denied.
+    A subscription is only verified within `WEBSUB_RENEW_RETRY` seconds of its
+    request to the hub, and for a lease of at most `WEBSUB_LEASE_SECONDS`
+
+    Parameters
+    ----------
+    subscription: HubSubscription
+    params: Dict[str, str]
+        Query parameters of the verification
+    at: datetime
+        Defaults to now
+
+    Returns
+    -------
+    str to answer with, the challenge of a verified subscription,
+    None if the verification does not match the subscription
+    """
+    at = at or now()
+    if params.get("hub.topic") != subscription.topic:
+        return None
+    mode = params.get("hub.mode")
+    if mode == "denied":
+        subscription.state = HubSubscriptionState.denied
+        subscription.save(update_fields=["state"])
+        return ""
+    requested = subscription.requested_at is not None and (
+        at - subscription.requested_at <= timedelta(seconds=settings.WEBSUB_RENEW_RETRY)
+    )
+    if mode != "subscribe" or "hub.challenge" not in params or not requested:
+        return None
+    lease = params.get("hub.lease_seconds", "")
+    lease_seconds = min(
+        int(lease) if lease.isdigit() else settings.WEBSUB_LEASE_SECONDS,
+        settings.WEBSUB_LEASE_SECONDS,
+    )
+    subscription.state = HubSubscriptionState.active
+    subscription.lease_expires_at = at + timedelta(seconds=lease_seconds)
+    # The request is answered, a repeated verification is refused
+    subscription.requested_at = None
+    subscription.save(update_fields=["state", "lease_expires_at", "requested_at"])
+    return params["hub.challenge"]
+
+
+def verify_signature(secret: str, signature: Optional[str], body: bytes) -> bool:
+    """Function responsible for checking the `X-Hub-Signature` of pushed content
+
+    Parameters
+    ----------
+    secret: str
+        Secret of the subscription
+    signature: str
+        Header value, `method=hexdigest`
+    body: bytes
+
+    Returns
+    -------
+    bool
+    """
+    method, _, digest = (signature or "").partition("=")
+    if method not in SIGNATURE_METHODS:
+        return False
+    expected = hmac.new(secret.encode(), body, method).hexdigest()
+    return hmac.compare_digest(expected, digest.strip().lower())
+
+
+def pushed(at: Optional[datetime] = None) -> Q:
+    """Function responsible for filtering the feeds pushed by their hub,
+    with an active subscription whose lease did not expire
+
+    Parameters
+    ----------
+    at: datetime
+        Defaults to now
+
+    Returns
+    -------
+    Q on Feed
+    """
+    return Q(
+        subscription__state=HubSubscriptionState.active,
+        subscription__lease_expires_at__gt=at or now(),
+    )
+
+
+def due_renewals(at: Optional[datetime] = None) -> Iterable[int]:
+    """Function responsible for finding the subscriptions to renew, whose lease
+    expires within `WEBSUB_RENEW_BEFORE` and were not requested in the last
+    `WEBSUB_RENEW_RETRY`
+
+    Parameters
+    ----------
+    at: datetime
+        Defaults to now
+
+    Returns
+    -------
+    Iterable of subscription ids
+    """
+    at = at or now()
+    return HubSubscription.objects.filter(
+        Q(requested_at__isnull=True)
+        | Q(requested_at__lt=at - timedelta(seconds=settings.WEBSUB_RENEW_RETRY)),
+        state=HubSubscriptionState.active,
+        lease_expires_at__lte=at + timedelta(seconds=settings.WEBSUB_RENEW_BEFORE),
+    ).values_list("id", flat=True)
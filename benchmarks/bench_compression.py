@@ -0,0 +1,87 @@
+"""Storage and cost of the compressed item descriptions, with zstd alone and with
+a dictionary trained on other descriptions of the same kind.
+
+Run with `make benchmark`, the number of descriptions can be changed with
+BENCH_ITEMS=5000. Descriptions are generated blog posts of 1 to 6 KB, from a seeded
+vocabulary so every run compresses the same text.
+"""
+import os
+import random
+import time
+
+import pytest
+from django.db.models import Sum
+from django.db.models.functions import Length
+from model_bakery import baker
+
+from app.compression import compress, decompress, train_dictionary
+from app.models import Feed, Item
+
+ITEMS = int(os.environ.get("BENCH_ITEMS", "5000"))
+WORDS = [
+    "feed",
+    "python",
+    "release",
+    "django",
+    "performance",
+    "server",
+    "query",
+    "update",
+    "notes",
+    "index",
+    "cache",
+    "request",
+    "the",
+    "and",
+    "with",
+    "for",
+    "new",
+    "version",
+]
+
+
+def descriptions(count, seed):
+    generator = random.Random(seed)
+    for number in range(count):
+        paragraphs = "".join(
+            f"<p>{' '.join(generator.choices(WORDS, k=generator.randint(20, 120)))}"
+            f' <a href="https://blog.test/{generator.randint(1, 10_000)}">more</a></p>'
+            for _ in range(generator.randint(2, 8))
+        )
+        yield (
+            f'<div class="entry-content"><h2 class="entry-title">Post {number}</h2>'
+            f'<img src="https://cdn.blog.test/{number}.png" alt="" loading="lazy">'
+            f'{paragraphs}<footer>Posted in <a href="https://blog.test/tag/'
+            f'{generator.choice(WORDS)}" rel="tag">{generator.choice(WORDS)}</a>'
+            f"</footer></div>"
+        )
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("dictionary", [False, True], ids=["zstd", "dictionary"])
+def test_compression(dictionary):
+    texts = list(descriptions(ITEMS, seed=1))
+    if dictionary:
+        train_dictionary(list(descriptions(2000, seed=2)))
+
+    start = time.perf_counter()
+    stored = [compress(text) for text in texts]
+    encode = time.perf_counter() - start
+    start = time.perf_counter()
+    for data in stored:
+        decompress(data)
+    decode = time.perf_counter() - start
+
+    assert [decompress(data) for data in stored] == texts
+    feed = baker.make(Feed)
+    baker.make(Item, feed=feed, description=iter(texts), _quantity=ITEMS)
+    size = Item.objects.aggregate(size=Sum(Length("description")))["size"]
+    raw = sum(len(text.encode()) for text in texts)
+    assert size == sum(len(data) for data in stored)
+    print(
+        f"\n{'dictionary' if dictionary else 'zstd':>10} items={ITEMS} "
+        f"raw={raw / 1024 / 1024:.2f} MB stored={size / 1024 / 1024:.2f} MB "
+        f"saved={1 - size / raw:6.1%} "
+        f"encode={encode / ITEMS * 1e6:6.1f} us/item "
+        f"decode={decode / ITEMS * 1e6:6.1f} us/item"
+    )
@@ -0,0 +1,90 @@
+"""Full ingestion pipeline against the local `ReplayServer`: feeds added with
+`parse_feed` and the tasks it sends, then refreshed with `update_feed` while they
+are unchanged (304), while each fetch publishes an entry, and while a fifth of the
+fetches fail.
+
+Run with `make benchmark`, with BENCH_FEEDS=200 feeds of BENCH_ENTRIES=20 entries,
+half RSS and half Atom, and BENCH_LATENCY=0 milliseconds of publisher latency, plus
+as much jitter. Tasks run in the benchmark thread, and the messages they send right
+after them, so the latency of a feed is the whole of its pipeline.
+"""
+import os
+import time
+
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from dramatiq import Message
+from model_bakery import baker
+
+from app.models import Feed, Item
+from app.tasks import parse_feed, update_feed
+
+FEEDS = int(os.environ.get("BENCH_FEEDS", "200"))
+SCENARIOS = [
+    ("add", {}),
+    ("unchanged", {}),
+    ("changed", {"change_rate": 1.0}),
+    ("errors", {"change_rate": 1.0, "error_rate": 0.2}),
+]
+
+
+def run_sent(broker):
+    # Runs the messages sent by the tasks, as a worker would
+    for queue in broker.queues.values():
+        while not queue.empty():
+            message = Message.decode(queue.get_nowait())
+            broker.get_actor(message.actor_name)(*message.args, **message.kwargs)
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(int(len(values) * share), len(values) - 1)]
+
+
+def ingest(scenario, replay_server, broker, user):
+    feed_ids = list(Feed.objects.order_by("id").values_list("id", flat=True))
+    latencies, failed = [], 0
+    for number in range(FEEDS):
+        start = time.perf_counter()
+        try:
+            if scenario == "add":
+                kind = "atom" if number % 2 else "rss"
+                parse_feed(replay_server.url(number, kind), "", user.id)
+                run_sent(broker)
+            else:
+                update_feed(feed_ids[number], user.id)
+        except Exception:
+            failed += 1
+        latencies.append(time.perf_counter() - start)
+    return latencies, failed
+
+
+@pytest.mark.django_db
+def test_ingestion(replay_server, broker, settings):
+    settings.FEED_REFRESH_COALESCE_WINDOW = 0
+    # Every feed is on the host of the replay server
+    settings.HOST_FAILURE_THRESHOLD = FEEDS * len(SCENARIOS)
+    user = baker.make(User)
+
+    print()
+    for scenario, config in SCENARIOS:
+        for name, value in config.items():
+            setattr(replay_server.config, name, value)
+        items = Item.objects.count()
+        start = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            latencies, failed = ingest(scenario, replay_server, broker, user)
+        elapsed = time.perf_counter() - start
+        created = Item.objects.count() - items
+
+        if scenario == "add":
+            assert created == FEEDS * replay_server.config.entries
+        print(
+            f"{scenario:>9} feeds={FEEDS} feeds/s={FEEDS / elapsed:7.1f} "
+            f"items/s={created / elapsed:8.1f} "
+            f"p50={percentile(latencies, 0.5) * 1000:6.1f} ms "
+            f"p99={percentile(latencies, 0.99) * 1000:6.1f} ms "
+            f"queries/feed={len(queries) / FEEDS:5.1f} failed={failed}"
+        )
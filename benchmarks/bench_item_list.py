@@ -0,0 +1,66 @@
+"""Latency of the pages of the item list, the first one and a deep one, for feeds
+of growing sizes. Keyset pages cost the same at any depth, while the offset pages
+they replaced scan all the items before them.
+
+Run with `make benchmark`, the largest feed has BENCH_ITEMS=20000 items and every
+page is read BENCH_REPEAT=20 times.
+"""
+import os
+import statistics
+import time
+from datetime import timedelta
+
+import pytest
+from django.contrib.auth.models import User
+from django.utils.timezone import now
+from model_bakery import baker
+
+from app.models import Feed, Item
+from app.pagination import encode_cursor
+from app.views.item import _item_page
+
+ITEMS = int(os.environ.get("BENCH_ITEMS", "20000"))
+REPEAT = int(os.environ.get("BENCH_REPEAT", "20"))
+
+
+def timed(function):
+    durations = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations) * 1000
+
+
+@pytest.mark.django_db
+def test_item_list(settings):
+    size = settings.ITEM_PAGE_SIZE
+    user = baker.make(User)
+    published_at = now()
+
+    print()
+    for count in (ITEMS // 20, ITEMS):
+        feed = baker.make(Feed)
+        Item.objects.bulk_create(
+            Item(
+                feed=feed,
+                title=f"Entry {number}",
+                link=f"http://bench.test/{feed.id}/{number}",
+                guid=f"{feed.id}/{number}",
+                description="",
+                preview=f"Preview {number}",
+                published_at=published_at - timedelta(minutes=number),
+            )
+            for number in range(count)
+        )
+        items = Item.objects.filter(feed=feed).order_by("-published_at", "-id")
+        last = items[count - size - 1]
+        cursor = encode_cursor(last.published_at, last.id)
+
+        first = timed(lambda: _item_page(user.id, feed.id, None))
+        deep = timed(lambda: _item_page(user.id, feed.id, cursor))
+        offset = timed(lambda: list(items[count - size : count]))
+        print(
+            f"items={count:>6} first={first:6.2f} ms deep={deep:6.2f} ms "
+            f"offset_deep={offset:6.2f} ms"
+        )
@@ -0,0 +1,74 @@
+"""Parsing throughput of a threaded worker, parsing in its threads or in a
+parse pool of FEED_PARSE_PROCESSES processes.
+
+Run with `make benchmark`, process counts can be changed with
+BENCH_PROCESSES=0,1,2,4. Documents with relative links go through the
+feedparser fallback, the others through the lxml fast path.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.parsers import get_parse_pool, parse_document
+
+PROCESSES = [
+    int(count)
+    for count in os.environ.get(
+        "BENCH_PROCESSES",
+        ",".join(str(2 ** n) for n in range(4) if 2 ** n <= os.cpu_count()),
+    ).split(",")
+]
+PROCESSES = sorted({0, *PROCESSES})
+THREADS = 8
+DOCUMENTS = 64
+ENTRIES = 200
+SUMMARY = "<p>Lorem ipsum <b>dolor</b> sit amet, <a href='/about'>link</a>.</p>"
+BASELINE = {}
+
+
+def document(number, link):
+    items = "".join(
+        f"<item><title>Entry {entry}</title><link>{link}/{number}/{entry}</link>"
+        f"<guid>{number}/{entry}</guid><description><![CDATA[{SUMMARY}]]></description>"
+        f"<pubDate>Fri, 24 Jul 2020 15:38:57 GMT</pubDate></item>"
+        for entry in range(ENTRIES)
+    )
+    return (
+        '<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel>'
+        "<title>Bench</title><link>http://bench.test</link>"
+        f"<lastBuildDate>Fri, 24 Jul 2020 15:38:57 GMT</lastBuildDate>{items}"
+        "</channel></rss>"
+    ).encode()
+
+
+@pytest.mark.parametrize("processes", PROCESSES)
+@pytest.mark.parametrize(
+    "link", ["http://bench.test", "/relative"], ids=["lxml", "feedparser"]
+)
+def test_parse_pool_scaling(processes, link, settings):
+    settings.FEED_PARSE_PROCESSES = processes
+    get_parse_pool.cache_clear()
+    documents = [document(number, link) for number in range(DOCUMENTS)]
+    try:
+        # Start the processes before measuring
+        for body in documents[: max(processes, 1)]:
+            parse_document(body)
+        with ThreadPoolExecutor(THREADS) as threads:
+            start = time.perf_counter()
+            parsed = list(threads.map(parse_document, documents))
+            elapsed = time.perf_counter() - start
+    finally:
+        if processes:
+            get_parse_pool().shutdown()
+        get_parse_pool.cache_clear()
+
+    assert all(len(document.entries) == ENTRIES for document in parsed)
+    rate = DOCUMENTS / elapsed
+    BASELINE.setdefault(link, rate)
+    print(
+        f"\nparser={parsed[0].parser:<10} processes={processes:>2} threads={THREADS} "
+        f"cpus={os.cpu_count()} documents/s={rate:7.1f} "
+        f"speedup={rate / BASELINE[link]:4.2f}x"
+    )
@@ -0,0 +1,69 @@
+"""Throughput of the lxml fast path against feedparser, on generated RSS 2.0
+and Atom documents.
+
+Run with `make benchmark`, entries per document can be changed with
+BENCH_ENTRIES=20,200.
+"""
+import os
+import time
+
+import pytest
+
+from app.parsers import FeedparserParser, LxmlParser
+
+SIZES = [
+    int(size) for size in os.environ.get("BENCH_ENTRIES", "20,200,2000").split(",")
+]
+SUMMARY = "<p>Lorem ipsum <b>dolor</b> sit amet, <a href='http://b.test'>link</a>.</p>"
+MIN_TIME = 2.0
+
+
+def rss(entries):
+    items = "".join(
+        f"<item><title>Entry {number}</title><link>http://bench.test/{number}</link>"
+        f"<guid>http://bench.test/{number}</guid>"
+        f"<description><![CDATA[{SUMMARY}]]></description>"
+        f"<pubDate>Fri, 24 Jul 2020 15:38:57 GMT</pubDate></item>"
+        for number in range(entries)
+    )
+    return (
+        '<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel>'
+        "<title>Bench</title><link>http://bench.test</link>"
+        f"<lastBuildDate>Fri, 24 Jul 2020 15:38:57 GMT</lastBuildDate>{items}"
+        "</channel></rss>"
+    ).encode()
+
+
+def atom(entries):
+    items = "".join(
+        f"<entry><title>Entry {number}</title><link href='http://bench.test/{number}'/>"
+        f"<id>tag:bench.test,2020:{number}</id><published>2020-07-24T10:00:00Z</published>"
+        f"<summary type='html'>{SUMMARY.replace('<', '&lt;')}</summary></entry>"
+        for number in range(entries)
+    )
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<feed xmlns="http://www.w3.org/2005/Atom"><title>Bench</title>'
+        f"<updated>2020-07-24T10:00:00Z</updated>{items}</feed>"
+    ).encode()
+
+
+@pytest.mark.parametrize("entries", SIZES)
+@pytest.mark.parametrize("document", [rss, atom])
+@pytest.mark.parametrize(
+    "parser", [FeedparserParser(), LxmlParser()], ids=["feedparser", "lxml"]
+)
+def test_parser_throughput(parser, document, entries):
+    body = document(entries)
+    runs = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < MIN_TIME:
+        assert len(parser.parse(body).entries) == entries
+        runs += 1
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"\nparser={parser.name:<10} format={document.__name__:<4} entries={entries:>5} "
+        f"documents/s={runs / elapsed:9.1f} entries/s={runs * entries / elapsed:9.0f} "
+        f"MB/s={runs * len(body) / elapsed / 1024 / 1024:6.1f}"
+    )
@@ -0,0 +1,66 @@
+"""Refresh of many feeds, one `update_feed` message per feed against
+`update_feeds_batch` messages of `FETCH_BATCH_SIZE` feeds.
+
+Run with `make benchmark`, the number of feeds can be changed with BENCH_FEEDS=1000.
+Messages are processed in the benchmark thread, without a broker, so the times
+leave out the ack of each message and the queries are counted exactly.
+"""
+import os
+import time
+
+import pytest
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from model_bakery import baker
+
+from app.models import Feed, Item
+from app.tasks import update_feed, update_feeds_batch
+
+FEEDS = int(os.environ.get("BENCH_FEEDS", "1000"))
+ENTRIES = 10
+
+
+def make_feeds(feed_server, mode):
+    return [
+        baker.make(
+            Feed,
+            link=feed_server.add_feed(f"/{mode}/{number}", entries=ENTRIES),
+            etag=None,
+        ).id
+        for number in range(FEEDS)
+    ]
+
+
+def per_feed(feed_ids):
+    user = baker.make(User)
+    for feed_id in feed_ids:
+        update_feed(feed_id, user.id)
+    return len(feed_ids)
+
+
+def batched(feed_ids):
+    batch_size = settings.FETCH_BATCH_SIZE
+    for start in range(0, len(feed_ids), batch_size):
+        update_feeds_batch(feed_ids[start : start + batch_size])
+    return -(-len(feed_ids) // batch_size)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("mode", [per_feed, batched], ids=["update_feed", "batch"])
+def test_refresh_batch(mode, feed_server, settings):
+    settings.FEED_REFRESH_COALESCE_WINDOW = 0
+    feed_ids = make_feeds(feed_server, mode.__name__)
+
+    start = time.perf_counter()
+    with CaptureQueriesContext(connection) as queries:
+        messages = mode(feed_ids)
+    elapsed = time.perf_counter() - start
+
+    assert Item.objects.count() == FEEDS * ENTRIES
+    print(
+        f"\n{mode.__name__:>8} feeds={FEEDS} messages={messages} "
+        f"messages/s={messages / elapsed:8.2f} feeds/s={FEEDS / elapsed:8.1f} "
+        f"queries/1000 feeds={len(queries) * 1000 / FEEDS:8.0f}"
+    )
@@ -0,0 +1,94 @@
+"""Refresh cost of a feed against the size of the Item table,
+with and without the seen entries filter.
+
+Run with `make benchmark`, sizes can be changed with BENCH_ITEMS=1000,10000.
+Without BENCH_REDIS_URL the filter lives in fakeredis, whose per command cost
+is much higher than a real Redis, so compare the queries more than the times.
+"""
+import os
+import time
+from datetime import datetime
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from model_bakery import baker
+
+from app.models import Feed, Item
+from app.models.item import item_digest
+
+SIZES = [
+    int(size) for size in os.environ.get("BENCH_ITEMS", "1000,10000,100000").split(",")
+]
+FEED_SIZE = 500
+DOCUMENT_SIZE = 100
+REPEAT = 5
+
+
+def make_entry(feed_id, number):
+    return {
+        "id": f"{feed_id}/{number}",
+        "title": f"Entry {number}",
+        "link": f"http://bench.test/{feed_id}/{number}",
+        "summary": "Summary",
+        "published_parsed": datetime(2020, 7, 24).timetuple(),
+    }
+
+
+def populate(size):
+    feeds = baker.make(Feed, _quantity=max(size // FEED_SIZE, 1))
+    published_at = datetime(2020, 7, 24)
+    items = (
+        Item(
+            feed_id=feed.id,
+            guid=f"{feed.id}/{number}",
+            title=f"Entry {number}",
+            link=f"http://bench.test/{feed.id}/{number}",
+            description="Summary",
+            published_at=published_at,
+            digest=item_digest(
+                f"Entry {number}",
+                f"http://bench.test/{feed.id}/{number}",
+                "Summary",
+                published_at,
+            ),
+        )
+        for feed in feeds
+        for number in range(FEED_SIZE)
+    )
+    Item.objects.bulk_create(items, batch_size=FEED_SIZE)
+    return feeds[0]
+
+
+def refresh(feed_id, new, first):
+    # The document has the newest entries, `new` of them not stored yet
+    seen = DOCUMENT_SIZE - new
+    entries = [make_entry(feed_id, FEED_SIZE - seen + number) for number in range(seen)]
+    entries += [make_entry(feed_id, first + number) for number in range(new)]
+    start = time.perf_counter()
+    with CaptureQueriesContext(connection) as queries:
+        Item.objects.bulk_entries_create(feed_id, entries)
+    return time.perf_counter() - start, len(queries)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize(
+    "enabled", [False, True], ids=["without-filter", "with-filter"]
+)
+@pytest.mark.parametrize("new", [10, DOCUMENT_SIZE], ids=["10-new", "all-new"])
+def test_refresh_cost(size, enabled, new, settings, redis_connection):
+    settings.SEEN_FILTER_ENABLED = enabled
+    feed = populate(size)
+    # Warm the filter once, as a running worker would have it
+    Item.objects.seen_entries(feed.id)
+
+    timings, queries = [], 0
+    for run in range(REPEAT):
+        elapsed, queries = refresh(feed.id, new, 10_000 + run * DOCUMENT_SIZE)
+        timings.append(elapsed)
+
+    print(
+        f"\nitems={size:>7} new={new:>3} filter={'on ' if enabled else 'off'} "
+        f"refresh={min(timings) * 1000:7.2f}ms queries={queries}"
+    )
@@ -0,0 +1,98 @@
+"""Peak memory of ingesting a large generated feed, parsed whole by feedparser
+or incrementally by `StreamingFeedParser`.
+
+Run with `make benchmark`, sizes in MB can be changed with BENCH_FEED_MB=5,50.
+The resident set size is sampled while the feed is ingested, so it includes
+the parser, the entries and the items written in batches.
+"""
+import os
+import threading
+import time
+
+import feedparser
+import pytest
+from model_bakery import baker
+
+from app.models import Feed, Item
+from app.streaming import StreamingFeedParser
+
+SIZES = [int(size) for size in os.environ.get("BENCH_FEED_MB", "5,50").split(",")]
+DESCRIPTION = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 16
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def write_feed(path, megabytes):
+    size = 0
+    with open(path, "wb") as document:
+        document.write(
+            b'<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel>'
+            b"<title>Large</title><link>http://bench.test</link>"
+            b"<lastBuildDate>Fri, 24 Jul 2020 15:38:57 GMT</lastBuildDate>"
+        )
+        number = 0
+        while size < megabytes * 1024 * 1024:
+            item = (
+                f"<item><title>Entry {number}</title>"
+                f"<link>http://bench.test/{number}</link><guid>{number}</guid>"
+                f"<description>{DESCRIPTION}</description>"
+                f"<pubDate>Fri, 24 Jul 2020 15:38:57 GMT</pubDate></item>"
+            ).encode()
+            size += document.write(item)
+            number += 1
+        document.write(b"</channel></rss>")
+    return number
+
+
+def rss():
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * PAGE_SIZE
+
+
+class PeakRss(threading.Thread):
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.baseline = self.peak = rss()
+        self.running = True
+
+    def run(self):
+        while self.running:
+            self.peak = max(self.peak, rss())
+            time.sleep(0.01)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.running = False
+        self.join()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("megabytes", SIZES)
+# Streaming runs first, memory freed by feedparser is not given back to the system
+@pytest.mark.parametrize("streaming", [True, False], ids=["streaming", "feedparser"])
+def test_ingest_memory(megabytes, streaming, tmp_path):
+    path = tmp_path / "feed.xml"
+    entries = write_feed(path, megabytes)
+    feed = baker.make(Feed)
+
+    start = time.perf_counter()
+    with PeakRss() as peak:
+        if streaming:
+            with open(path, "rb") as document:
+                parsed = StreamingFeedParser().iter_entries(document)
+                Item.objects.bulk_entries_create(feed.id, parsed)
+        else:
+            parsed = feedparser.parse(str(path))
+            Item.objects.bulk_entries_create(feed.id, parsed.entries)
+            del parsed
+    elapsed = time.perf_counter() - start
+
+    assert Item.objects.filter(feed=feed).count() == entries
+    print(
+        f"\nfeed={megabytes:>3}MB entries={entries:>6} "
+        f"parser={'streaming ' if streaming else 'feedparser'} "
+        f"peak_rss=+{(peak.peak - peak.baseline) / 1024 / 1024:7.1f}MB "
+        f"elapsed={elapsed:6.1f}s"
+    )
@@ -0,0 +1,50 @@
+import os
+import tempfile
+from unittest import mock
+
+import pytest
+import redis
+from django.conf import settings
+
+from app.replay import ReplayConfig, ReplayServer
+from app.store import get_redis_connection
+
+
+@pytest.fixture(autouse=True)
+def redis_connection(redis_connection):
+    url = os.environ.get("BENCH_REDIS_URL")
+    if not url:
+        yield redis_connection
+        return
+    # Use a real Redis instead of fakeredis
+    connection = redis.Redis(connection_pool=redis.ConnectionPool.from_url(url))
+    connection.flushdb()
+    get_redis_connection.cache_clear()
+    with mock.patch.object(redis.Redis, "from_url", return_value=connection):
+        yield connection
+    get_redis_connection.cache_clear()
+
+
+@pytest.fixture(scope="session")
+def django_db_modify_db_settings(django_db_modify_db_settings_parallel_suffix):
+    database = settings.DATABASES["default"]
+    if database["ENGINE"] == "django.db.backends.sqlite3":
+        # An in-memory test database would count in the memory of the process
+        database.setdefault("TEST", {})["NAME"] = os.path.join(
+            tempfile.gettempdir(), "pyfeedrss-benchmarks.sqlite3"
+        )
+
+
+@pytest.fixture
+def replay_server():
+    # Latency of the publishers in milliseconds, BENCH_LATENCY=20
+    latency = float(os.environ.get("BENCH_LATENCY", "0")) / 1000
+    server = ReplayServer(
+        ReplayConfig(
+            entries=int(os.environ.get("BENCH_ENTRIES", "20")),
+            latency=latency,
+            jitter=latency,
+        )
+    ).start()
+    yield server
+    server.stop()
@@ -1,5 +1,45 @@
+import threading
+from unittest import mock
+
 import dramatiq
+import fakeredis
 import pytest
+import redis
+
+from app.store import get_redis_connection
+from app.tests.utils import FeedServer, WebSubHub
+
+
+@pytest.fixture(autouse=True)
+def redis_connection():
+    connection = fakeredis.FakeRedis()
+    get_redis_connection.cache_clear()
+    with mock.patch.object(redis.Redis, "from_url", return_value=connection):
+        yield connection
+    get_redis_connection.cache_clear()
+
+
+@pytest.fixture(autouse=True)
+def http_clients():
+    yield
+    from app.fetch import close_http_clients
+
+    close_http_clients()
+
+
+@pytest.fixture(autouse=True)
+def snapshot_root(settings, tmp_path):
+    settings.SNAPSHOT_ROOT = str(tmp_path / "snapshots")
+    return settings.SNAPSHOT_ROOT
+
+
+@pytest.fixture(autouse=True)
+def compression_dictionaries():
+    from app.compression import dictionaries
+
+    dictionaries.clear()
+    yield dictionaries
+    dictionaries.clear()
 
 
 @pytest.fixture
@@ -24,3 +64,24 @@ def logged_client(client, django_user_model):
     django_user_model.objects.create_user(username=username, password=password)
     client.login(username=username, password=password)
     yield client
+
+
+@pytest.fixture
+def feed_server():
+    server = FeedServer()
+    thread = threading.Thread(target=server.httpd.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.httpd.shutdown()
+    server.httpd.server_close()
+
+
+@pytest.fixture
+def websub_hub(settings):
+    settings.WEBSUB_CALLBACK_URL = "http://testserver"
+    hub = WebSubHub()
+    thread = threading.Thread(target=hub.httpd.serve_forever, daemon=True)
+    thread.start()
+    yield hub
+    hub.httpd.shutdown()
+    hub.httpd.server_close()
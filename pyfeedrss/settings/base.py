@@ -155,7 +155,138 @@ DRAMATIQ_BROKER = {
 
 DRAMATIQ_MAX_RETRIES = 3
 
-TASKS_DATE_FORMAT = "%a, %d %b %Y %X %Z"
+# Queue of the tasks adding a new feed, kept apart from the refreshes so a user
+# adding a feed does not wait behind them
+ADD_FEED_QUEUE = "add-feed"
+
+# Redis
+
+REDIS_URL = env("REDIS_URL", default="redis://localhost:6379/0")
+
+# Seconds the entries of a fetch are kept waiting for the ingestion stage
+FEED_CONTENT_TTL = 600
+
+# Fetch
+
+FETCH_CONCURRENCY = 100
+FETCH_PER_HOST = 4
+FETCH_TIMEOUT = 30
+FETCH_BATCH_SIZE = 500
+FETCH_USER_AGENT = "pyfeedrss"
+# Seconds an idle connection and a resolved host are kept by the HTTP client
+FETCH_KEEPALIVE_TIMEOUT = 60
+FETCH_DNS_CACHE_TTL = 300
+
+# Failing feeds, in seconds
+# A feed is quarantined after FEED_QUARANTINE_THRESHOLD consecutive failures, for
+# FEED_QUARANTINE_DURATION doubling with each further failure up to FEED_QUARANTINE_MAX
+FEED_QUARANTINE_THRESHOLD = 5
+FEED_QUARANTINE_DURATION = 60 * 60
+FEED_QUARANTINE_MAX = 7 * 24 * 60 * 60
+# Backoff of the first retry of a transient failure, doubling with each retry
+FEED_RETRY_BACKOFF = 30
+FEED_RETRY_MAX_BACKOFF = 60 * 60
+# The feeds of a host are skipped for HOST_COOLDOWN after HOST_FAILURE_THRESHOLD
+# transient failures within HOST_FAILURE_WINDOW
+HOST_FAILURE_THRESHOLD = 10
+HOST_FAILURE_WINDOW = 5 * 60
+HOST_COOLDOWN = 10 * 60
+
+# Seconds the feed id of an url added by a user is cached
+FEED_URL_CACHE_TTL = 30 * 24 * 60 * 60
+
+# WebSub, feeds advertising a hub are subscribed to it and not polled while the
+# lease lasts. Hubs post to WEBSUB_CALLBACK_URL, the public url of the site,
+# and feeds are only subscribed when it is set
+WEBSUB_CALLBACK_URL = env("WEBSUB_CALLBACK_URL", default=None)
+# Seconds asked for the lease, renewed WEBSUB_RENEW_BEFORE seconds before it
+# expires and asked again every WEBSUB_RENEW_RETRY seconds until the hub verifies it.
+# Hubs can't grant longer leases, nor verify a request older than WEBSUB_RENEW_RETRY
+WEBSUB_LEASE_SECONDS = 10 * 24 * 60 * 60
+WEBSUB_RENEW_BEFORE = 24 * 60 * 60
+WEBSUB_RENEW_RETRY = 60 * 60
+
+# Number of items written to the database at once
+ITEM_BATCH_SIZE = 500
+
+# Item lists are loaded ITEM_PAGE_SIZE items at a time, see `app.pagination`
+ITEM_PAGE_SIZE = 50
+
+# Seconds between the reconciliations of the unread counters, sent by the scheduler
+UNREAD_RECONCILE_INTERVAL = 60 * 60
+
+# Items keep an excerpt of ITEM_EXCERPT_LENGTH characters of text of the
+# description, or its text when the excerpt markup is over ITEM_EXCERPT_MAX_SIZE
+# characters, and item lists show a plain text preview of ITEM_PREVIEW_LENGTH characters
+ITEM_EXCERPT_LENGTH = 1000
+ITEM_EXCERPT_MAX_SIZE = 8 * 1024
+ITEM_PREVIEW_LENGTH = 200
+
+# Item descriptions are stored compressed with zstd at COMPRESSION_LEVEL, with the
+# latest dictionary trained by the train_compression_dictionary command, looked up
+# again every COMPRESSION_DICTIONARY_RELOAD seconds. Descriptions shorter than
+# COMPRESSION_MIN_SIZE bytes are stored as they are
+COMPRESSION_LEVEL = 3
+COMPRESSION_MIN_SIZE = 128
+COMPRESSION_DICTIONARY_SIZE = 64 * 1024
+COMPRESSION_DICTIONARY_SAMPLES = 5000
+COMPRESSION_DICTIONARY_RELOAD = 5 * 60
+
+# Feeds whose last document was larger than FEED_STREAMING_THRESHOLD bytes are
+# downloaded to a temporary file and parsed incrementally
+FEED_STREAMING_THRESHOLD = 5 * 1024 * 1024
+FEED_STREAMING_CHUNK_SIZE = 64 * 1024
+
+# Fetched bodies are archived under SNAPSHOT_ROOT, zstd compressed at SNAPSHOT_LEVEL,
+# and pruned after SNAPSHOT_RETENTION seconds except the latest of each feed,
+# see `app.snapshots`
+SNAPSHOT_ENABLED = env.bool("SNAPSHOT_ENABLED", default=True)
+SNAPSHOT_ROOT = env("SNAPSHOT_ROOT", default="") or str(ROOT_DIR / "snapshots")
+SNAPSHOT_LEVEL = 3
+SNAPSHOT_RETENTION = 14 * 24 * 60 * 60
+
+# Parsers tried in order, documents not supported by one go to the next
+FEED_PARSERS = [
+    "app.parsers.LxmlParser",
+    "app.parsers.FeedparserParser",
+]
+
+# Processes parsing documents off the worker threads in each worker, 0 parses in
+# the threads. "spawn" as forking a threaded worker is unsafe
+FEED_PARSE_PROCESSES = env.int("FEED_PARSE_PROCESSES", default=0)
+FEED_PARSE_START_METHOD = "spawn"
+
+# Scheduler, intervals in seconds
+
+SCHEDULER_MIN_INTERVAL = 5 * 60
+SCHEDULER_DEFAULT_INTERVAL = 60 * 60
+SCHEDULER_MAX_INTERVAL = 24 * 60 * 60
+SCHEDULER_CADENCE_WINDOW = 30 * 24 * 60 * 60
+SCHEDULER_BATCH_SIZE = 100
+SCHEDULER_RELOAD_INTERVAL = 60
+SCHEDULER_TICK = 10
+
+# Update all, feeds fetched less than FEED_FRESHNESS_WINDOW seconds ago are skipped
+
+FEED_FRESHNESS_WINDOW = 10 * 60
+UPDATE_ALL_BATCH_SIZE = 50
+REFRESH_JOB_TTL = 60 * 60
+
+# Refreshes of the same feed run one at a time, holding a lease of FEED_REFRESH_LEASE
+# seconds, and the ones asked within FEED_REFRESH_COALESCE_WINDOW seconds of a
+# successful refresh are skipped, 0 disables it
+
+FEED_REFRESH_LEASE = 2 * 60
+FEED_REFRESH_COALESCE_WINDOW = 60
+
+# Bloom filter of the entries stored for each feed, sized for SEEN_FILTER_CAPACITY
+# entries with SEEN_FILTER_ERROR_RATE false positives
+
+SEEN_FILTER_ENABLED = True
+SEEN_FILTER_CAPACITY = 10_000
+SEEN_FILTER_ERROR_RATE = 0.01
+SEEN_FILTER_TTL = 7 * 24 * 60 * 60
+
 # Logging
 
 LOGGING = {
@@ -21,5 +21,9 @@ DRAMATIQ_BROKER = {
 
 DRAMATIQ_MAX_RETRIES = 0
 
+BAKER_CUSTOM_FIELDS_GEN = {
+    "app.fields.CompressedTextField": "model_bakery.random_gen.gen_text",
+}
+
 # WhiteNoise
 INSTALLED_APPS = ["whitenoise.runserver_nostatic"] + INSTALLED_APPS  # noqa F405
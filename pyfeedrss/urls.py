@@ -18,7 +18,7 @@ from django.conf.urls import url
 from django.contrib import admin
 from django.urls import include, path
 
-from app.views import feed, item, main
+from app.views import feed, item, main, websub
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -31,10 +31,14 @@ urlpatterns = [
     url(r"^feed/ajax/update/$", feed.update, name="update_feed"),
     url(r"^feed/ajax/follow/$", feed.follow, name="follow_feed"),
     url(r"^feed/ajax/unfollow/$", feed.unfollow, name="unfollow_feed"),
-    url(r"^feed/update/all$", feed.update, name="update_all"),
+    url(r"^feed/update/all$", feed.update_all, name="update_all"),
+    path("feed/update/<str:job_id>/", feed.update_status, name="update_status"),
     path("feed/<int:feed_id>/item/", item.list, name="list_item"),
+    path("feed/<int:feed_id>/item/page/", item.page, name="item_page"),
     path("item/<int:item_id>/comment/", item.add_comment, name="add_comment"),
+    path("item/<int:item_id>/body/", item.body, name="item_body"),
     url("item/ajax/mark", item.mark_as_kind, name="mark_item"),
+    path("websub/<str:token>/", websub.callback, name="websub_callback"),
     path("accounts/", include("django.contrib.auth.urls")),
 ]
 